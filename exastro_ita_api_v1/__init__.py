@@ -1,3 +1,18 @@
 from .api import *
+from .api_async import *
+from .api_cache import *
+from .api_codec import *
+from .api_columnar import *
+from .api_concurrency import *
+from .api_connection import *
+from .api_diff import *
+from .api_executor import *
+from .api_launcher import *
 from .api_menu import *
+from .api_metrics import *
+from .api_session import *
+from .api_stream import *
+from .api_sync import *
+from .api_timing import *
+from .api_transport import *
 from .constants import *
@@ -2,23 +2,35 @@ import abc
 import base64
 import http.client
 import http.cookiejar
-import json
+import io
 import os.path
+import pathlib
 import urllib.error
 import urllib.parse
 import urllib.request
 import urllib.response
+import threading
 import time
 
-from collections.abc import Iterator, Mapping, MutableMapping
-from typing import TypeVar, TypeAlias, Callable, Any, Protocol
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from typing import TypeVar, TypeAlias, Callable, Any, Protocol, Sequence
 
+from .api_cache import *
+from .api_codec import *
+from .api_concurrency import *
+from .api_connection import *
+from .api_stream import *
+from .api_timing import *
+from .api_transport import *
 from .constants import *
 
 
 _T = TypeVar('_T')
 
 
+DOWNLOAD_PAYLOAD_KEYS = ('resultdata', 'CONTENTS', 'FILE')
+
+
 class ApiException(Exception):
     pass
 
@@ -44,6 +56,81 @@ def to_dict(collection: BlurDict[_T]) -> dict[str, _T]:
     return {str(key): value for key, value in it}
 
 
+def create_options_table(json_object: dict) -> dict[str, dict[str, str]]:
+    body = to_dict(json_object['resultdata']['CONTENTS']['BODY'])
+
+    options_table: dict[str, dict[str, str]] = {}
+    column_names = to_dict(body["0"])
+    for column_index, options in to_dict(body["1"]).items():
+        options = to_dict(options)
+        if options:
+            options_table[column_names[column_index]] = options
+
+    return options_table
+
+
+def create_list_filter(values: Iterable[str]) -> dict:
+    return {'LIST': list(values)}
+
+
+def create_range_filter(start: str | None = None, end: str | None = None) -> dict:
+    return {'RANGE': {**({'START': start} if start is not None else {}), **({'END': end} if end is not None else {})}}
+
+
+class EditResult:
+    SUCCEEDED_CODE = '000'
+
+
+    def __init__(self, index: int, code: str, id: str, message: str) -> None:
+        self.__index = index
+        self.__code = code
+        self.__id = id
+        self.__message = message
+
+
+    @property
+    def index(self) -> int:
+        return self.__index
+
+
+    @property
+    def code(self) -> str:
+        return self.__code
+
+
+    @property
+    def id(self) -> str:
+        return self.__id
+
+
+    @property
+    def message(self) -> str:
+        return self.__message
+
+
+    @property
+    def succeeded(self) -> bool:
+        return self.__code == EditResult.SUCCEEDED_CODE
+
+
+def parse_edit_results(json_object: dict) -> list[EditResult]:
+    # EDIT の resultdata.LIST.RAW は [結果コード, ID, メッセージ] の行を送信順に並べたもの。
+    # LIST を持たない応答に備えて resultdata.RAW も確認する
+    resultdata = json_object.get('resultdata')
+    raw = None
+    if isinstance(resultdata, dict):
+        raw = resultdata['LIST'].get('RAW') if isinstance(resultdata.get('LIST'), dict) else None
+        if raw is None:
+            raw = resultdata.get('RAW')
+
+    results = []
+    for index, entry in enumerate(to_dict(raw).values() if raw else []):
+        values = list(to_dict(entry).values()) + ['', '', '']
+        results.append(EditResult(index, str(values[0]), str(values[1]), str(values[2])))
+
+    return results
+
+
 class Indexer(Mapping[str, str]):
     def __init__(self, menu_id: str, column_names: StrBlurDict) -> None:
         self.__menu_id = menu_id
@@ -79,6 +166,9 @@ class Indexer(Mapping[str, str]):
 
 
 class IndexerMixin(metaclass = abc.ABCMeta):
+    __slots__ = ()
+
+
     @property
     @abc.abstractmethod
     def indexer(self) -> Indexer:
@@ -108,6 +198,7 @@ class EventHook:
     ) -> None: ...
 
 
+    # レスポンスヘッダを受信した時点で呼ばれる。本文はまだ読まれていないため、timings は encode / connect / send / wait のみ
     def on_response(
         self,
         api_request: 'ApiRequest',
@@ -115,6 +206,15 @@ class EventHook:
     ) -> None: ...
 
 
+    # 本文を JSON としてデコードした時点、または ApiResponse を閉じた時点で1度だけ呼ばれる。timings には transfer / decode も含まれる
+    def on_response_complete(
+        self,
+        api_request: 'ApiRequest',
+        api_response: 'ApiResponse',
+        timings: ApiTimings
+    ) -> None: ...
+
+
     def before_wait_func(
         self,
         api_request: 'ApiRequest',
@@ -132,6 +232,16 @@ class EventHook:
     ) -> None: ...
 
 
+    def on_concurrency_change(
+        self,
+        name: str,
+        limit: int,
+        in_flight: int,
+        queue_depth: int,
+        reason: str
+    ) -> None: ...
+
+
 class ApiResponse(IndexerMixin):
     def __init__(
         self,
@@ -139,17 +249,24 @@ class ApiResponse(IndexerMixin):
         http_method: str,
         xcommand: str | None,
         params: dict | None,
-        response: http.client.HTTPResponse | urllib.error.HTTPError | None,
-        exception: Exception | None
+        response: http.client.HTTPResponse | urllib.error.HTTPError | BufferedResponse | None,
+        exception: Exception | None,
+        request_size: int = 0,
+        timings: ApiTimings | None = None
     ) -> None:
         self.__api_request = api_request
         self.__http_method = http_method
         self.__xcommand = xcommand
         self.__params = params
-        self.__response: http.client.HTTPResponse | urllib.error.HTTPError | None = response
+        self.__response: http.client.HTTPResponse | urllib.error.HTTPError | BufferedResponse | None = response
         self.__exception = exception
+        self.__request_size = request_size
+        self.__timings = timings if timings is not None else ApiTimings()
         self.__body = None
         self.__json_object = None
+        self.__streamed = False
+        self.__completed = False
+        self.__counting_reader: CountingReader | None = None
 
 
     def __enter__(self):
@@ -157,8 +274,7 @@ class ApiResponse(IndexerMixin):
 
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if isinstance(self.__response, http.client.HTTPResponse) and not self.__response.isclosed():
-            self.__response.close()
+        self.close()
 
         self.__body = None
         self.__json_object = None
@@ -212,11 +328,50 @@ class ApiResponse(IndexerMixin):
             return -1
 
 
+    @property
+    def timings(self) -> ApiTimings:
+        return self.__timings
+
+
+    @property
+    def request_size(self) -> int:
+        return self.__request_size
+
+
+    @property
+    def content_encoding(self) -> str | None:
+        return get_content_encoding(self.__response.headers) if self.__response is not None else None
+
+
+    @property
+    def received_size(self) -> int:
+        # これまでに受信した本文のバイト数。圧縮されている場合は展開前のバイト数
+        return self.__counting_reader.size if self.__counting_reader is not None else 0
+
+
+    @property
+    def response_size(self) -> int | None:
+        # 本文を読み終えた後は実際に受信したバイト数を返す。読む前は Content-Length で判断し、chunked 転送の場合は読むまで分からない
+        # 圧縮されている場合は展開前のサイズを返す
+        if self.__counting_reader is not None and self.__counting_reader.eof:
+            return self.__counting_reader.size
+
+        content_length = self.__response.headers.get('Content-Length') if self.__response is not None else None
+        try:
+            return int(content_length) if content_length is not None else None
+        except ValueError:
+            return None
+
+
     @property
     def body(self) -> bytes:
         if self.__body is None:
+            if self.__streamed:
+                raise ApiException('Response body has already been consumed by streaming.')
+
             if self.__response is not None:
-                self.__body = self.__response.read()
+                with self.__timings.measure('transfer'):
+                    self.__body = self.__open_response().read()
             else:
                 self.__body = bytes()
 
@@ -227,13 +382,141 @@ class ApiResponse(IndexerMixin):
     def json_object(self) -> dict:
         if self.__json_object is None:
             try:
-                self.__json_object = json.loads(self.body)
-            except json.decoder.JSONDecodeError:
-                raise ApiException(f'Response body is not JSON: {self.body.decode()}')
+                body = self.body
+                with self.__timings.measure('decode'):
+                    self.__json_object = self.api_context.json_codec.loads(body)
+            except ValueError:
+                raise ApiException(f'Response body is not JSON: {self.body.decode(errors="replace")}')
+
+            self.__complete()
 
         return self.__json_object
 
 
+    def close(self) -> None:
+        # 読み切ったレスポンスも close することで接続がプールに返却される
+        if isinstance(self.__response, http.client.HTTPResponse):
+            self.__response.close()
+
+        self.__complete()
+
+
+    def open_stream(self) -> Readable:
+        if self.__body is not None:
+            return io.BytesIO(self.__body)
+
+        if self.__streamed:
+            raise ApiException('Response body has already been consumed by streaming.')
+
+        self.__streamed = True
+        return self.__open_response() if self.__response is not None else io.BytesIO()
+
+
+    def iter_rows(self, *, chunk_size: int = 64 * 1024, files: bool = False) -> Iterator['Row']:
+        from .api_menu import iter_rows
+
+        return iter_rows(self.indexer, self.open_stream(), chunk_size=chunk_size, files=files)
+
+
+    def save_to(self, path: str | os.PathLike, *, buffer_size: int = 64 * 1024) -> int:
+        # 固定長のバッファに readinto で読み込み、レスポンスをそのままファイルへ書き出す
+        if self.__body is not None:
+            with open(path, 'wb') as file:
+                return file.write(self.__body)
+
+        fp = self.open_stream()
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        size = 0
+
+        with open(path, 'wb') as file:
+            while True:
+                length = fp.readinto(buffer) if hasattr(fp, 'readinto') else self.__read_into(fp, view)
+                if not length:
+                    break
+
+                file.write(view[:length])
+                size += length
+
+        return size
+
+
+    def save_payload_to(
+        self,
+        path: str | os.PathLike,
+        keys: Sequence[str] = DOWNLOAD_PAYLOAD_KEYS,
+        *,
+        decode_base64: bool = True,
+        chunk_size: int = 64 * 1024
+    ) -> int:
+        # JSON 内の文字列 (base64 のファイル内容) を少しずつデコードしてファイルへ書き出す
+        reader = JsonStreamReader(self.open_stream(), chunk_size=chunk_size)
+        if not reader.seek(keys) or reader.peek() != '"':
+            raise ApiException(f'Response does not contain a file payload at {"/".join(keys)}. Status: {self.status}')
+
+        chunks = reader.iter_string()
+        blocks = iter_base64_decoded(chunks) if decode_base64 else (chunk.encode() for chunk in chunks)
+        size = 0
+
+        try:
+            with open(path, 'wb') as file:
+                for block in blocks:
+                    size += file.write(block)
+        except BaseException:
+            # 書きかけのファイルは残さない
+            pathlib.Path(path).unlink(missing_ok=True)
+            raise
+
+        return size
+
+
+    def __open_response(self) -> Readable:
+        # 圧縮されたレスポンスは読み出しながら展開する
+        self.__counting_reader = CountingReader(self.__response)  # type: ignore[arg-type]
+        content_encoding = self.content_encoding
+        if content_encoding is None:
+            return self.__counting_reader
+
+        try:
+            return DecompressingReader(self.__counting_reader, content_encoding)
+        except ValueError as e:
+            raise ApiException(f'Response body cannot be decoded. Menu ID: {self.menu_id}, Status: {self.status}') from e
+
+
+    def __complete(self) -> None:
+        if self.__completed:
+            return
+
+        self.__completed = True
+        self.api_context.event_handler.on_response_complete(
+            api_request=self.api_request,
+            api_response=self,
+            timings=self.__timings
+        )
+
+
+    def __read_into(self, fp: Readable, view: memoryview) -> int:
+        chunk = fp.read(len(view))
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+
+    @property
+    def failed(self) -> bool:
+        return self.exception is not None or self.status != 200
+
+
+    @property
+    def succeeded(self) -> bool:
+        if self.failed:
+            return False
+
+        try:
+            return self.json_object.get('status') == 'SUCCEED'
+        except ApiException:
+            return False
+
+
 class ApiRequest(IndexerMixin):
     def __init__(
         self,
@@ -248,7 +531,7 @@ class ApiRequest(IndexerMixin):
         self.__menu_id: str = menu_id
         self.__indexer: Indexer | None = None
         self.__options_table: dict[str, dict[str, str]] | None = None
-        self.__default_wait_func = default_wait_func if default_wait_func else lambda _, seconds=3: time.sleep(seconds)
+        self.__default_wait_func = default_wait_func if default_wait_func else AdaptiveWait()
 
 
     @property
@@ -272,12 +555,20 @@ class ApiRequest(IndexerMixin):
 
     @property
     def indexer(self) -> Indexer:
+        # 複数スレッドから同時に呼ばれても INFO は1回だけ送信され、全員がその結果を受け取る
         if self.__indexer is None:
-            with self.send_post(xcommand=XCommand.INFO) as api_response:
-                self.__indexer = Indexer(
+            def load_column_names():
+                with self.send_post(xcommand=XCommand.INFO) as api_response:
+                    return api_response.json_object['resultdata']['CONTENTS']['INFO']
+
+            # 同じメニューの Indexer は ApiContext 内で共有する
+            self.__indexer = self.api_context.metadata_registry.get_or_load(
+                (self.menu_id, XCommand.INFO),
+                lambda: Indexer(
                     menu_id=self.menu_id,
-                    column_names=api_response.json_object['resultdata']['CONTENTS']['INFO']
+                    column_names=self.api_context.load_metadata(self.menu_id, XCommand.INFO, load_column_names)
                 )
+            )
 
         return self.__indexer
 
@@ -285,17 +576,14 @@ class ApiRequest(IndexerMixin):
     @property
     def options_table(self) -> dict:
         if self.__options_table is None:
-            with self.send_post(xcommand=XCommand.LIST_OPTIONS) as api_response:
-                body = to_dict(api_response.json_object['resultdata']['CONTENTS']['BODY'])
+            def load_options_table():
+                with self.send_post(xcommand=XCommand.LIST_OPTIONS) as api_response:
+                    return create_options_table(api_response.json_object)
 
-            options_table: dict[str, dict[str, str]] = {}
-            column_names = to_dict(body["0"])
-            for column_index, options in to_dict(body["1"]).items():
-                options = to_dict(options)
-                if options:
-                    options_table[column_names[column_index]] = options
-
-            self.__options_table = options_table
+            self.__options_table = self.api_context.metadata_registry.get_or_load(
+                (self.menu_id, XCommand.LIST_OPTIONS),
+                lambda: self.api_context.load_metadata(self.menu_id, XCommand.LIST_OPTIONS, load_options_table)
+            )
 
         return self.__options_table
 
@@ -311,7 +599,8 @@ class ApiRequest(IndexerMixin):
             xcommand=None,
             headers={
                 'Content-Type': 'application/json',
-                'Authorization': self.credential
+                'Authorization': self.credential,
+                **self.api_context.accept_encoding_header
             },
             wait_func=wait_func,
             wait_func_args=wait_func_args
@@ -324,7 +613,8 @@ class ApiRequest(IndexerMixin):
         params: dict | None = None,
         *,
         wait_func: Callable | None = None,
-        wait_func_args: dict = {}
+        wait_func_args: dict = {},
+        cache: bool = True
     ) -> ApiResponse:
         return self.__invoke(
             http_method=HttpMethod.POST,
@@ -332,14 +622,32 @@ class ApiRequest(IndexerMixin):
             headers={
                 'Content-Type': 'application/json',
                 'Authorization': self.credential,
-                'X-Command': xcommand
+                'X-Command': xcommand,
+                **self.api_context.accept_encoding_header
             },
             params=params,
             wait_func=wait_func,
-            wait_func_args=wait_func_args
+            wait_func_args=wait_func_args,
+            cache=cache
         )
 
 
+    def download(
+        self,
+        path: str | os.PathLike,
+        params: dict | None = None,
+        *,
+        xcommand: str = XCommand.DOWNLOAD_SPREADSHEET,
+        keys: Sequence[str] = DOWNLOAD_PAYLOAD_KEYS,
+        decode_base64: bool = True
+    ) -> int:
+        with self.send_post(xcommand=xcommand, params=params) as api_response:
+            if api_response.failed:
+                raise ApiException(f'Failed to download. Menu ID: {self.menu_id}, Status: {api_response.status}') from api_response.exception
+
+            return api_response.save_payload_to(path, keys, decode_base64=decode_base64)
+
+
     def __invoke(
         self,
         http_method: str,
@@ -348,7 +656,8 @@ class ApiRequest(IndexerMixin):
         params: dict | None = None,
         *,
         wait_func: Callable | None,
-        wait_func_args: dict
+        wait_func_args: dict,
+        cache: bool = False
     ) -> ApiResponse:
         
         self.api_context.event_handler.on_request(
@@ -361,28 +670,56 @@ class ApiRequest(IndexerMixin):
             wait_func_args=wait_func_args
         )
 
-        request = urllib.request.Request(
-            url=self.url,
-            method=http_method,
-            headers=headers,
-            data=json.dumps(params, ensure_ascii=False).encode() if params is not None else None
-        )
+        timings = ApiTimings()
+
+        # ファイルを含む場合はメモリに展開せず chunked 転送で送信する。この場合エンコードは送信時に行われる
+        with timings.measure('encode'):
+            if params is not None and contains_path(params):
+                data = CountingIterable(iter_json_chunks(params))
+            else:
+                data = self.api_context.json_codec.dumps(params) if params is not None else None
+
+            # 大きな EDIT の本文は圧縮して送信する。サーバ側で展開できる場合のみ有効にすること
+            if xcommand == XCommand.EDIT and isinstance(data, bytes) and 0 < self.api_context.request_compression_threshold <= len(data):
+                data = compress_body(data)
+                headers = {**headers, 'Content-Encoding': 'gzip'}
+
+        response_cache = self.api_context.response_cache
+        modifying = xcommand in [XCommand.EDIT, XCommand.EXECUTE, XCommand.UPLOAD, XCommand.UPLOAD_SPREADSHEET]
+
+        # 更新系の処理は送信前と応答後の両方でキャッシュを破棄し、処理中に取得された結果も残さない
+        if response_cache is not None and modifying:
+            response_cache.invalidate(self.menu_id)
 
         response = exception = None
         try:
-            response = urllib.request.urlopen(request)
-        except urllib.error.HTTPError as e:
-            response = e
+            if cache and response_cache is not None and response_cache.is_cacheable(xcommand) and not isinstance(data, CountingIterable):
+                def load_response() -> CachedResponse:
+                    with self.__urlopen(http_method, xcommand, data, headers, timings) as pooled_response:
+                        with timings.measure('transfer'):
+                            body = pooled_response.read()
+
+                        return response_cache.create_entry(pooled_response.status, pooled_response.reason, pooled_response.headers, body)
+
+                # 同じリクエストが実行中であれば、その結果を共有する
+                response = response_cache.get_or_load(response_cache.make_key(self.menu_id, xcommand, params), load_response).to_response()  # type: ignore[arg-type]
+            else:
+                response = self.__urlopen(http_method, xcommand, data, headers, timings)
         except Exception as e:
             exception = e
 
+        if response_cache is not None and modifying:
+            response_cache.invalidate(self.menu_id)
+
         api_response = ApiResponse(
             api_request=self,
             http_method=http_method,
             xcommand=xcommand,
             params=params,
             response=response,
-            exception=exception
+            exception=exception,
+            request_size=data.size if isinstance(data, CountingIterable) else len(data) if data is not None else 0,
+            timings=timings
         )
 
         self.api_context.event_handler.on_response(
@@ -390,9 +727,12 @@ class ApiRequest(IndexerMixin):
             api_response=api_response
         )
 
-        # 更新系の処理であれば待ち合わせ関数を呼び出す
-        if xcommand in [XCommand.EDIT, XCommand.EXECUTE, XCommand.UPLOAD, XCommand.UPLOAD_SPREADSHEET]:
-            # TODO エラーが発生している場合は待ち合わせしない
+        # 本文のない失敗はここで完了とする
+        if response is None:
+            api_response.close()
+
+        # 更新系の処理であれば待ち合わせ関数を呼び出す。エラーが発生している場合は待ち合わせしない
+        if xcommand in [XCommand.EDIT, XCommand.EXECUTE, XCommand.UPLOAD, XCommand.UPLOAD_SPREADSHEET] and not api_response.failed:
             wait_func = wait_func if wait_func else self.__default_wait_func
 
             self.api_context.event_handler.before_wait_func(
@@ -415,6 +755,162 @@ class ApiRequest(IndexerMixin):
         return api_response
 
 
+    def __urlopen(self, http_method: str, xcommand: str | None, data: Any, headers: dict[str, str], timings: ApiTimings) -> Any:
+        concurrency_controller = self.api_context.concurrency_controller
+        if concurrency_controller is None:
+            return self.api_context.transport.urlopen(method=http_method, url=self.url, body=data, headers=headers, timings=timings)
+
+        # 応答ヘッダを受け取るまでを ITA 側の処理時間とみなし、同時実行数の調整に使う
+        with concurrency_controller.slot(self.menu_id, xcommand) as slot:
+            response = self.api_context.transport.urlopen(method=http_method, url=self.url, body=data, headers=headers, timings=timings)
+            slot.set_status(response.status)
+            return response
+
+
+class AdaptiveWait:
+    def __init__(
+        self,
+        *,
+        initial_interval: float = 0.1,
+        backoff_factor: float = 2.0,
+        max_interval: float = 1.0,
+        timeout: float = 3.0,
+        fallback_seconds: float = 3.0
+    ) -> None:
+        self.__initial_interval = initial_interval
+        self.__backoff_factor = backoff_factor
+        self.__max_interval = max_interval
+        self.__timeout = timeout
+        self.__fallback_seconds = fallback_seconds
+
+
+    def __call__(self, api_response: ApiResponse, *, timeout: float | None = None, seconds: float | None = None) -> None:
+        # seconds は以前の既定の待ち合わせ関数 (一定時間 sleep する) と同じ引数で、待ち合わせの上限時間として扱う
+        if not api_response.succeeded:
+            return
+
+        indexer = api_response.api_request.indexer if api_response.xcommand == XCommand.EDIT else None
+        waiting_rows = self.get_waiting_rows(api_response, indexer=indexer)
+        if waiting_rows is None:
+            fallback_seconds = seconds if seconds is not None else self.__fallback_seconds
+            if fallback_seconds > 0:
+                time.sleep(fallback_seconds)
+            return
+
+        for interval in self.iter_intervals(timeout if timeout is not None else seconds):
+            if not waiting_rows:
+                return
+
+            with api_response.api_request.send_post(XCommand.FILTER_DATAONLY, self.create_filter_params(set(waiting_rows.keys())), cache=False) as filter_response:
+                self.remove_reflected_rows(filter_response, waiting_rows, indexer=indexer)
+
+            if not waiting_rows:
+                return
+
+            time.sleep(interval)
+
+
+    async def wait_async(self, api_response: ApiResponse, *, timeout: float | None = None, seconds: float | None = None) -> None:
+        import asyncio
+
+        if not api_response.succeeded:
+            return
+
+        # 非同期版の indexer は読み込み済みでないと参照できない
+        indexer = await api_response.api_request.load_indexer() if api_response.xcommand == XCommand.EDIT else None  # type: ignore[attr-defined]
+        waiting_rows = self.get_waiting_rows(api_response, indexer=indexer)
+        if waiting_rows is None:
+            fallback_seconds = seconds if seconds is not None else self.__fallback_seconds
+            if fallback_seconds > 0:
+                await asyncio.sleep(fallback_seconds)
+            return
+
+        for interval in self.iter_intervals(timeout if timeout is not None else seconds):
+            if not waiting_rows:
+                return
+
+            with await api_response.api_request.send_post(XCommand.FILTER_DATAONLY, self.create_filter_params(set(waiting_rows.keys())), cache=False) as filter_response:  # type: ignore[misc]
+                self.remove_reflected_rows(filter_response, waiting_rows, indexer=indexer)
+
+            if not waiting_rows:
+                return
+
+            await asyncio.sleep(interval)
+
+
+    def iter_intervals(self, timeout: float | None = None) -> Iterator[float]:
+        deadline = time.monotonic() + (timeout if timeout is not None else self.__timeout)
+        interval = self.__initial_interval
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            yield min(interval, remaining)
+            interval = min(interval * self.__backoff_factor, self.__max_interval)
+
+
+    def get_waiting_rows(self, api_response: ApiResponse, *, indexer: Indexer | None = None) -> dict[str, tuple[str, str]] | None:
+        # 反映を確認する行の ID ごとに (実行処理種別, 送信した更新用の最終更新日時) を返す。
+        # EXECUTE や UPLOAD など、結果の行を特定できない場合は None を返し、一定時間待つ
+        if api_response.xcommand != XCommand.EDIT:
+            return None
+
+        edit_results = parse_edit_results(api_response.json_object)
+        if not edit_results:
+            return None
+
+        # EDIT の結果は UPLOAD_FILE を除いた送信順に並ぶ
+        params = api_response.params
+        sent_rows = [to_dict(values) for key, values in params.items() if key != 'UPLOAD_FILE'] if isinstance(params, dict) else []
+        last_update_index = (indexer if indexer is not None else api_response.api_request.indexer).get('更新用の最終更新日時')
+
+        waiting_rows = {}
+        for result in edit_results:
+            if not result.succeeded or not result.id:
+                continue
+
+            sent_row = sent_rows[result.index] if result.index < len(sent_rows) else {}
+            operation = str(sent_row.get(CommonIndex.実行処理種別) or 実行処理種別.登録)
+            last_update = str(sent_row.get(last_update_index) or '') if last_update_index else ''
+            waiting_rows[result.id] = (operation, last_update)
+
+        return waiting_rows
+
+
+    def create_filter_params(self, ids: set[str]) -> dict:
+        return {
+            CommonIndex.ID: create_list_filter(sorted(ids))
+        }
+
+
+    def remove_reflected_rows(self, api_response: ApiResponse, waiting_rows: dict[str, tuple[str, str]], *, indexer: Indexer | None = None) -> None:
+        if not api_response.succeeded:
+            return
+
+        last_update_index = (indexer if indexer is not None else api_response.api_request.indexer).get('更新用の最終更新日時')
+        body = api_response.json_object.get('resultdata', {}).get('CONTENTS', {}).get('BODY')
+        for row in to_dict(body).values():
+            row = to_dict(row)
+            row_id = str(row.get(CommonIndex.ID))
+            if row_id in waiting_rows and self.is_reflected(row, *waiting_rows[row_id], last_update_index=last_update_index):
+                del waiting_rows[row_id]
+
+
+    def is_reflected(self, row: dict, operation: str, last_update: str, *, last_update_index: str | None = None) -> bool:
+        # 登録は行が見えること、廃止と復活は廃止フラグ、更新は更新用の最終更新日時が送信した値から変わったことで確認する
+        discarded = row.get(CommonIndex.廃止) not in (None, '', '0')
+        if operation == 実行処理種別.廃止:
+            return discarded
+        elif operation == 実行処理種別.復活:
+            return not discarded
+        elif operation == 実行処理種別.更新 and last_update and last_update_index:
+            return str(row.get(last_update_index) or '') != last_update
+        else:
+            return True
+
+
 class WebResponse:
     def __init__(
         self,
@@ -423,7 +919,7 @@ class WebResponse:
         # Response instance returned from urllib "opener" must not be held because it will be closed.
         self.__response_type = type(response)
         self.__headers = list(response.getheaders()) if isinstance(response, http.client.HTTPResponse) else []
-        self.__body = response.read().decode('utf-8')
+        self.__body = decompress_body(response.read(), get_content_encoding(response.headers)).decode('utf-8')
         self.__code = response.getcode()
 
 
@@ -448,19 +944,26 @@ class WebResponse:
 
 
 class WebRequest:
+    MAX_REDIRECTIONS = 10
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
     def __init__(
         self,
         api_context: 'ApiContext',
         menu_id: str,
         *,
-        default_wait_func: Callable | None = None
+        default_wait_func: Callable | None = None,
+        session: 'WebSession | None' = None
     ) -> None:
         self.__api_context = api_context
         self.__menu_id = menu_id
         self.__default_wait_func = default_wait_func
-        self.__cookie_jar = http.cookiejar.CookieJar()
-        self.__opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.__cookie_jar))
-        self.__referer = None
+        self.__session = session
+        # CookieJar は内部でロックしているため、Referer のみ自前で保護する
+        self.__cookie_jar = session.cookie_jar if session is not None else http.cookiejar.CookieJar()
+        self.__referer: str | None = None
+        self.__lock = threading.Lock()
 
 
     @property
@@ -468,6 +971,49 @@ class WebRequest:
         return self.__api_context
 
 
+    @property
+    def session(self) -> 'WebSession | None':
+        return self.__session
+
+
+    @property
+    def cookie_jar(self) -> http.cookiejar.CookieJar:
+        return self.__cookie_jar
+
+
+    def login(self) -> WebResponse:
+        from .api_session import find_input_value
+
+        web_response = self.__send(
+            method='POST',
+            path='/common/common_auth.php',
+            queries={
+                'login': ''
+            },
+            parameters={
+                'status': '0'
+            },
+            reauthenticate=False
+        )
+
+        csrf_token = find_input_value(web_response.body, 'csrf_token')
+
+        return self.__send(
+            method='POST',
+            path='/common/common_auth.php',
+            queries={
+                'login': ''
+            },
+            parameters={
+                'username': self.api_context.username,
+                'password': self.api_context.password,
+                'csrf_token': csrf_token,
+                'login': r'%E3%83%AD%E3%82%B0%E3%82%A4%E3%83%B3'
+            },
+            reauthenticate=False
+        )
+
+
     def __send(
         self,
         method: str,
@@ -477,7 +1023,8 @@ class WebRequest:
         *,
         wait_func: Callable | None = None,
         wait_func_args: dict = {},
-        override_queries: bool = False
+        override_queries: bool = False,
+        reauthenticate: bool = True
     ) -> WebResponse:
         url = urllib.parse.urlunparse((
             self.api_context.protocol,
@@ -490,8 +1037,12 @@ class WebRequest:
 
         data = urllib.parse.urlencode(parameters).encode() if parameters else None
 
+        with self.__lock:
+            referer = self.__referer
+
         request_header = {
-            **({'Referer': self.__referer} if self.__referer else {}),
+            **self.api_context.accept_encoding_header,
+            **({'Referer': referer} if referer else {}),
             **({'Content-Type': 'application/x-www-form-urlencoded'} if data else {})
         }
 
@@ -502,21 +1053,58 @@ class WebRequest:
             method=method
         )
 
-        def send_request() -> http.client.HTTPResponse | urllib.error.HTTPError:
-            try:
-                response = self.__opener.open(request)
-                self.__referer = url
-            except urllib.error.HTTPError as e:
-                response = e
-                self.__referer = url
-            except Exception as e:
-                raise e
-            
-            return response
+        def send_request() -> http.client.HTTPResponse:
+            current_request = request
+
+            # urllib の opener と同様に Cookie の送受信とリダイレクトを処理する
+            for _ in range(WebRequest.MAX_REDIRECTIONS + 1):
+                self.__cookie_jar.add_cookie_header(current_request)
+
+                response = self.api_context.transport.urlopen(
+                    method=current_request.get_method(),
+                    url=current_request.full_url,
+                    body=current_request.data,  # type: ignore[arg-type]
+                    headers=dict(current_request.header_items())
+                )
+
+                self.__cookie_jar.extract_cookies(response, current_request)  # type: ignore[arg-type]
+
+                location = response.getheader('Location')
+                if response.status not in WebRequest.REDIRECT_STATUSES or not location:
+                    with self.__lock:
+                        self.__referer = url
+                    return response
+
+                response.read()
+                response.close()
+
+                redirect_url = urllib.parse.urljoin(current_request.full_url, location)
+                if response.status in (307, 308):
+                    current_request = urllib.request.Request(
+                        url=redirect_url,
+                        data=current_request.data,
+                        headers=request_header,
+                        method=current_request.get_method()
+                    )
+                else:
+                    current_request = urllib.request.Request(
+                        url=redirect_url,
+                        headers={key: value for key, value in request_header.items() if key != 'Content-Type'},
+                        method='GET'
+                    )
+
+            raise ApiException(f'Too many redirections from "{url}".')
         
+        generation = self.__session.generation if self.__session is not None else 0
         with send_request() as response:
             web_response = WebResponse(response)
 
+        # セッションが切れている場合のみログインし直して、一度だけ再送する
+        if reauthenticate and self.__session is not None and int(web_response.code) == 401:
+            self.__session.authenticate(self, generation)
+            with send_request() as response:
+                web_response = WebResponse(response)
+
         wait_func = wait_func if wait_func else self.__default_wait_func
         if wait_func:
             wait_func(web_response, **(wait_func_args if wait_func_args else {}))
@@ -562,7 +1150,15 @@ class ApiContext:
         config: MutableMapping[str, str] = {},
         *,
         default_wait_func: Callable | None = None,
-        event_hook: EventHook = EventHook()
+        event_hook: EventHook = EventHook(),
+        connection_pool: ConnectionPool | None = None,
+        metadata_cache: MetadataCache | None = None,
+        metadata_registry: MetadataRegistry | None = None,
+        response_cache: ResponseCache | None = None,
+        json_codec: JsonCodec | None = None,
+        transport: Transport | None = None,
+        web_session_pool: 'WebSessionPool | None' = None,
+        concurrency_controller: ConcurrencyController | None = None
     ) -> None:
         self.__protocol: str = config.get('EXASTRO_PROTOCOL', 'http')
         self.__host: str = config.get('EXASTRO_HOST', 'localhost')
@@ -571,6 +1167,74 @@ class ApiContext:
         self.__password: str = config['EXASTRO_PASSWORD']
         self.__default_wait_func = default_wait_func
         self.__event_handler = event_hook
+        self.__connection_pool = connection_pool if connection_pool else ConnectionPool(
+            max_size=int(config.get('EXASTRO_POOL_SIZE', '10')),
+            idle_timeout=float(config.get('EXASTRO_POOL_IDLE_TIMEOUT', '4'))
+        )
+
+        if metadata_cache is None and config.get('EXASTRO_METADATA_CACHE_DIR'):
+            if not config.get('EXASTRO_ITA_VERSION'):
+                raise ApiException('EXASTRO_ITA_VERSION is required when EXASTRO_METADATA_CACHE_DIR is set. Cached metadata is discarded when it changes.')
+
+            metadata_cache = MetadataCache(
+                config['EXASTRO_METADATA_CACHE_DIR'],
+                ttl=float(config.get('EXASTRO_METADATA_CACHE_TTL', str(24 * 60 * 60))),
+                fingerprint=config['EXASTRO_ITA_VERSION']
+            )
+        self.__metadata_cache = metadata_cache
+        self.__metadata_registry = metadata_registry if metadata_registry else MetadataRegistry(
+            max_size=int(config.get('EXASTRO_METADATA_REGISTRY_SIZE', '256'))
+        )
+
+        # レスポンスキャッシュは TTL が指定された場合のみ有効にする
+        if response_cache is None and float(config.get('EXASTRO_RESPONSE_CACHE_TTL', '0')) > 0:
+            response_cache = ResponseCache(
+                ttl=float(config['EXASTRO_RESPONSE_CACHE_TTL']),
+                max_bytes=int(config.get('EXASTRO_RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+            )
+        self.__response_cache = response_cache
+        self.__json_codec = json_codec if json_codec else create_json_codec(config.get('EXASTRO_JSON_CODEC', 'auto'))
+
+        # 空文字列を指定するとレスポンスの圧縮を要求しない。リクエストの圧縮は閾値 (バイト) を指定した場合のみ行う
+        self.__accept_encoding: str = config.get('EXASTRO_ACCEPT_ENCODING', 'gzip, deflate')
+        self.__request_compression_threshold = int(config.get('EXASTRO_REQUEST_COMPRESSION_THRESHOLD', '0'))
+
+        # Web 画面のセッションは初めて使う時に作成する。ディレクトリを指定すると Cookie を次回の実行に引き継ぐ
+        self.__web_session_pool = web_session_pool
+        self.__web_session_pool_size = int(config.get('EXASTRO_WEB_SESSION_POOL_SIZE', '1'))
+        self.__web_session_dir = config.get('EXASTRO_WEB_SESSION_DIR')
+        self.__lock = threading.Lock()
+
+        # 同時実行数の上限を指定した場合のみ、応答時間とエラーに応じて同時に送信するリクエスト数を調整する
+        max_read_concurrency = int(config.get('EXASTRO_READ_CONCURRENCY_LIMIT', '0'))
+        max_write_concurrency = int(config.get('EXASTRO_WRITE_CONCURRENCY_LIMIT', '0'))
+        if concurrency_controller is None and (max_read_concurrency > 0 or max_write_concurrency > 0):
+            concurrency_controller = ConcurrencyController(
+                max_read_concurrency=max_read_concurrency if max_read_concurrency > 0 else self.__connection_pool.max_size,
+                max_write_concurrency=max_write_concurrency if max_write_concurrency > 0 else self.__connection_pool.max_size,
+                on_change=self.__on_concurrency_change
+            )
+        elif concurrency_controller is not None:
+            # 渡されたコントローラの変化もイベントフックに通知する。独自の通知先を持つ制限はそのままにする
+            for limiter in (concurrency_controller.read_limiter, concurrency_controller.write_limiter):
+                if limiter.on_change is None:
+                    limiter.on_change = self.__on_concurrency_change
+        self.__concurrency_controller = concurrency_controller
+
+        # 通信の記録と再生はベンチマークや性能の回帰確認に使う
+        if transport is None and config.get('EXASTRO_REPLAY_PATH'):
+            transport = ReplayTransport(config['EXASTRO_REPLAY_PATH'], pace=float(config.get('EXASTRO_REPLAY_PACE', '0')))
+        elif transport is None and config.get('EXASTRO_RECORD_PATH'):
+            transport = RecordingTransport(self.__connection_pool, config['EXASTRO_RECORD_PATH'])
+        self.__transport = transport if transport else self.__connection_pool
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
     @property
@@ -608,6 +1272,110 @@ class ApiContext:
         return self.__event_handler
 
 
+    @property
+    def connection_pool(self) -> ConnectionPool:
+        return self.__connection_pool
+
+
+    @property
+    def transport(self) -> Transport:
+        return self.__transport
+
+
+    @property
+    def concurrency_controller(self) -> ConcurrencyController | None:
+        return self.__concurrency_controller
+
+
+    @property
+    def accept_encoding(self) -> str:
+        return self.__accept_encoding
+
+
+    @property
+    def accept_encoding_header(self) -> dict[str, str]:
+        return {'Accept-Encoding': self.__accept_encoding} if self.__accept_encoding else {}
+
+
+    @property
+    def request_compression_threshold(self) -> int:
+        return self.__request_compression_threshold
+
+
+    @property
+    def web_session_pool(self) -> 'WebSessionPool':
+        with self.__lock:
+            if self.__web_session_pool is None:
+                from .api_session import WebSessionPool
+
+                self.__web_session_pool = WebSessionPool(
+                    max_size=self.__web_session_pool_size,
+                    directory=self.__web_session_dir,
+                    name=f'{self.host}_{self.port}_{self.username}'
+                )
+
+            return self.__web_session_pool
+
+
+    @property
+    def metadata_cache(self) -> MetadataCache | None:
+        return self.__metadata_cache
+
+
+    @property
+    def metadata_registry(self) -> MetadataRegistry:
+        return self.__metadata_registry
+
+
+    @property
+    def response_cache(self) -> ResponseCache | None:
+        return self.__response_cache
+
+
+    @property
+    def json_codec(self) -> JsonCodec:
+        return self.__json_codec
+
+
+    def load_metadata(self, menu_id: str, kind: str, loader: Callable[[], Any]) -> Any:
+        if self.__metadata_cache is not None:
+            value = self.__metadata_cache.get(self.host, self.port, menu_id, kind, username=self.username)
+            if value is not None:
+                return value
+
+        value = loader()
+
+        if self.__metadata_cache is not None:
+            self.__metadata_cache.put(self.host, self.port, menu_id, kind, value, username=self.username)
+
+        return value
+
+
+    def invalidate_metadata(self, menu_id: str | None = None) -> None:
+        self.__metadata_registry.invalidate(None if menu_id is None else lambda key: key[0] == menu_id)
+
+        if self.__metadata_cache is not None:
+            self.__metadata_cache.invalidate(self.host, self.port, menu_id)
+
+
+    def close(self) -> None:
+        if self.__web_session_pool is not None:
+            self.__web_session_pool.close()
+        if self.__transport is not self.__connection_pool:
+            self.__transport.close()
+        self.__connection_pool.close()
+
+
+    def __on_concurrency_change(self, limiter: AimdLimiter, reason: str) -> None:
+        self.event_handler.on_concurrency_change(
+            name=limiter.name,
+            limit=limiter.limit,
+            in_flight=limiter.in_flight,
+            queue_depth=limiter.queue_depth,
+            reason=reason
+        )
+
+
     def create_api_request(
         self,
         menu_id: str,
@@ -629,42 +1397,45 @@ class ApiContext:
         )
 
 
-    def create_web_request(self, menu_id: str) -> tuple[WebRequest, WebResponse]:
-        from lxml import html
+    def create_executor(self, *, max_workers: int | None = None, max_per_host: int | None = None) -> 'ApiExecutor':
+        from .api_executor import ApiExecutor
+
+        return ApiExecutor(self, max_workers=max_workers, max_per_host=max_per_host)
+
+
+    def create_launcher(self, *, max_workers: int | None = None, interval: float = 5.0) -> 'ExecutionLauncher':
+        from .api_launcher import ExecutionLauncher
+
+        return ExecutionLauncher(self, max_workers=max_workers, interval=interval)
+
+
+    def execute_jobs(
+        self,
+        jobs: Iterable['ApiJob | tuple'],
+        *,
+        ordered: bool = True,
+        max_workers: int | None = None,
+        max_per_host: int | None = None
+    ) -> Iterator['ApiJobResult']:
+        # 途中で反復をやめた場合は未着手のジョブを取り消す
+        executor = self.create_executor(max_workers=max_workers, max_per_host=max_per_host)
+        completed = False
+        try:
+            yield from executor.map(jobs, ordered=ordered)
+            completed = True
+        finally:
+            executor.shutdown(cancel_pending=not completed)
+
 
+    def create_web_request(self, menu_id: str) -> tuple[WebRequest, WebResponse]:
+        # ログイン済みのセッションをメニュー間で共有し、401 が返された場合のみログインする
         web_request = WebRequest(
             api_context=self,
-            menu_id=menu_id
+            menu_id=menu_id,
+            session=self.web_session_pool.get()
         )
 
         web_response = web_request.send_get()
-        
-        if int(web_response.code) == 401:
-            web_response = web_request.send_post(
-                path='/common/common_auth.php',
-                queries={
-                    'login': ''
-                },
-                parameters={
-                    'status': '0'
-                }
-            )
-        
-            html_doc = html.fromstring(web_response.body)
-            csrf_token = html_doc.xpath('string(//input[@name="csrf_token"]/@value)')
-            
-            web_response = web_request.send_post(
-                path='/common/common_auth.php',
-                queries={
-                    'login': ''
-                },
-                parameters={
-                    'username': self.username,
-                    'password': self.password,
-                    'csrf_token': csrf_token,
-                    'login': r'%E3%83%AD%E3%82%B0%E3%82%A4%E3%83%B3'
-                }
-            )
 
         return web_request, web_response
 
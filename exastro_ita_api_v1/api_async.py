@@ -0,0 +1,665 @@
+import asyncio
+import base64
+import http.client
+import inspect
+import io
+import socket
+import ssl
+import time
+import urllib.parse
+import urllib.request
+
+from collections.abc import Awaitable, Iterable, MutableMapping
+from typing import Any, Callable
+
+from .api import *
+from .api_connection import *
+from .constants import *
+
+
+class AsyncConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.__reader = reader
+        self.__writer = writer
+
+
+    @property
+    def reader(self) -> asyncio.StreamReader:
+        return self.__reader
+
+
+    @property
+    def writer(self) -> asyncio.StreamWriter:
+        return self.__writer
+
+
+    def is_alive(self) -> bool:
+        # アイドル中に EOF を受信していれば、サーバ側で切断されている
+        return not self.__writer.is_closing() and not self.__reader.at_eof()
+
+
+    def close(self) -> None:
+        self.__writer.close()
+
+
+class AsyncConnectionPool:
+    def __init__(
+        self,
+        *,
+        max_size: int = 10,
+        idle_timeout: float = 4.0,
+        timeout: float | None = None,
+        ssl_context: ssl.SSLContext | None = None,
+        proxies: dict[str, str] | None = None
+    ) -> None:
+        self.__max_size = max_size
+        self.__idle_timeout = idle_timeout
+        self.__timeout = timeout
+        self.__ssl_context = ssl_context
+        # 省略時は環境変数のプロキシ設定を使う。プロキシを使わない場合は空の辞書を渡す
+        self.__proxies = proxies if proxies is not None else urllib.request.getproxies()
+        self.__idle_connections: dict[ConnectionKey, list[tuple[AsyncConnection, float]]] = {}
+
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
+
+
+    @property
+    def idle_timeout(self) -> float:
+        return self.__idle_timeout
+
+
+    @property
+    def timeout(self) -> float | None:
+        return self.__timeout
+
+
+    @property
+    def proxies(self) -> dict[str, str]:
+        return self.__proxies
+
+
+    def idle_count(self, key: ConnectionKey | None = None) -> int:
+        if key is not None:
+            return len(self.__idle_connections.get(key, []))
+        else:
+            return sum(len(connections) for connections in self.__idle_connections.values())
+
+
+    async def urlopen(
+        self,
+        method: str,
+        url: str,
+        body: bytes | Iterable[bytes] | None = None,
+        headers: dict[str, str] | None = None,
+        *,
+        timings: ApiTimings | None = None
+    ) -> BufferedResponse:
+        key, target = split_url(url)
+        timings = timings if timings is not None else ApiTimings()
+        # ジェネレータなどの本文は再送できない。
+        # 送信し終えた後に切断された場合は ITA が処理済みの可能性があるため、EDIT や EXECUTE は再送しない
+        retryable = body is None or isinstance(body, (bytes, bytearray))
+        idempotent = is_idempotent_request(method, headers)
+
+        proxy = find_proxy(key, self.__proxies)
+        if proxy is not None and key[0] == 'http':
+            target = to_proxy_target(key, target)
+            headers = {**proxy[2], **(headers if headers else {})}
+
+        while True:
+            with timings.measure('connect'):
+                connection, reused = await self.__acquire(key, proxy)
+
+            sent = False
+            async def exchange() -> tuple[BufferedResponse, bool]:
+                nonlocal sent
+                await self.__send_request(connection, key, method, target, body, headers if headers else {}, timings)
+                sent = True
+                return await self.__read_response(connection, method, timings)
+
+            try:
+                response, reusable = await asyncio.wait_for(exchange(), self.__timeout)
+            except (ConnectionError, asyncio.IncompleteReadError, http.client.BadStatusLine):
+                connection.close()
+                # 再利用した接続がサーバ側で閉じられていた場合は新しい接続で1度だけやり直す
+                if reused and retryable and (not sent or idempotent):
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            self.__release(key, connection, reusable)
+            return response
+
+
+    async def close(self) -> None:
+        idle_connections, self.__idle_connections = self.__idle_connections, {}
+
+        for connections in idle_connections.values():
+            for connection, _ in connections:
+                connection.close()
+
+
+    async def __acquire(self, key: ConnectionKey, proxy: ProxyInfo | None) -> tuple[AsyncConnection, bool]:
+        connections = self.__idle_connections.get(key, [])
+        while connections:
+            connection, idle_since = connections.pop()
+            if time.monotonic() - idle_since <= self.__idle_timeout and connection.is_alive():
+                return connection, True
+            connection.close()
+
+        protocol, host, port = key
+        if protocol == 'https':
+            ssl_context = self.__ssl_context if self.__ssl_context else ssl.create_default_context()
+            if proxy is not None:
+                open_connection = self.__open_tunnel(proxy, host, port, ssl_context)
+            else:
+                open_connection = asyncio.open_connection(host, port, ssl=ssl_context, server_hostname=host)
+        elif proxy is not None:
+            open_connection = asyncio.open_connection(proxy[0], proxy[1])
+        else:
+            open_connection = asyncio.open_connection(host, port)
+
+        reader, writer = await asyncio.wait_for(open_connection, self.__timeout)
+        return AsyncConnection(reader, writer), False
+
+
+    async def __open_tunnel(self, proxy: ProxyInfo, host: str, port: int, ssl_context: ssl.SSLContext) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        # プロキシに CONNECT で中継を依頼し、確立したソケットの上で TLS を開始する
+        loop = asyncio.get_running_loop()
+        proxy_host, proxy_port, proxy_headers = proxy
+        family, socket_type, proto, _, address = (await loop.getaddrinfo(proxy_host, proxy_port, type=socket.SOCK_STREAM))[0]
+
+        sock = socket.socket(family, socket_type, proto)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, address)
+
+            request_head = f'CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in proxy_headers.items()) + '\r\n'
+            await loop.sock_sendall(sock, request_head.encode('latin-1'))
+
+            # TLS を開始するまでプロキシはヘッダ以外を送らないため、空行まで読めばよい
+            response_head = b''
+            while b'\r\n\r\n' not in response_head:
+                chunk = await loop.sock_recv(sock, 4096)
+                if not chunk:
+                    raise http.client.RemoteDisconnected('Proxy closed connection without response')
+                response_head += chunk
+
+            status_line = response_head.split(b'\r\n', 1)[0].decode('latin-1')
+            if status_line.split(' ', 2)[1:2] != ['200']:
+                raise OSError(f'Tunnel connection failed: {status_line}')
+
+            return await asyncio.open_connection(sock=sock, ssl=ssl_context, server_hostname=host)
+        except BaseException:
+            sock.close()
+            raise
+
+
+    def __release(self, key: ConnectionKey, connection: AsyncConnection, reusable: bool) -> None:
+        connections = self.__idle_connections.setdefault(key, [])
+        if reusable and len(connections) < self.__max_size:
+            connections.append((connection, time.monotonic()))
+        else:
+            connection.close()
+
+
+    async def __send_request(
+        self,
+        connection: AsyncConnection,
+        key: ConnectionKey,
+        method: str,
+        target: str,
+        body: bytes | Iterable[bytes] | None,
+        headers: dict[str, str],
+        timings: ApiTimings
+    ) -> None:
+        protocol, host, port = key
+        default_port = 443 if protocol == 'https' else 80
+        chunked = body is not None and not isinstance(body, (bytes, bytearray))
+
+        request_headers = {
+            'Host': host if port == default_port else f'{host}:{port}',
+            'Accept-Encoding': 'identity',
+            **headers,
+            **({'Transfer-Encoding': 'chunked'} if chunked else {'Content-Length': str(len(body) if body is not None else 0)})  # type: ignore[arg-type]
+        }
+
+        request_head = f'{method} {target} HTTP/1.1\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in request_headers.items()) + '\r\n'
+        begin_time = timings.clock()
+        if chunked:
+            connection.writer.write(request_head.encode('latin-1'))
+            for chunk in body:  # type: ignore[union-attr]
+                if chunk:
+                    connection.writer.write(f'{len(chunk):X}\r\n'.encode('latin-1') + chunk + b'\r\n')
+                    await connection.writer.drain()
+            connection.writer.write(b'0\r\n\r\n')
+        else:
+            connection.writer.write(request_head.encode('latin-1') + (body if body is not None else b''))  # type: ignore[operator]
+        await connection.writer.drain()
+        timings.add('send', timings.clock() - begin_time)
+
+
+    async def __read_response(self, connection: AsyncConnection, method: str, timings: ApiTimings) -> tuple[BufferedResponse, bool]:
+        send_end_time = timings.clock()
+        status_line = await connection.reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected('Remote end closed connection without response')
+
+        try:
+            version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+            status_code = int(status)
+        except ValueError as e:
+            raise http.client.BadStatusLine(status_line.decode('latin-1')) from e
+
+        header_lines = []
+        while True:
+            line = await connection.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+
+        response_headers = http.client.parse_headers(io.BytesIO(b''.join(header_lines) + b'\r\n'))
+
+        will_close = version != 'HTTP/1.1' or response_headers.get('Connection', '').lower() == 'close'
+        headers_end_time = timings.clock()
+        timings.add('wait', headers_end_time - send_end_time)
+
+        if method == 'HEAD' or status_code in (204, 304) or 100 <= status_code < 200:
+            response_body = b''
+        elif response_headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            response_body = await self.__read_chunked(connection.reader)
+        elif response_headers.get('Content-Length') is not None:
+            response_body = await connection.reader.readexactly(int(response_headers['Content-Length']))
+        else:
+            response_body = await connection.reader.read()
+            will_close = True
+
+        timings.add('transfer', timings.clock() - headers_end_time)
+
+        return BufferedResponse(status_code, reason, response_headers, response_body), not will_close
+
+
+    async def __read_chunked(self, reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            if not size_line:
+                raise asyncio.IncompleteReadError(b''.join(chunks), None)
+
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # trailer を読み飛ばす
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+class AsyncApiRequest(IndexerMixin):
+    def __init__(
+        self,
+        api_context: 'AsyncApiContext',
+        url: str,
+        menu_id,
+        default_wait_func: Callable | None = None
+    ) -> None:
+        self.__api_context: AsyncApiContext = api_context
+        self.__url: str = url
+        self.__credential: str = base64.b64encode((api_context.username + ':' + api_context.password).encode()).decode()
+        self.__menu_id: str = menu_id
+        self.__indexer: Indexer | None = None
+        self.__options_table: dict[str, dict[str, str]] | None = None
+        self.__default_wait_func = default_wait_func if default_wait_func else AdaptiveWait().wait_async
+
+
+    @property
+    def api_context(self) -> 'AsyncApiContext':
+        return self.__api_context
+
+
+    @property
+    def url(self) -> str:
+        return self.__url
+
+
+    @property
+    def credential(self) -> str:
+        return self.__credential
+
+
+    @property
+    def menu_id(self) -> str:
+        return self.__menu_id
+
+
+    @property
+    def indexer(self) -> Indexer:
+        if self.__indexer is None:
+            raise ApiException(f'Indexer for the menu "{self.menu_id}" is not loaded yet. Call "await load_indexer()" first.')
+
+        return self.__indexer
+
+
+    @property
+    def options_table(self) -> dict:
+        if self.__options_table is None:
+            raise ApiException(f'Options table for the menu "{self.menu_id}" is not loaded yet. Call "await load_options_table()" first.')
+
+        return self.__options_table
+
+
+    async def load_indexer(self) -> Indexer:
+        if self.__indexer is None:
+            async def load_column_names():
+                with await self.send_post(xcommand=XCommand.INFO) as api_response:
+                    return api_response.json_object['resultdata']['CONTENTS']['INFO']
+
+            async def load_indexer():
+                return Indexer(
+                    menu_id=self.menu_id,
+                    column_names=await self.api_context.load_metadata_async(self.menu_id, XCommand.INFO, load_column_names)
+                )
+
+            self.__indexer = await self.api_context.get_or_load_metadata_async((self.menu_id, XCommand.INFO), load_indexer)
+
+        return self.__indexer
+
+
+    async def load_options_table(self) -> dict:
+        if self.__options_table is None:
+            async def load_options_table():
+                with await self.send_post(xcommand=XCommand.LIST_OPTIONS) as api_response:
+                    return create_options_table(api_response.json_object)
+
+            self.__options_table = await self.api_context.get_or_load_metadata_async(
+                (self.menu_id, XCommand.LIST_OPTIONS),
+                lambda: self.api_context.load_metadata_async(self.menu_id, XCommand.LIST_OPTIONS, load_options_table)
+            )
+
+        return self.__options_table
+
+
+    async def send_get(
+        self,
+        *,
+        wait_func: Callable | None = None,
+        wait_func_args: dict = {}
+    ) -> ApiResponse:
+        return await self.__invoke(
+            http_method=HttpMethod.GET,
+            xcommand=None,
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': self.credential,
+                **self.api_context.accept_encoding_header
+            },
+            wait_func=wait_func,
+            wait_func_args=wait_func_args
+        )
+
+
+    async def send_post(
+        self,
+        xcommand: str,
+        params: dict | None = None,
+        *,
+        wait_func: Callable | None = None,
+        wait_func_args: dict = {},
+        cache: bool = True
+    ) -> ApiResponse:
+        return await self.__invoke(
+            http_method=HttpMethod.POST,
+            xcommand=xcommand,
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': self.credential,
+                'X-Command': xcommand,
+                **self.api_context.accept_encoding_header
+            },
+            params=params,
+            wait_func=wait_func,
+            wait_func_args=wait_func_args,
+            cache=cache
+        )
+
+
+    async def __invoke(
+        self,
+        http_method: str,
+        xcommand: str | None,
+        headers: dict[str, str],
+        params: dict | None = None,
+        *,
+        wait_func: Callable | None,
+        wait_func_args: dict,
+        cache: bool = False
+    ) -> ApiResponse:
+
+        self.api_context.event_handler.on_request(
+            api_request=self,  # type: ignore[arg-type]
+            http_method=http_method,
+            xcommand=xcommand,
+            headers=headers,
+            params=params,
+            wait_func=wait_func,
+            wait_func_args=wait_func_args
+        )
+
+        timings = ApiTimings()
+
+        # ファイルを含む場合はメモリに展開せず chunked 転送で送信する。この場合エンコードは送信時に行われる
+        with timings.measure('encode'):
+            if params is not None and contains_path(params):
+                data = CountingIterable(iter_json_chunks(params))
+            else:
+                data = self.api_context.json_codec.dumps(params) if params is not None else None
+
+            if xcommand == XCommand.EDIT and isinstance(data, bytes) and 0 < self.api_context.request_compression_threshold <= len(data):
+                data = compress_body(data)
+                headers = {**headers, 'Content-Encoding': 'gzip'}
+
+        response_cache = self.api_context.response_cache
+        modifying = xcommand in [XCommand.EDIT, XCommand.EXECUTE, XCommand.UPLOAD, XCommand.UPLOAD_SPREADSHEET]
+
+        if response_cache is not None and modifying:
+            response_cache.invalidate(self.menu_id)
+
+        response = exception = None
+        try:
+            # 非同期版では同一リクエストの集約は行わず、キャッシュの参照と登録のみ行う
+            if cache and response_cache is not None and response_cache.is_cacheable(xcommand) and not isinstance(data, CountingIterable):
+                key = response_cache.make_key(self.menu_id, xcommand, params)  # type: ignore[arg-type]
+                entry = response_cache.get(key)
+                if entry is None:
+                    generation = response_cache.generation(key)
+                    fetched = await self.__urlopen(http_method, xcommand, data, headers, timings)
+                    entry = response_cache.create_entry(fetched.status, fetched.reason, fetched.headers, fetched.read())
+                    if entry.status == 200:
+                        response_cache.put(key, entry, generation=generation)
+
+                response = entry.to_response()
+            else:
+                response = await self.__urlopen(http_method, xcommand, data, headers, timings)
+        except Exception as e:
+            exception = e
+
+        if response_cache is not None and modifying:
+            response_cache.invalidate(self.menu_id)
+
+        api_response = ApiResponse(
+            api_request=self,  # type: ignore[arg-type]
+            http_method=http_method,
+            xcommand=xcommand,
+            params=params,
+            response=response,
+            exception=exception,
+            request_size=data.size if isinstance(data, CountingIterable) else len(data) if data is not None else 0,
+            timings=timings
+        )
+
+        self.api_context.event_handler.on_response(
+            api_request=self,  # type: ignore[arg-type]
+            api_response=api_response
+        )
+
+        # 本文のない失敗はここで完了とする
+        if response is None:
+            api_response.close()
+
+        # 更新系の処理であれば待ち合わせ関数を呼び出す。待ち合わせ関数はコルーチン関数でもよい
+        # エラーが発生している場合は待ち合わせしない
+        if xcommand in [XCommand.EDIT, XCommand.EXECUTE, XCommand.UPLOAD, XCommand.UPLOAD_SPREADSHEET] and not api_response.failed:
+            wait_func = wait_func if wait_func else self.__default_wait_func
+
+            self.api_context.event_handler.before_wait_func(
+                api_request=self,  # type: ignore[arg-type]
+                wait_func=wait_func,
+                wait_func_args=wait_func_args
+            )
+
+            begin_time = time.time()
+            result = wait_func(api_response, **wait_func_args)
+            if inspect.isawaitable(result):
+                await result
+            end_time = time.time()
+
+            self.api_context.event_handler.after_wait_func(
+                api_request=self,  # type: ignore[arg-type]
+                wait_func=wait_func,
+                wait_func_args=wait_func_args,
+                wait_duration=end_time - begin_time
+            )
+
+        return api_response
+
+
+    async def __urlopen(self, http_method: str, xcommand: str | None, data: Any, headers: dict[str, str], timings: ApiTimings) -> BufferedResponse:
+        concurrency_controller = self.api_context.concurrency_controller
+        if concurrency_controller is None:
+            return await self.api_context.async_connection_pool.urlopen(method=http_method, url=self.url, body=data, headers=headers, timings=timings)
+
+        # 同期版と同じ制限を使うため、スレッドとコルーチンから同時に送信しても上限は共有される
+        async with concurrency_controller.slot(self.menu_id, xcommand) as slot:
+            response = await self.api_context.async_connection_pool.urlopen(method=http_method, url=self.url, body=data, headers=headers, timings=timings)
+            slot.set_status(response.status)
+            return response
+
+
+class AsyncApiContext(ApiContext):
+    def __init__(
+        self,
+        config: MutableMapping[str, str] = {},
+        *,
+        default_wait_func: Callable | None = None,
+        event_hook: EventHook = EventHook(),
+        connection_pool: ConnectionPool | None = None,
+        metadata_cache: MetadataCache | None = None,
+        metadata_registry: MetadataRegistry | None = None,
+        response_cache: ResponseCache | None = None,
+        json_codec: JsonCodec | None = None,
+        transport: Transport | None = None,
+        web_session_pool: 'WebSessionPool | None' = None,
+        concurrency_controller: ConcurrencyController | None = None,
+        async_connection_pool: AsyncConnectionPool | None = None
+    ) -> None:
+        super().__init__(
+            config,
+            default_wait_func=default_wait_func,
+            event_hook=event_hook,
+            connection_pool=connection_pool,
+            metadata_cache=metadata_cache,
+            metadata_registry=metadata_registry,
+            response_cache=response_cache,
+            json_codec=json_codec,
+            transport=transport,
+            web_session_pool=web_session_pool,
+            concurrency_controller=concurrency_controller
+        )
+
+        self.__async_connection_pool = async_connection_pool if async_connection_pool else AsyncConnectionPool(
+            max_size=int(config.get('EXASTRO_POOL_SIZE', '10')),
+            idle_timeout=float(config.get('EXASTRO_POOL_IDLE_TIMEOUT', '4'))
+        )
+        self.__metadata_loads: dict[tuple[str, str], asyncio.Future] = {}
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+    @property
+    def async_connection_pool(self) -> AsyncConnectionPool:
+        return self.__async_connection_pool
+
+
+    async def get_or_load_metadata_async(self, key: tuple[str, str], loader: Callable[[], Awaitable[Any]]) -> Any:
+        # 同期版の MetadataRegistry.get_or_load と同様に、同じメタ情報の読み込みが実行中であればその結果を待つ
+        value = self.metadata_registry.get(key)
+        if value is not None:
+            return value
+
+        loading = self.__metadata_loads.get(key)
+        if loading is None:
+            async def load():
+                try:
+                    value = await loader()
+                    self.metadata_registry.put(key, value)
+                    return value
+                finally:
+                    del self.__metadata_loads[key]
+
+            loading = self.__metadata_loads[key] = asyncio.ensure_future(load())
+
+        # 待っている呼び出し元の1つがキャンセルされても、読み込み自体は止めない
+        return await asyncio.shield(loading)
+
+
+    async def load_metadata_async(self, menu_id: str, kind: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if self.metadata_cache is not None:
+            value = self.metadata_cache.get(self.host, self.port, menu_id, kind, username=self.username)
+            if value is not None:
+                return value
+
+        value = await loader()
+
+        if self.metadata_cache is not None:
+            self.metadata_cache.put(self.host, self.port, menu_id, kind, value, username=self.username)
+
+        return value
+
+
+    async def aclose(self) -> None:
+        self.close()
+        await self.__async_connection_pool.close()
+
+
+    def create_api_request(  # type: ignore[override]
+        self,
+        menu_id: str,
+        *,
+        default_wait_func: Callable | None = None
+    ) -> AsyncApiRequest:
+        return AsyncApiRequest(
+            self,
+            url=urllib.parse.urlunparse((
+                self.protocol,
+                self.host + ':' + self.port,
+                '/default/menu/07_rest_api_ver1.php',
+                '',
+                urllib.parse.urlencode({'no': menu_id}),
+                ''
+            )),
+            menu_id=menu_id,
+            default_wait_func=default_wait_func if default_wait_func else self.default_wait_func
+        )
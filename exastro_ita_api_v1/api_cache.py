@@ -0,0 +1,557 @@
+import hashlib
+import http.client
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from .api_connection import *
+from .constants import *
+
+
+class MetadataCache:
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        *,
+        ttl: float = 24 * 60 * 60,
+        fingerprint: str
+    ) -> None:
+        # TTL だけでは ITA の更新後も古い項目名が使われ続けるため、ITA のバージョンなどを必ず指定させる
+        if not fingerprint:
+            raise ValueError('A fingerprint such as the ITA version is required for the metadata cache.')
+
+        self.__directory = pathlib.Path(directory)
+        self.__ttl = ttl
+        self.__fingerprint = fingerprint
+
+
+    @property
+    def directory(self) -> pathlib.Path:
+        return self.__directory
+
+
+    @property
+    def ttl(self) -> float:
+        return self.__ttl
+
+
+    @property
+    def fingerprint(self) -> str:
+        return self.__fingerprint
+
+
+    def get(self, host: str, port: str, menu_id: str, kind: str, *, username: str = '') -> Any | None:
+        path = self.__to_path(host, port, menu_id, kind, username)
+
+        try:
+            with path.open('r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        # フィンガープリントやユーザが異なるもの、TTL を過ぎたものは無効
+        if entry.get('fingerprint') != self.__fingerprint or entry.get('username', '') != username or time.time() - entry.get('created_at', 0) > self.__ttl:
+            return None
+
+        return entry.get('value')
+
+
+    def put(self, host: str, port: str, menu_id: str, kind: str, value: Any, *, username: str = '') -> None:
+        path = self.__to_path(host, port, menu_id, kind, username)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        entry = {
+            'fingerprint': self.__fingerprint,
+            'username': username,
+            'created_at': time.time(),
+            'value': value
+        }
+
+        # 他プロセスが書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+        fd, temporary_path = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(entry, file, ensure_ascii=False)
+            os.replace(temporary_path, path)
+        except BaseException:
+            pathlib.Path(temporary_path).unlink(missing_ok=True)
+            raise
+
+
+    def invalidate(
+        self,
+        host: str | None = None,
+        port: str | None = None,
+        menu_id: str | None = None,
+        kind: str | None = None
+    ) -> None:
+        if host is None:
+            targets = [self.__directory]
+        elif port is None:
+            targets = [path for path in self.__directory.glob(self.__quote(host) + '-*') if path.name.rsplit('-', 1)[0] == self.__quote(host)]
+        elif menu_id is None:
+            targets = [self.__to_server_directory(host, port)]
+        elif kind is None:
+            targets = [self.__to_server_directory(host, port) / self.__quote(menu_id)]
+        else:
+            targets = list((self.__to_server_directory(host, port) / self.__quote(menu_id)).glob(self.__quote(kind) + '-*.json'))
+
+        for target in targets:
+            if target.is_dir():
+                shutil.rmtree(target, ignore_errors=True)
+            else:
+                target.unlink(missing_ok=True)
+
+
+    def __to_server_directory(self, host: str, port: str) -> pathlib.Path:
+        return self.__directory / f'{self.__quote(host)}-{self.__quote(port)}'
+
+
+    def __to_path(self, host: str, port: str, menu_id: str, kind: str, username: str) -> pathlib.Path:
+        # LIST_OPTIONS の選択肢はロールによって異なるため、ユーザごとに分ける
+        digest = hashlib.sha256(json.dumps([self.__fingerprint, username]).encode()).hexdigest()[:16]
+        return self.__to_server_directory(host, port) / self.__quote(menu_id) / f'{self.__quote(kind)}-{digest}.json'
+
+
+    def __quote(self, value: str) -> str:
+        return urllib.parse.quote(str(value), safe='')
+
+
+class InFlightLoad:
+    def __init__(self) -> None:
+        self.__owner = threading.get_ident()
+        self.__event = threading.Event()
+        self.__value: Any = None
+        self.__exception: BaseException | None = None
+
+
+    @property
+    def owner(self) -> int:
+        return self.__owner
+
+
+    def set_result(self, value: Any) -> None:
+        self.__value = value
+        self.__event.set()
+
+
+    def set_exception(self, exception: BaseException) -> None:
+        self.__exception = exception
+        self.__event.set()
+
+
+    def result(self) -> Any:
+        self.__event.wait()
+
+        if self.__exception is not None:
+            raise self.__exception
+
+        return self.__value
+
+
+class MetadataRegistry:
+    def __init__(self, *, max_size: int = 256) -> None:
+        self.__max_size = max_size
+        self.__entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.__in_flight: dict[Hashable, InFlightLoad] = {}
+        self.__generation = 0
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
+
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
+
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+
+    @property
+    def evictions(self) -> int:
+        return self.__evictions
+
+
+    def get(self, key: Hashable) -> Any | None:
+        with self.__lock:
+            value = self.__entries.get(key)
+            if value is None:
+                self.__misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return value
+
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self.__lock:
+            self.__put(key, value)
+
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        # 同じキーの読み込みが実行中であれば、新たに読み込まずその結果を待つ
+        with self.__lock:
+            value = self.__entries.get(key)
+            if value is not None:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return value
+
+            self.__misses += 1
+
+            generation = self.__generation
+            in_flight = self.__in_flight.get(key)
+            if in_flight is None:
+                in_flight = self.__in_flight[key] = InFlightLoad()
+                loading = True
+            else:
+                loading = False
+
+        if not loading:
+            # 読み込み中のスレッド自身から再度呼ばれた場合は、待つとデッドロックするのでそのまま読み込む
+            if in_flight.owner == threading.get_ident():
+                return loader()
+
+            return in_flight.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self.__lock:
+                self.__remove_in_flight(key, in_flight)
+            in_flight.set_exception(e)
+            raise
+
+        with self.__lock:
+            self.__remove_in_flight(key, in_flight)
+            # 読み込み中に invalidate された場合、古い可能性がある値は登録しない
+            if generation == self.__generation:
+                self.__put(key, value)
+        in_flight.set_result(value)
+
+        return value
+
+
+    def invalidate(self, predicate: Callable[[Hashable], bool] | None = None) -> None:
+        with self.__lock:
+            self.__generation += 1
+            # 読み込み中のものは待っている呼び出し元には返すが、登録はしない
+            for key in [key for key in self.__in_flight.keys() if predicate is None or predicate(key)]:
+                del self.__in_flight[key]
+
+            if predicate is None:
+                self.__entries.clear()
+            else:
+                for key in [key for key in self.__entries.keys() if predicate(key)]:
+                    del self.__entries[key]
+
+
+    def reset_statistics(self) -> None:
+        with self.__lock:
+            self.__hits = self.__misses = self.__evictions = 0
+
+
+    def __put(self, key: Hashable, value: Any) -> None:
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+            self.__evictions += 1
+
+
+    def __remove_in_flight(self, key: Hashable, in_flight: InFlightLoad) -> None:
+        # invalidate 後に別のスレッドが開始した読み込みは消さない
+        if self.__in_flight.get(key) is in_flight:
+            del self.__in_flight[key]
+
+
+class CachedResponse:
+    __slots__ = ('__status', '__reason', '__headers', '__body', '__created_at')
+
+
+    def __init__(self, status: int, reason: str, headers: http.client.HTTPMessage, body: bytes, *, created_at: float = 0.0) -> None:
+        self.__status = status
+        self.__reason = reason
+        self.__headers = headers
+        self.__body = body
+        self.__created_at = created_at
+
+
+    @property
+    def status(self) -> int:
+        return self.__status
+
+
+    @property
+    def reason(self) -> str:
+        return self.__reason
+
+
+    @property
+    def headers(self) -> http.client.HTTPMessage:
+        return self.__headers
+
+
+    @property
+    def body(self) -> bytes:
+        return self.__body
+
+
+    @property
+    def created_at(self) -> float:
+        return self.__created_at
+
+
+    @property
+    def size(self) -> int:
+        return len(self.__body)
+
+
+    def to_response(self) -> BufferedResponse:
+        # 本文は共有し、読み出し位置のみ呼び出し元ごとに持つ
+        return BufferedResponse(self.__status, self.__reason, self.__headers, self.__body)
+
+
+ResponseCacheKey = tuple[str, str, str]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        *,
+        ttl: float = 5.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entries: int = 1024,
+        xcommands: tuple[str, ...] = (XCommand.FILTER,),
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        # FILTER_DATAONLY は待ち合わせ関数が反映確認に使うため、既定ではキャッシュしない
+        self.__ttl = ttl
+        self.__max_bytes = max_bytes
+        self.__max_entries = max_entries
+        self.__xcommands = xcommands
+        self.__clock = clock
+        self.__entries: OrderedDict[ResponseCacheKey, CachedResponse] = OrderedDict()
+        self.__in_flight: dict[ResponseCacheKey, InFlightLoad] = {}
+        self.__generations: dict[str, int] = {}
+        self.__generation = 0
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__coalesced = 0
+        self.__evictions = 0
+
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
+
+
+    @property
+    def ttl(self) -> float:
+        return self.__ttl
+
+
+    @property
+    def max_bytes(self) -> int:
+        return self.__max_bytes
+
+
+    @property
+    def max_entries(self) -> int:
+        return self.__max_entries
+
+
+    @property
+    def xcommands(self) -> tuple[str, ...]:
+        return self.__xcommands
+
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+
+    @property
+    def coalesced(self) -> int:
+        return self.__coalesced
+
+
+    @property
+    def evictions(self) -> int:
+        return self.__evictions
+
+
+    def is_cacheable(self, xcommand: str | None) -> bool:
+        return xcommand in self.__xcommands
+
+
+    def make_key(self, menu_id: str, xcommand: str, params: dict | None) -> ResponseCacheKey:
+        # キーの順序や空白の違いで別のエントリにならないよう正規化してからハッシュする
+        canonical = json.dumps(params, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+        return (menu_id, xcommand, hashlib.sha256(canonical.encode()).hexdigest())
+
+
+    def generation(self, key: ResponseCacheKey) -> tuple[int, int]:
+        with self.__lock:
+            return self.__generation, self.__generations.get(key[0], 0)
+
+
+    def get(self, key: ResponseCacheKey) -> CachedResponse | None:
+        with self.__lock:
+            entry = self.__get(key)
+            if entry is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+
+            return entry
+
+
+    def put(self, key: ResponseCacheKey, response: CachedResponse, *, generation: tuple[int, int] | None = None) -> None:
+        with self.__lock:
+            # 取得中に更新系の処理が行われた場合は登録しない
+            if generation is not None and generation != (self.__generation, self.__generations.get(key[0], 0)):
+                return
+
+            self.__put(key, response)
+
+
+    def get_or_load(self, key: ResponseCacheKey, loader: Callable[[], CachedResponse]) -> CachedResponse:
+        # 同じキーのリクエストが実行中であれば、その結果を共有する
+        with self.__lock:
+            entry = self.__get(key)
+            if entry is not None:
+                self.__hits += 1
+                return entry
+
+            in_flight = self.__in_flight.get(key)
+            if in_flight is not None:
+                self.__coalesced += 1
+                loading = False
+            else:
+                self.__misses += 1
+                in_flight = self.__in_flight[key] = InFlightLoad()
+                generation = (self.__generation, self.__generations.get(key[0], 0))
+                loading = True
+
+        if not loading:
+            # 実行中のスレッド自身から再度呼ばれた場合は、待つとデッドロックするのでそのまま取得する
+            if in_flight.owner == threading.get_ident():
+                return loader()
+
+            return in_flight.result()
+
+        try:
+            entry = loader()
+        except BaseException as e:
+            with self.__lock:
+                self.__remove_in_flight(key, in_flight)
+            in_flight.set_exception(e)
+            raise
+
+        with self.__lock:
+            self.__remove_in_flight(key, in_flight)
+            if entry.status == 200 and generation == (self.__generation, self.__generations.get(key[0], 0)):
+                self.__put(key, entry)
+        in_flight.set_result(entry)
+
+        return entry
+
+
+    def invalidate(self, menu_id: str | None = None) -> None:
+        with self.__lock:
+            if menu_id is None:
+                self.__generation += 1
+                targets = list(self.__entries.keys())
+            else:
+                self.__generations[menu_id] = self.__generations.get(menu_id, 0) + 1
+                targets = [key for key in self.__entries.keys() if key[0] == menu_id]
+
+            for key in targets:
+                self.__size -= self.__entries.pop(key).size
+
+            # 実行中のリクエストは、更新前の結果の可能性があるため後続の呼び出しと共有しない
+            for key in [key for key in self.__in_flight.keys() if menu_id is None or key[0] == menu_id]:
+                del self.__in_flight[key]
+
+
+    def reset_statistics(self) -> None:
+        with self.__lock:
+            self.__hits = self.__misses = self.__coalesced = self.__evictions = 0
+
+
+    def create_entry(self, status: int, reason: str, headers: http.client.HTTPMessage, body: bytes) -> CachedResponse:
+        return CachedResponse(status, reason, headers, body, created_at=self.__clock())
+
+
+    def __get(self, key: ResponseCacheKey) -> CachedResponse | None:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+
+        if self.__clock() - entry.created_at > self.__ttl:
+            del self.__entries[key]
+            self.__size -= entry.size
+            return None
+
+        self.__entries.move_to_end(key)
+        return entry
+
+
+    def __put(self, key: ResponseCacheKey, entry: CachedResponse) -> None:
+        # 上限より大きいレスポンスはキャッシュしない
+        if entry.size > self.__max_bytes:
+            return
+
+        previous = self.__entries.pop(key, None)
+        if previous is not None:
+            self.__size -= previous.size
+
+        self.__entries[key] = entry
+        self.__size += entry.size
+
+        while self.__size > self.__max_bytes or len(self.__entries) > self.__max_entries:
+            _, evicted = self.__entries.popitem(last=False)
+            self.__size -= evicted.size
+            self.__evictions += 1
+
+
+    def __remove_in_flight(self, key: ResponseCacheKey, in_flight: InFlightLoad) -> None:
+        if self.__in_flight.get(key) is in_flight:
+            del self.__in_flight[key]
@@ -0,0 +1,85 @@
+import json
+
+from typing import Any
+
+
+JsonInput = bytes | bytearray | memoryview | str
+
+
+class JsonCodec:
+    name = 'json'
+
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}()'
+
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode()
+
+
+    def loads(self, data: JsonInput) -> Any:
+        # 標準ライブラリは memoryview を受け付けない
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+
+    def __init__(self) -> None:
+        import orjson
+
+        self.__orjson = orjson
+
+
+    def dumps(self, value: Any) -> bytes:
+        # 数値のキーを持つパラメータも標準ライブラリと同様に文字列のキーとして出力する
+        return self.__orjson.dumps(value, option=self.__orjson.OPT_NON_STR_KEYS)
+
+
+    def loads(self, data: JsonInput) -> Any:
+        # bytes / bytearray / memoryview をコピーせずにそのままデコードできる
+        return self.__orjson.loads(data)
+
+
+class UjsonCodec(JsonCodec):
+    name = 'ujson'
+
+
+    def __init__(self) -> None:
+        import ujson
+
+        self.__ujson = ujson
+
+
+    def dumps(self, value: Any) -> bytes:
+        return self.__ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+
+    def loads(self, data: JsonInput) -> Any:
+        return self.__ujson.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+JSON_CODECS: dict[str, type[JsonCodec]] = {
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec,
+    JsonCodec.name: JsonCodec
+}
+
+
+def create_json_codec(name: str = 'auto') -> JsonCodec:
+    # auto の場合はインストールされている中で最も速いものを使う
+    if name == 'auto':
+        for codec_class in JSON_CODECS.values():
+            try:
+                return codec_class()
+            except ImportError:
+                continue
+
+    try:
+        codec_class = JSON_CODECS[name]
+    except KeyError as e:
+        raise ValueError(f'Unknown JSON codec "{name}". Valid codecs are {["auto", *JSON_CODECS.keys()]}') from e
+
+    return codec_class()
@@ -0,0 +1,311 @@
+import sys
+
+from collections.abc import Iterator, MutableMapping
+from typing import Any, Sequence
+
+from .api import *
+from .api_menu import *
+from .constants import *
+
+
+class _Missing:
+    __slots__ = ()
+
+
+    def __repr__(self) -> str:
+        return 'MISSING'
+
+
+MISSING: Any = _Missing()
+
+
+def intern_value(value: Any, max_length: int = 64) -> Any:
+    # 同じ値が多数現れる短い文字列のみ共有する
+    if isinstance(value, str) and len(value) <= max_length:
+        return sys.intern(value)
+    else:
+        return value
+
+
+class ColumnarBodyValues(MutableMapping[str, str]):
+    __slots__ = ('__store', '__position')
+
+
+    def __init__(self, store: 'ColumnarMenu', position: int) -> None:
+        self.__store = store
+        self.__position = position
+
+
+    def __getitem__(self, index: str) -> str:
+        value = self.__store.columns[self.__store.to_column_position(index)][self.__position]
+        if value is MISSING:
+            raise KeyError(index)
+
+        return value
+
+
+    def __setitem__(self, index: str, value: str) -> None:
+        self.__store.columns[self.__store.to_column_position(index)][self.__position] = intern_value(value)
+
+
+    def __delitem__(self, index: str) -> None:
+        self.__getitem__(index)
+        self.__store.columns[self.__store.to_column_position(index)][self.__position] = MISSING
+
+
+    def __iter__(self) -> Iterator[str]:
+        for index, column in zip(self.__store.indexes, self.__store.columns):
+            if column[self.__position] is not MISSING:
+                yield index
+
+
+    def __len__(self) -> int:
+        return sum(1 for column in self.__store.columns if column[self.__position] is not MISSING)
+
+
+    def clear(self) -> None:
+        for column in self.__store.columns:
+            column[self.__position] = MISSING
+
+
+class ColumnarFileValues(MutableMapping[str, str]):
+    __slots__ = ('__store', '__position')
+
+
+    def __init__(self, store: 'ColumnarMenu', position: int) -> None:
+        self.__store = store
+        self.__position = position
+
+
+    def __getitem__(self, index: str) -> str:
+        values = self.__store.files[self.__position]
+        if values is None:
+            raise KeyError(index)
+
+        return values[index]
+
+
+    def __setitem__(self, index: str, value: str) -> None:
+        values = self.__store.files[self.__position]
+        if values is None:
+            values = self.__store.files[self.__position] = {}
+
+        values[index] = value
+
+
+    def __delitem__(self, index: str) -> None:
+        values = self.__store.files[self.__position]
+        if values is None:
+            raise KeyError(index)
+
+        del values[index]
+
+
+    def __iter__(self) -> Iterator[str]:
+        values = self.__store.files[self.__position]
+        return iter(list(values.keys()) if values else [])
+
+
+    def __len__(self) -> int:
+        values = self.__store.files[self.__position]
+        return len(values) if values else 0
+
+
+class ColumnarRow(IndexerMixin):
+    __slots__ = ('__store', '__position')
+
+
+    def __init__(self, store: 'ColumnarMenu', position: int) -> None:
+        self.__store = store
+        self.__position = position
+
+
+    def __getitem__(self, column_name: str) -> str:
+        value = self.__store.columns[self.__store.to_position(column_name)][self.__position]
+        if value is MISSING:
+            raise KeyError(column_name)
+
+        return value
+
+
+    def __setitem__(self, column_name: str, value: str) -> None:
+        self.__store.columns[self.__store.to_position(column_name)][self.__position] = intern_value(value)
+
+
+    @property
+    def indexer(self) -> Indexer:
+        return self.__store.indexer
+
+
+    @property
+    def position(self) -> int:
+        return self.__position
+
+
+    @property
+    def id(self) -> str:
+        value = self.__store.columns[self.__store.to_column_position(CommonIndex.ID)][self.__position]
+        if value is MISSING:
+            raise KeyError(CommonIndex.ID)
+
+        return value
+
+
+    def get(self, column_name: str, default: Any = None) -> Any:
+        value = self.__store.columns[self.__store.to_position(column_name)][self.__position]
+        return default if value is MISSING else value
+
+
+    def to_row(self) -> Row:
+        return Row.from_records(
+            Record(self.indexer, ColumnarBodyValues(self.__store, self.__position)),
+            Record(self.indexer, ColumnarFileValues(self.__store, self.__position))
+        )
+
+
+# FILTERのみ受け入れ可能。FILTER_DATAONLYは受入不可
+class ColumnarMenu(IndexerMixin):
+    __slots__ = ('__indexer', '__indexes', '__column_positions', '__positions', '__columns', '__files', '__row_positions')
+
+
+    def __init__(self, indexer: Indexer, json_object: dict | None = None) -> None:
+        self.__indexer = indexer
+        # インデックスは連番とは限らないため、Indexer のインデックスごとに列を割り当てる
+        self.__indexes = list(dict.fromkeys(indexer.values()))
+        self.__column_positions = {index: position for position, index in enumerate(self.__indexes)}
+        self.__positions = {column_name: self.__column_positions[index] for column_name, index in indexer.items()}
+        self.__columns: list[list[Any]] = [[] for _ in self.__indexes]
+        self.__files: list[dict[str, str] | None] = []
+        self.__row_positions: dict[str, int] = {}
+
+        if json_object is not None:
+            body_entries = to_dict(json_object['resultdata']['CONTENTS']['BODY'])
+            file_entries = to_dict(json_object['resultdata']['CONTENTS']['UPLOAD_FILE'])
+
+            for index, body_values in body_entries.items():
+                if int(index) == 0:
+                    continue
+
+                self.append(body_values, file_entries.get(index))
+
+
+    def __len__(self) -> int:
+        return len(self.__files)
+
+
+    def __iter__(self) -> Iterator[ColumnarRow]:
+        for position in range(len(self.__files)):
+            yield ColumnarRow(self, position)
+
+
+    @classmethod
+    def from_menu(cls, menu: Menu) -> 'ColumnarMenu':
+        columnar_menu = cls(menu.indexer)
+        for row in menu.rows:
+            columnar_menu.append(row.body.values, row.file.values)
+
+        return columnar_menu
+
+
+    @classmethod
+    def from_stream(cls, indexer: Indexer, api_response: ApiResponse, *, chunk_size: int = 64 * 1024) -> 'ColumnarMenu':
+        columnar_menu = cls(indexer)
+        for row in iter_rows(indexer, api_response.open_stream(), chunk_size=chunk_size, files=True):
+            position = columnar_menu.position_of(row.id)
+            if position is None:
+                columnar_menu.append(row.body.values, row.file.values)
+            else:
+                columnar_menu[position].to_row().merge(row)
+
+        return columnar_menu
+
+
+    def __getitem__(self, position: int) -> ColumnarRow:
+        if not -len(self.__files) <= position < len(self.__files):
+            raise IndexError(f'Row position {position} is out of range. Row count: {len(self.__files)}')
+
+        return ColumnarRow(self, position % len(self.__files))
+
+
+    @property
+    def indexer(self) -> Indexer:
+        return self.__indexer
+
+
+    @property
+    def indexes(self) -> list[str]:
+        return self.__indexes
+
+
+    @property
+    def columns(self) -> list[list[Any]]:
+        return self.__columns
+
+
+    @property
+    def files(self) -> list[dict[str, str] | None]:
+        return self.__files
+
+
+    @property
+    def rows(self) -> Sequence[Row]:
+        return [ColumnarRow(self, position).to_row() for position in range(len(self.__files))]
+
+
+    def to_position(self, column_name: str) -> int:
+        try:
+            return self.__positions[column_name]
+        except KeyError:
+            # エラーメッセージは Indexer に組み立てさせる
+            return self.__column_positions[self.__indexer[column_name]]
+
+
+    def to_column_position(self, index: str) -> int:
+        try:
+            return self.__column_positions[index]
+        except KeyError as e:
+            raise KeyError(index) from e
+
+
+    def column(self, column_name: str) -> list[Any]:
+        return self.__columns[self.to_position(column_name)]
+
+
+    def position_of(self, row_id: str) -> int | None:
+        return self.__row_positions.get(row_id)
+
+
+    def get(self, row_id: str) -> ColumnarRow | None:
+        position = self.__row_positions.get(row_id)
+        return ColumnarRow(self, position) if position is not None else None
+
+
+    def append(self, body_values: StrBlurDict, file_values: StrBlurDict = None) -> ColumnarRow:
+        body_dict = to_dict(body_values) if body_values is None or isinstance(body_values, (dict, list)) else body_values
+        file_dict = to_dict(file_values) if file_values is None or isinstance(file_values, (dict, list)) else file_values
+
+        position = len(self.__files)
+        for index, column in zip(self.__indexes, self.__columns):
+            column.append(intern_value(body_dict.get(index, MISSING)))
+
+        file_dict = {index: value for index, value in file_dict.items() if value is not None}
+        self.__files.append(file_dict if file_dict else None)
+
+        row_id = body_dict.get(CommonIndex.ID)
+        if row_id is not None:
+            self.__row_positions[row_id] = position
+
+        return ColumnarRow(self, position)
+
+
+    def to_menu(self) -> Menu:
+        menu = Menu(self.__indexer)
+        for position in range(len(self.__files)):
+            row = ColumnarRow(self, position).to_row()
+            menu.add_row(Row(self.__indexer, body_values=dict(row.body.values), file_values=dict(row.file.values)))
+
+        return menu
+
+
+    def to_edit_parameters(self) -> dict:
+        return rows_to_edit_parameters(self.rows)
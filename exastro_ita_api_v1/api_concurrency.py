@@ -0,0 +1,287 @@
+import asyncio
+import threading
+import time
+
+from typing import Callable, Hashable
+
+from .constants import *
+
+
+WRITE_XCOMMANDS = (XCommand.EDIT, XCommand.EXECUTE, XCommand.UPLOAD, XCommand.UPLOAD_SPREADSHEET)
+
+
+class ConcurrencyLimitExceeded(TimeoutError):
+    pass
+
+
+class AimdLimiter:
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.1,
+        on_change: Callable[['AimdLimiter', str], None] | None = None,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.__name = name
+        self.__min_limit = max(1, min_limit)
+        self.__max_limit = max(self.__min_limit, max_limit)
+        self.__limit = float(min(max(initial_limit, self.__min_limit), self.__max_limit))
+        self.__increase = increase
+        self.__decrease_factor = decrease_factor
+        self.__latency_tolerance = latency_tolerance
+        self.__smoothing = smoothing
+        self.__on_change = on_change
+        self.__clock = clock
+        self.__condition = threading.Condition()
+        self.__in_flight = 0
+        self.__queue_depth = 0
+        self.__baseline_latencies: dict[Hashable, float] = {}
+        self.__last_decrease_at = float('-inf')
+        self.__async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+
+    def __repr__(self) -> str:
+        return f'AimdLimiter(name={self.__name!r}, limit={self.limit}, in_flight={self.__in_flight}, queue_depth={self.__queue_depth})'
+
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+
+    @property
+    def limit(self) -> int:
+        return int(self.__limit)
+
+
+    @property
+    def min_limit(self) -> int:
+        return self.__min_limit
+
+
+    @property
+    def max_limit(self) -> int:
+        return self.__max_limit
+
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+
+    @property
+    def on_change(self) -> Callable[['AimdLimiter', str], None] | None:
+        return self.__on_change
+
+
+    @on_change.setter
+    def on_change(self, on_change: Callable[['AimdLimiter', str], None] | None) -> None:
+        self.__on_change = on_change
+
+
+    @property
+    def queue_depth(self) -> int:
+        return self.__queue_depth
+
+
+    def get_baseline_latency(self, key: Hashable = None) -> float | None:
+        return self.__baseline_latencies.get(key)
+
+
+    def acquire(self, timeout: float | None = None) -> float:
+        # 戻り値の開始時刻を release に渡す
+        with self.__condition:
+            if self.__in_flight < self.limit:
+                self.__in_flight += 1
+                return self.__clock()
+
+            self.__queue_depth += 1
+
+        # イベントフックはロックの外で呼び出す
+        self.__notify('queued')
+
+        with self.__condition:
+            try:
+                if not self.__condition.wait_for(lambda: self.__in_flight < self.limit, timeout):
+                    raise ConcurrencyLimitExceeded(f'Timed out waiting for a {self.__name} request slot. Limit: {self.limit}, In flight: {self.__in_flight}')
+
+                self.__in_flight += 1
+                return self.__clock()
+            finally:
+                self.__queue_depth -= 1
+
+
+    async def acquire_async(self, timeout: float | None = None) -> float:
+        # acquire と同じ上限を共有する。空きを待つ間はスレッドを止めず、release からの通知をイベントループで待つ
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        queued = False
+
+        try:
+            while True:
+                with self.__condition:
+                    if self.__in_flight < self.limit:
+                        self.__in_flight += 1
+                        return self.__clock()
+
+                    waiter = loop.create_future()
+                    self.__async_waiters.append((loop, waiter))
+                    if not queued:
+                        self.__queue_depth += 1
+
+                if not queued:
+                    queued = True
+                    self.__notify('queued')
+
+                try:
+                    await asyncio.wait_for(waiter, deadline - loop.time() if deadline is not None else None)
+                except asyncio.TimeoutError:
+                    raise ConcurrencyLimitExceeded(f'Timed out waiting for a {self.__name} request slot. Limit: {self.limit}, In flight: {self.__in_flight}') from None
+                finally:
+                    with self.__condition:
+                        if (loop, waiter) in self.__async_waiters:
+                            self.__async_waiters.remove((loop, waiter))
+        finally:
+            if queued:
+                with self.__condition:
+                    self.__queue_depth -= 1
+
+
+    def release(self, started_at: float, *, failed: bool = False, key: Hashable = None) -> None:
+        # 応答時間はメニューと XCommand の組み合わせ (key) ごとに比較する。FILTER と INFO では処理時間が大きく異なるため
+        latency = self.__clock() - started_at
+        reason = None
+
+        with self.__condition:
+            saturated = self.__in_flight >= self.limit
+            self.__in_flight -= 1
+
+            baseline_latency = self.__baseline_latencies.get(key)
+            spiked = baseline_latency is not None and latency > baseline_latency * self.__latency_tolerance
+            if not failed:
+                # 急増した応答時間も少しずつ基準に取り込み、恒常的に遅くなった場合は上限が戻るようにする
+                self.__baseline_latencies[key] = latency if baseline_latency is None else baseline_latency + (latency - baseline_latency) * self.__smoothing
+
+            if failed or spiked:
+                # 1回の過負荷で連続して減らしすぎないよう、前回減らした後に開始したリクエストの結果でのみ減らす
+                if started_at > self.__last_decrease_at and self.__limit > self.__min_limit:
+                    self.__limit = max(float(self.__min_limit), self.__limit * self.__decrease_factor)
+                    self.__last_decrease_at = self.__clock()
+                    reason = 'error' if failed else 'latency'
+            else:
+                # 上限まで使っている時だけ増やす。1周期 (limit 件の応答) で 1 増える
+                if saturated and self.__limit < self.__max_limit:
+                    previous_limit = self.limit
+                    self.__limit = min(float(self.__max_limit), self.__limit + self.__increase / self.__limit)
+                    if self.limit != previous_limit:
+                        reason = 'increase'
+
+            self.__condition.notify_all()
+            async_waiters, self.__async_waiters = self.__async_waiters, []
+
+        # 待機中のコルーチンは、それぞれのイベントループで起こして空きを確認させる
+        for loop, waiter in async_waiters:
+            loop.call_soon_threadsafe(wake_waiter, waiter)
+
+        if reason is not None:
+            self.__notify(reason)
+
+
+    def __notify(self, reason: str) -> None:
+        if self.__on_change is not None:
+            self.__on_change(self, reason)
+
+
+def wake_waiter(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ConcurrencySlot:
+    def __init__(self, limiter: AimdLimiter, timeout: float | None = None, *, key: Hashable = None) -> None:
+        self.__limiter = limiter
+        self.__timeout = timeout
+        self.__key = key
+        self.__started_at: float | None = None
+        self.__failed = False
+
+
+    def __enter__(self) -> 'ConcurrencySlot':
+        self.__started_at = self.__limiter.acquire(self.__timeout)
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.__started_at is not None:
+            self.__limiter.release(self.__started_at, failed=self.__failed or exc_type is not None, key=self.__key)
+
+
+    async def __aenter__(self) -> 'ConcurrencySlot':
+        self.__started_at = await self.__limiter.acquire_async(self.__timeout)
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.__exit__(exc_type, exc_value, traceback)
+
+
+    @property
+    def limiter(self) -> AimdLimiter:
+        return self.__limiter
+
+
+    def set_status(self, status: int) -> None:
+        # 5xx と 429 は ITA 側の過負荷とみなす
+        self.__failed = status >= 500 or status == 429
+
+
+class ConcurrencyController:
+    def __init__(
+        self,
+        *,
+        read_limiter: AimdLimiter | None = None,
+        write_limiter: AimdLimiter | None = None,
+        max_read_concurrency: int = 10,
+        max_write_concurrency: int = 10,
+        acquire_timeout: float | None = None,
+        on_change: Callable[[AimdLimiter, str], None] | None = None
+    ) -> None:
+        # 参照系と更新系で上限を分け、更新の負荷で参照まで絞られないようにする。どちらも少ない同時実行数から始める
+        self.__read_limiter = read_limiter if read_limiter else AimdLimiter(
+            'read',
+            initial_limit=min(4, max_read_concurrency),
+            max_limit=max_read_concurrency,
+            on_change=on_change
+        )
+        self.__write_limiter = write_limiter if write_limiter else AimdLimiter(
+            'write',
+            initial_limit=1,
+            max_limit=max_write_concurrency,
+            on_change=on_change
+        )
+        self.__acquire_timeout = acquire_timeout
+
+
+    @property
+    def read_limiter(self) -> AimdLimiter:
+        return self.__read_limiter
+
+
+    @property
+    def write_limiter(self) -> AimdLimiter:
+        return self.__write_limiter
+
+
+    def get_limiter(self, xcommand: str | None) -> AimdLimiter:
+        return self.__write_limiter if xcommand in WRITE_XCOMMANDS else self.__read_limiter
+
+
+    def slot(self, menu_id: str, xcommand: str | None) -> ConcurrencySlot:
+        return ConcurrencySlot(self.get_limiter(xcommand), self.__acquire_timeout, key=(menu_id, xcommand))
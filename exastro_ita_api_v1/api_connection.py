@@ -0,0 +1,321 @@
+import base64
+import http.client
+import io
+import select
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from collections.abc import Iterable
+from typing import Callable
+
+from .api_timing import *
+from .constants import *
+
+
+ConnectionKey = tuple[str, str, int]
+ProxyInfo = tuple[str, int, dict[str, str]]
+
+
+# 送信後に接続が切れた場合でも、再送して副作用のないリクエスト
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+IDEMPOTENT_XCOMMANDS = (XCommand.INFO, XCommand.FILTER, XCommand.FILTER_DATAONLY, XCommand.LIST_OPTIONS)
+
+
+def is_idempotent_request(method: str, headers: dict[str, str] | None) -> bool:
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+
+    xcommand = next((value for name, value in (headers or {}).items() if name.lower() == 'x-command'), None)
+    return xcommand in IDEMPOTENT_XCOMMANDS
+
+
+def split_url(url: str) -> tuple[ConnectionKey, str]:
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ('http', 'https'):
+        raise ValueError(f'Unsupported protocol "{parsed.scheme}" in URL "{url}".')
+
+    port = parsed.port if parsed.port else (443 if parsed.scheme == 'https' else 80)
+    target = urllib.parse.urlunsplit(('', '', parsed.path if parsed.path else '/', parsed.query, ''))
+
+    return (parsed.scheme, parsed.hostname or 'localhost', port), target
+
+
+def find_proxy(key: ConnectionKey, proxies: dict[str, str]) -> ProxyInfo | None:
+    # urllib.request と同じく http_proxy / https_proxy / no_proxy に従う。戻り値はプロキシのホスト、ポート、認証ヘッダ
+    protocol, host, port = key
+    proxy_url = proxies.get(protocol)
+    if not proxy_url or urllib.request.proxy_bypass_environment(f'{host}:{port}', proxies):
+        return None
+
+    parsed = urllib.parse.urlsplit(proxy_url if '://' in proxy_url else 'http://' + proxy_url)
+    if parsed.scheme != 'http':
+        raise ValueError(f'Unsupported proxy protocol "{parsed.scheme}" in "{proxy_url}". Only http proxies are supported.')
+
+    proxy_headers = {}
+    if parsed.username is not None:
+        credential = urllib.parse.unquote(parsed.username) + ':' + urllib.parse.unquote(parsed.password or '')
+        proxy_headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(credential.encode()).decode()
+
+    return parsed.hostname or 'localhost', parsed.port if parsed.port else 80, proxy_headers
+
+
+def to_proxy_target(key: ConnectionKey, target: str) -> str:
+    # http のプロキシにはホストを含む絶対 URI で要求する
+    protocol, host, port = key
+    return f'{protocol}://{host}:{port}{target}'
+
+
+class PooledHTTPResponse(http.client.HTTPResponse):
+    def __init__(self, sock, *args, **kwargs) -> None:
+        super().__init__(sock, *args, **kwargs)
+        self.release_callback: Callable[[bool], None] | None = None
+
+
+    def close(self) -> None:
+        # 本文を最後まで読み切った場合のみ接続を再利用できる
+        reusable = (self.fp is None or self.length == 0) and not self.will_close
+
+        super().close()
+
+        release_callback, self.release_callback = self.release_callback, None
+        if release_callback:
+            release_callback(reusable)
+
+
+class BufferedResponse:
+    def __init__(
+        self,
+        status: int,
+        reason: str,
+        headers: http.client.HTTPMessage,
+        body: bytes
+    ) -> None:
+        self.__status = status
+        self.__reason = reason
+        self.__headers = headers
+        self.__fp = io.BytesIO(body)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    @property
+    def status(self) -> int:
+        return self.__status
+
+
+    @property
+    def reason(self) -> str:
+        return self.__reason
+
+
+    @property
+    def headers(self) -> http.client.HTTPMessage:
+        return self.__headers
+
+
+    @property
+    def msg(self) -> http.client.HTTPMessage:
+        return self.__headers
+
+
+    def info(self) -> http.client.HTTPMessage:
+        return self.__headers
+
+
+    def getcode(self) -> int:
+        return self.__status
+
+
+    def getheader(self, name: str, default: str | None = None) -> str | None:
+        return self.__headers.get(name, default)
+
+
+    def getheaders(self) -> list[tuple[str, str]]:
+        return list(self.__headers.items())
+
+
+    def read(self, amt: int | None = None) -> bytes:
+        return self.__fp.read(amt)
+
+
+    def readinto(self, buffer) -> int:
+        return self.__fp.readinto(buffer)
+
+
+    def close(self) -> None:
+        self.__fp.close()
+
+
+    def isclosed(self) -> bool:
+        return self.__fp.closed
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        *,
+        max_size: int = 10,
+        idle_timeout: float = 4.0,
+        timeout: float | None = None,
+        ssl_context: ssl.SSLContext | None = None,
+        proxies: dict[str, str] | None = None
+    ) -> None:
+        self.__max_size = max_size
+        self.__idle_timeout = idle_timeout
+        self.__timeout = timeout
+        self.__ssl_context = ssl_context
+        # 省略時は環境変数のプロキシ設定を使う。プロキシを使わない場合は空の辞書を渡す
+        self.__proxies = proxies if proxies is not None else urllib.request.getproxies()
+        self.__idle_connections: dict[ConnectionKey, list[tuple[http.client.HTTPConnection, float]]] = {}
+        # レスポンスのファイナライザから解放される場合があるため再入可能なロックを使う
+        self.__lock = threading.RLock()
+
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
+
+
+    @property
+    def idle_timeout(self) -> float:
+        return self.__idle_timeout
+
+
+    @property
+    def timeout(self) -> float | None:
+        return self.__timeout
+
+
+    @property
+    def proxies(self) -> dict[str, str]:
+        return self.__proxies
+
+
+    def idle_count(self, key: ConnectionKey | None = None) -> int:
+        with self.__lock:
+            if key is not None:
+                return len(self.__idle_connections.get(key, []))
+            else:
+                return sum(len(connections) for connections in self.__idle_connections.values())
+
+
+    def urlopen(
+        self,
+        method: str,
+        url: str,
+        body: bytes | Iterable[bytes] | None = None,
+        headers: dict[str, str] | None = None,
+        *,
+        timings: ApiTimings | None = None
+    ) -> PooledHTTPResponse:
+        key, target = split_url(url)
+        timings = timings if timings is not None else ApiTimings()
+        # ジェネレータなどの本文は再送できない。
+        # 送信し終えた後に切断された場合は ITA が処理済みの可能性があるため、EDIT や EXECUTE は再送しない
+        retryable = body is None or isinstance(body, (bytes, bytearray))
+        idempotent = is_idempotent_request(method, headers)
+
+        # https はプロキシとの接続を CONNECT でトンネルにするため、要求はプロキシを使わない場合と変わらない
+        proxy = find_proxy(key, self.__proxies)
+        if proxy is not None and key[0] == 'http':
+            target = to_proxy_target(key, target)
+            headers = {**proxy[2], **(headers if headers else {})}
+
+        while True:
+            connection, reused = self.__acquire(key, proxy)
+            sent = False
+            try:
+                # 接続確立を送信と分けて計測するため、新しい接続はここで明示的に接続する
+                if connection.sock is None:
+                    with timings.measure('connect'):
+                        connection.connect()
+
+                with timings.measure('send'):
+                    connection.request(method, target, body=body, headers=headers if headers else {})
+                sent = True
+
+                with timings.measure('wait'):
+                    response: PooledHTTPResponse = connection.getresponse()  # type: ignore[assignment]
+            except (ConnectionError, http.client.BadStatusLine):
+                connection.close()
+                # 再利用した接続がサーバ側で閉じられていた場合は新しい接続で1度だけやり直す
+                if reused and retryable and (not sent or idempotent):
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+
+            response.release_callback = lambda reusable: self.__release(key, connection, reusable)
+            return response
+
+
+    def close(self) -> None:
+        with self.__lock:
+            idle_connections, self.__idle_connections = self.__idle_connections, {}
+
+        for connections in idle_connections.values():
+            for connection, _ in connections:
+                connection.close()
+
+
+    def __acquire(self, key: ConnectionKey, proxy: ProxyInfo | None) -> tuple[http.client.HTTPConnection, bool]:
+        with self.__lock:
+            connections = self.__idle_connections.get(key, [])
+            while connections:
+                connection, idle_since = connections.pop()
+                if self.__is_alive(connection, idle_since):
+                    return connection, True
+                connection.close()
+
+        return self.__create_connection(key, proxy), False
+
+
+    def __release(self, key: ConnectionKey, connection: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            with self.__lock:
+                connections = self.__idle_connections.setdefault(key, [])
+                if len(connections) < self.__max_size:
+                    connections.append((connection, time.monotonic()))
+                    return
+
+        connection.close()
+
+
+    def __create_connection(self, key: ConnectionKey, proxy: ProxyInfo | None) -> http.client.HTTPConnection:
+        protocol, host, port = key
+        connect_host, connect_port = (proxy[0], proxy[1]) if proxy is not None else (host, port)
+        if protocol == 'https':
+            connection = http.client.HTTPSConnection(connect_host, connect_port, timeout=self.__timeout, context=self.__ssl_context)
+            if proxy is not None:
+                connection.set_tunnel(host, port, headers=proxy[2])
+        else:
+            connection = http.client.HTTPConnection(connect_host, connect_port, timeout=self.__timeout)
+
+        connection.response_class = PooledHTTPResponse
+        return connection
+
+
+    def __is_alive(self, connection: http.client.HTTPConnection, idle_since: float) -> bool:
+        if time.monotonic() - idle_since > self.__idle_timeout:
+            return False
+
+        if connection.sock is None:
+            return False
+
+        # アイドル中の接続が読み取り可能なのは、サーバが切断したか不正なデータを送ってきた場合のみ
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+
+        return not readable
@@ -0,0 +1,165 @@
+from typing import Sequence
+
+from .api import *
+from .api_menu import *
+from .constants import *
+
+
+SYSTEM_COLUMN_NAMES = ('実行処理種別', '廃止', 'ID', '最終更新日時', '更新用の最終更新日時', '最終更新者')
+
+
+class MenuDiff(IndexerMixin):
+    def __init__(self, indexer: Indexer) -> None:
+        self.__indexer = indexer
+        self.__registered: list[Row] = []
+        self.__updated: list[Row] = []
+        self.__discarded: list[Row] = []
+        self.__revived: list[Row] = []
+        self.__deferred: list[Row] = []
+
+
+    @property
+    def indexer(self) -> Indexer:
+        return self.__indexer
+
+
+    @property
+    def registered(self) -> list[Row]:
+        return self.__registered
+
+
+    @property
+    def updated(self) -> list[Row]:
+        return self.__updated
+
+
+    @property
+    def discarded(self) -> list[Row]:
+        return self.__discarded
+
+
+    @property
+    def revived(self) -> list[Row]:
+        return self.__revived
+
+
+    @property
+    def deferred(self) -> list[Row]:
+        # 復活と同時には更新できないため、復活後に改めて差分を取る必要がある行
+        return self.__deferred
+
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.__registered or self.__updated or self.__discarded or self.__revived)
+
+
+    def to_menu(self) -> Menu:
+        menu = Menu(self.indexer)
+        for row in self.__registered + self.__updated + self.__discarded + self.__revived:
+            menu.add_row(row)
+
+        return menu
+
+
+    def to_edit_parameters(self) -> dict:
+        return rows_to_edit_parameters(self.__registered + self.__updated + self.__discarded + self.__revived)
+
+
+def diff_menus(
+    desired: Menu,
+    current: Menu,
+    *,
+    key_column_names: Sequence[str] = (),
+    ignored_column_names: Sequence[str] = (),
+    discard_missing: bool = False
+) -> MenuDiff:
+    desired.check_acceptable(current)
+
+    indexer = current.indexer
+    key_indexes = [indexer[column_name] for column_name in key_column_names]
+    ignored_indexes = {
+        indexer[column_name] for column_name in list(SYSTEM_COLUMN_NAMES) + list(ignored_column_names) if column_name in indexer
+    }
+
+    def normalize(value) -> str:
+        return '' if value is None else str(value)
+
+    def natural_key(row: Row) -> tuple[str, ...] | None:
+        key = tuple(normalize(row.body.values.get(index)) for index in key_indexes)
+        return key if key_indexes and any(key) else None
+
+    def comparable_values(row: Row, indexes: Sequence[str]) -> tuple[str, ...]:
+        return tuple(normalize(row.body.values.get(index)) for index in indexes)
+
+    current_by_id: dict[str, Row] = {}
+    current_by_key: dict[tuple[str, ...], Row] = {}
+    for row in current.rows:
+        row_id = row.body.values.get(CommonIndex.ID)
+        if row_id:
+            current_by_id[row_id] = row
+
+        key = natural_key(row)
+        if key is not None:
+            # 同じキーの行が複数ある場合は廃止されていない行を優先し、廃止された行は他にない場合のみ対象にする
+            matched_row = current_by_key.get(key)
+            if matched_row is None or (matched_row.discarded and not row.discarded):
+                current_by_key[key] = row
+
+    menu_diff = MenuDiff(indexer)
+    matched_ids: set[str] = set()
+
+    for desired_row in desired.rows:
+        desired_id = desired_row.body.values.get(CommonIndex.ID)
+        if desired_id:
+            current_row = current_by_id.get(desired_id)
+        else:
+            key = natural_key(desired_row)
+            current_row = current_by_key.get(key) if key is not None else None
+
+        compared_indexes = sorted(index for index in desired_row.body.values.keys() if index not in ignored_indexes)
+
+        if current_row is None:
+            if not desired_row.discarded:
+                menu_diff.registered.append(Row(
+                    indexer,
+                    body_values={index: desired_row.body.values[index] for index in compared_indexes},
+                    file_values=desired_row.file.clone_values(),
+                    operation=実行処理種別.登録
+                ))
+            continue
+
+        matched_ids.add(current_row.id)
+
+        if desired_row.discarded:
+            if not current_row.discarded:
+                menu_diff.discarded.append(clone_without_files(current_row, 実行処理種別.廃止))
+            continue
+
+        changed = bool(desired_row.file.values) or comparable_values(desired_row, compared_indexes) != comparable_values(current_row, compared_indexes)
+
+        if current_row.discarded:
+            menu_diff.revived.append(clone_without_files(current_row, 実行処理種別.復活))
+            if changed:
+                menu_diff.deferred.append(desired_row)
+        elif changed:
+            row = clone_without_files(current_row, 実行処理種別.更新)
+            for index in compared_indexes:
+                row.body.values[index] = desired_row.body.values[index]
+            row.file.values.update(desired_row.file.values)
+            menu_diff.updated.append(row)
+
+    # 一部の行だけを渡した場合に残りの行を廃止しないよう、廃止は明示的に指定した場合のみ行う
+    if discard_missing:
+        for row_id, current_row in current_by_id.items():
+            if row_id not in matched_ids and not current_row.discarded:
+                menu_diff.discarded.append(clone_without_files(current_row, 実行処理種別.廃止))
+
+    return menu_diff
+
+
+def clone_without_files(row: Row, operation: str) -> Row:
+    # 既存のファイルを送り返さないよう、ファイルの値は引き継がない
+    edit_row = row.clone_for_edit(operation)
+    edit_row.file.values.clear()
+    return edit_row
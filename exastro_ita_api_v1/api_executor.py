@@ -0,0 +1,339 @@
+import concurrent.futures
+import threading
+import time
+
+from collections.abc import Iterable, Iterator
+from typing import Any, Callable, Hashable
+
+from .api import *
+from .api_connection import *
+from .constants import *
+
+
+def read_json_object(api_response: ApiResponse) -> dict:
+    json_object = api_response.json_object
+    if json_object.get('status') != 'SUCCEED':
+        raise ApiException(f'Request failed. Menu ID: {api_response.menu_id}, XCommand: {api_response.xcommand}, Status: {json_object.get("status")}')
+
+    return json_object
+
+
+class ApiJob:
+    def __init__(
+        self,
+        menu_id: str,
+        xcommand: str = XCommand.FILTER,
+        params: dict | None = None,
+        *,
+        handler: Callable[[ApiResponse], Any] = read_json_object,
+        wait_func: Callable | None = None,
+        wait_func_args: dict = {},
+        api_context: 'ApiContext | None' = None,
+        key: Hashable = None
+    ) -> None:
+        self.__menu_id = menu_id
+        self.__xcommand = xcommand
+        self.__params = params
+        self.__handler = handler
+        self.__wait_func = wait_func
+        self.__wait_func_args = wait_func_args
+        self.__api_context = api_context
+        self.__key = key if key is not None else (menu_id, xcommand)
+
+
+    def __repr__(self) -> str:
+        return f'ApiJob(menu_id={self.__menu_id!r}, xcommand={self.__xcommand!r}, key={self.__key!r})'
+
+
+    @classmethod
+    def of(cls, job: 'ApiJob | tuple') -> 'ApiJob':
+        # (menu_id, xcommand, params) のタプルでも指定できる
+        return job if isinstance(job, ApiJob) else cls(*job)
+
+
+    @property
+    def menu_id(self) -> str:
+        return self.__menu_id
+
+
+    @property
+    def xcommand(self) -> str:
+        return self.__xcommand
+
+
+    @property
+    def params(self) -> dict | None:
+        return self.__params
+
+
+    @property
+    def handler(self) -> Callable[[ApiResponse], Any]:
+        return self.__handler
+
+
+    @property
+    def wait_func(self) -> Callable | None:
+        return self.__wait_func
+
+
+    @property
+    def wait_func_args(self) -> dict:
+        return self.__wait_func_args
+
+
+    @property
+    def api_context(self) -> 'ApiContext | None':
+        return self.__api_context
+
+
+    @property
+    def key(self) -> Hashable:
+        return self.__key
+
+
+class ApiJobResult:
+    def __init__(
+        self,
+        job: ApiJob,
+        index: int,
+        *,
+        value: Any = None,
+        exception: BaseException | None = None,
+        status: int = -1,
+        elapsed: float = 0.0,
+        cancelled: bool = False
+    ) -> None:
+        self.__job = job
+        self.__index = index
+        self.__value = value
+        self.__exception = exception
+        self.__status = status
+        self.__elapsed = elapsed
+        self.__cancelled = cancelled
+
+
+    def __repr__(self) -> str:
+        state = 'cancelled' if self.__cancelled else f'failed: {self.__exception!r}' if self.__exception else 'succeeded'
+        return f'ApiJobResult(index={self.__index}, job={self.__job!r}, {state})'
+
+
+    @property
+    def job(self) -> ApiJob:
+        return self.__job
+
+
+    @property
+    def index(self) -> int:
+        return self.__index
+
+
+    @property
+    def value(self) -> Any:
+        return self.__value
+
+
+    @property
+    def exception(self) -> BaseException | None:
+        return self.__exception
+
+
+    @property
+    def status(self) -> int:
+        return self.__status
+
+
+    @property
+    def elapsed(self) -> float:
+        return self.__elapsed
+
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancelled
+
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.__cancelled and self.__exception is None
+
+
+    def result(self) -> Any:
+        if self.__cancelled:
+            raise concurrent.futures.CancelledError(f'{self.__job!r} was cancelled.')
+
+        if self.__exception is not None:
+            raise self.__exception
+
+        return self.__value
+
+
+class ApiJobError(ApiException):
+    def __init__(self, results: list[ApiJobResult]) -> None:
+        super().__init__(
+            f'{len(results)} job(s) failed: '
+            + ', '.join(f'{result.job.key}: {"cancelled" if result.cancelled else repr(result.exception)}' for result in results)
+        )
+        self.__results = results
+
+
+    @property
+    def results(self) -> list[ApiJobResult]:
+        return self.__results
+
+
+    @property
+    def exceptions(self) -> dict[Hashable, BaseException | None]:
+        return {result.job.key: result.exception for result in self.__results}
+
+
+def raise_for_failures(results: Iterable[ApiJobResult]) -> list[ApiJobResult]:
+    results = list(results)
+
+    failed_results = [result for result in results if not result.succeeded]
+    if failed_results:
+        raise ApiJobError(failed_results)
+
+    return results
+
+
+class ApiExecutor:
+    def __init__(
+        self,
+        api_context: 'ApiContext',
+        *,
+        max_workers: int | None = None,
+        max_per_host: int | None = None
+    ) -> None:
+        # 既定ではコネクションプールの上限まで並列に実行する
+        self.__api_context = api_context
+        self.__max_workers = max_workers if max_workers else api_context.connection_pool.max_size
+        self.__max_per_host = max_per_host if max_per_host else self.__max_workers
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='ApiExecutor')
+        self.__host_semaphores: dict[ConnectionKey, threading.BoundedSemaphore] = {}
+        self.__lock = threading.Lock()
+        self.__cancelled = threading.Event()
+        self.__futures: set[concurrent.futures.Future] = set()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 例外で抜けた場合は未着手のジョブを実行しない
+        self.shutdown(cancel_pending=exc_type is not None)
+
+
+    @property
+    def api_context(self) -> 'ApiContext':
+        return self.__api_context
+
+
+    @property
+    def max_workers(self) -> int:
+        return self.__max_workers
+
+
+    @property
+    def max_per_host(self) -> int:
+        return self.__max_per_host
+
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancelled.is_set()
+
+
+    def submit(self, job: ApiJob | tuple, index: int = 0) -> concurrent.futures.Future:
+        job = ApiJob.of(job)
+
+        future = self.__executor.submit(self.__run, job, index)
+        with self.__lock:
+            self.__futures.add(future)
+        future.add_done_callback(self.__discard)
+
+        return future
+
+
+    def map(self, jobs: Iterable[ApiJob | tuple], *, ordered: bool = True, timeout: float | None = None) -> Iterator[ApiJobResult]:
+        jobs = [ApiJob.of(job) for job in jobs]
+        futures = [self.submit(job, index) for index, job in enumerate(jobs)]
+
+        if ordered:
+            for index, future in enumerate(futures):
+                yield self.__to_result(future, jobs[index], index, timeout)
+        else:
+            indexes = {future: index for index, future in enumerate(futures)}
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                yield self.__to_result(future, jobs[indexes[future]], indexes[future], None)
+
+
+    def run(self, jobs: Iterable[ApiJob | tuple], *, timeout: float | None = None) -> list[ApiJobResult]:
+        return list(self.map(jobs, ordered=True, timeout=timeout))
+
+
+    def cancel(self) -> None:
+        # 実行中のリクエストは中断せず、未着手のジョブのみを取り消す
+        self.__cancelled.set()
+
+        with self.__lock:
+            futures = list(self.__futures)
+
+        for future in futures:
+            future.cancel()
+
+
+    def shutdown(self, *, wait: bool = True, cancel_pending: bool = False) -> None:
+        if cancel_pending:
+            self.cancel()
+
+        self.__executor.shutdown(wait=wait, cancel_futures=cancel_pending)
+
+
+    def __run(self, job: ApiJob, index: int) -> ApiJobResult:
+        if self.__cancelled.is_set():
+            return ApiJobResult(job, index, cancelled=True)
+
+        api_context = job.api_context if job.api_context is not None else self.__api_context
+        begin_time = time.monotonic()
+
+        try:
+            api_request = api_context.create_api_request(job.menu_id)
+            key, _ = split_url(api_request.url)
+
+            with self.__get_host_semaphore(key):
+                # ホストの空きを待つ間に取り消された場合は実行しない
+                if self.__cancelled.is_set():
+                    return ApiJobResult(job, index, cancelled=True)
+
+                with api_request.send_post(job.xcommand, job.params, wait_func=job.wait_func, wait_func_args=job.wait_func_args) as api_response:
+                    if api_response.failed:
+                        raise ApiException(f'Request failed. Menu ID: {job.menu_id}, XCommand: {job.xcommand}, Status: {api_response.status}') from api_response.exception
+
+                    value = job.handler(api_response)
+
+            return ApiJobResult(job, index, value=value, status=api_response.status, elapsed=time.monotonic() - begin_time)
+
+        except Exception as e:
+            return ApiJobResult(job, index, exception=e, elapsed=time.monotonic() - begin_time)
+
+
+    def __get_host_semaphore(self, key: ConnectionKey) -> threading.BoundedSemaphore:
+        with self.__lock:
+            semaphore = self.__host_semaphores.get(key)
+            if semaphore is None:
+                semaphore = self.__host_semaphores[key] = threading.BoundedSemaphore(self.__max_per_host)
+
+            return semaphore
+
+
+    def __discard(self, future: concurrent.futures.Future) -> None:
+        with self.__lock:
+            self.__futures.discard(future)
+
+
+    def __to_result(self, future: concurrent.futures.Future, job: ApiJob, index: int, timeout: float | None) -> ApiJobResult:
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.CancelledError:
+            return ApiJobResult(job, index, cancelled=True)
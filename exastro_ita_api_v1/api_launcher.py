@@ -0,0 +1,405 @@
+import http.client
+import threading
+import time
+
+from collections.abc import Iterable, Iterator
+from typing import Any, Hashable
+
+from .api import *
+from .api_executor import *
+from .constants import *
+
+
+# 作業管理 / Symphony作業一覧 / Conductor作業一覧 のステータスのうち、これ以上変化しないもの
+FINISHED_STATUSES = frozenset({
+    '完了',
+    '完了(異常)',
+    '正常終了',
+    '異常終了',
+    '警告終了',
+    '想定外エラー',
+    '緊急停止',
+    '予約取消'
+})
+
+SUCCEEDED_STATUSES = frozenset({
+    '完了',
+    '正常終了'
+})
+
+
+class ExecutionTarget:
+    def __init__(
+        self,
+        execute_menu_id: str,
+        status_menu_id: str,
+        id_key: str,
+        *,
+        status_column: str = 'ステータス',
+        finished_statuses: frozenset[str] = FINISHED_STATUSES,
+        succeeded_statuses: frozenset[str] = SUCCEEDED_STATUSES
+    ) -> None:
+        self.__execute_menu_id = execute_menu_id
+        self.__status_menu_id = status_menu_id
+        self.__id_key = id_key
+        self.__status_column = status_column
+        self.__finished_statuses = finished_statuses
+        self.__succeeded_statuses = succeeded_statuses
+
+
+    def __repr__(self) -> str:
+        return f'ExecutionTarget(execute_menu_id={self.__execute_menu_id!r}, status_menu_id={self.__status_menu_id!r}, id_key={self.__id_key!r})'
+
+
+    @property
+    def execute_menu_id(self) -> str:
+        return self.__execute_menu_id
+
+
+    @property
+    def status_menu_id(self) -> str:
+        return self.__status_menu_id
+
+
+    @property
+    def id_key(self) -> str:
+        return self.__id_key
+
+
+    @property
+    def status_column(self) -> str:
+        return self.__status_column
+
+
+    @property
+    def finished_statuses(self) -> frozenset[str]:
+        return self.__finished_statuses
+
+
+    @property
+    def succeeded_statuses(self) -> frozenset[str]:
+        return self.__succeeded_statuses
+
+
+# 作業実行メニューごとの、実行結果の ID の名前と状態を確認する一覧メニュー
+EXECUTION_TARGETS: dict[str, ExecutionTarget] = {
+    target.execute_menu_id: target
+    for target in [
+        ExecutionTarget(MenuId.Symphony.Symphony作業実行, MenuId.Symphony.Symphony作業一覧, 'SYMPHONY_INSTANCE_ID'),
+        ExecutionTarget(MenuId.Conductor.Conductor作業実行, MenuId.Conductor.Conductor作業一覧, 'CONDUCTOR_INSTANCE_ID'),
+        ExecutionTarget(MenuId.Ansible_Legacy.作業実行, MenuId.Ansible_Legacy.作業管理, 'EXECUTION_NO'),
+        ExecutionTarget(MenuId.Ansible_LegacyRole.作業実行, MenuId.Ansible_LegacyRole.作業管理, 'EXECUTION_NO'),
+        ExecutionTarget(MenuId.AnsiblePioneer.作業実行, MenuId.AnsiblePioneer.作業管理, 'EXECUTION_NO'),
+        ExecutionTarget(MenuId.Terraform.作業実行, MenuId.Terraform.作業管理, 'EXECUTION_NO'),
+        ExecutionTarget(MenuId.Terraform_CLI.作業実行, MenuId.Terraform_CLI.作業管理, 'EXECUTION_NO')
+    ]
+}
+
+
+def find_execution_id(json_object: Any, id_key: str) -> str | None:
+    # 実行結果の ID は resultdata 直下とは限らないため、入れ子の中も探す
+    if isinstance(json_object, dict):
+        if json_object.get(id_key) not in (None, ''):
+            return str(json_object[id_key])
+        values = json_object.values()
+    elif isinstance(json_object, list):
+        values = json_object
+    else:
+        return None
+
+    for value in values:
+        execution_id = find_execution_id(value, id_key)
+        if execution_id is not None:
+            return execution_id
+
+    return None
+
+
+class Execution:
+    def __init__(self, target: ExecutionTarget, params: dict | None, key: Hashable) -> None:
+        self.__target = target
+        self.__params = params
+        self.__key = key
+        self.__execution_id: str | None = None
+        self.__status: str | None = None
+        self.__row: dict[str, Any] | None = None
+        self.__exception: BaseException | None = None
+        self.__submitted_at: float | None = None
+        self.__finished_at: float | None = None
+
+
+    def __repr__(self) -> str:
+        return f'Execution(key={self.__key!r}, execution_id={self.__execution_id!r}, status={self.__status!r})'
+
+
+    @property
+    def target(self) -> ExecutionTarget:
+        return self.__target
+
+
+    @property
+    def params(self) -> dict | None:
+        return self.__params
+
+
+    @property
+    def key(self) -> Hashable:
+        return self.__key
+
+
+    @property
+    def execution_id(self) -> str | None:
+        return self.__execution_id
+
+
+    @property
+    def status(self) -> str | None:
+        return self.__status
+
+
+    @property
+    def row(self) -> dict[str, Any] | None:
+        return self.__row
+
+
+    @property
+    def exception(self) -> BaseException | None:
+        return self.__exception
+
+
+    @property
+    def submitted_at(self) -> float | None:
+        return self.__submitted_at
+
+
+    @property
+    def finished_at(self) -> float | None:
+        return self.__finished_at
+
+
+    @property
+    def finished(self) -> bool:
+        return self.__finished_at is not None
+
+
+    @property
+    def succeeded(self) -> bool:
+        return self.__exception is None and self.__status in self.__target.succeeded_statuses
+
+
+    def set_submitted(self, execution_id: str, submitted_at: float) -> None:
+        self.__execution_id = execution_id
+        self.__submitted_at = submitted_at
+
+
+    def set_status(self, status: str, row: dict[str, Any], updated_at: float) -> bool:
+        # 終了状態になった時だけ True を返す
+        self.__status = status
+        self.__row = row
+        if self.__finished_at is None and status in self.__target.finished_statuses:
+            self.__finished_at = updated_at
+            return True
+
+        return False
+
+
+    def set_exception(self, exception: BaseException, finished_at: float) -> None:
+        self.__exception = exception
+        self.__finished_at = finished_at
+
+
+def is_transient_failure(api_response: ApiResponse) -> bool:
+    # 接続の失敗とサーバ側の一時的なエラーだけを再試行の対象とする。認証エラーなどは再試行しても解決しない
+    if api_response.exception is not None:
+        return isinstance(api_response.exception, (OSError, http.client.HTTPException))
+
+    return api_response.status == 429 or 500 <= api_response.status < 600
+
+
+class ExecutionLauncher:
+    def __init__(
+        self,
+        api_context: ApiContext,
+        *,
+        max_workers: int | None = None,
+        interval: float = 5.0,
+        max_ids_per_filter: int = 500,
+        max_consecutive_poll_errors: int | None = 10,
+        targets: dict[str, ExecutionTarget] = EXECUTION_TARGETS,
+        clock=time.monotonic,
+        sleep=time.sleep
+    ) -> None:
+        self.__api_context = api_context
+        self.__max_workers = max_workers
+        self.__interval = interval
+        self.__max_ids_per_filter = max(1, max_ids_per_filter)
+        self.__max_consecutive_poll_errors = max_consecutive_poll_errors
+        self.__targets = targets
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__lock = threading.Lock()
+        self.__poll_count = 0
+        self.__poll_error_count = 0
+        self.__consecutive_poll_error_count = 0
+        self.__last_poll_error: BaseException | None = None
+
+
+    @property
+    def api_context(self) -> ApiContext:
+        return self.__api_context
+
+
+    @property
+    def interval(self) -> float:
+        return self.__interval
+
+
+    @property
+    def poll_count(self) -> int:
+        return self.__poll_count
+
+
+    @property
+    def poll_error_count(self) -> int:
+        return self.__poll_error_count
+
+
+    @property
+    def max_consecutive_poll_errors(self) -> int | None:
+        return self.__max_consecutive_poll_errors
+
+
+    @property
+    def consecutive_poll_error_count(self) -> int:
+        return self.__consecutive_poll_error_count
+
+
+    @property
+    def last_poll_error(self) -> BaseException | None:
+        return self.__last_poll_error
+
+
+    def get_target(self, execute_menu_id: str) -> ExecutionTarget:
+        try:
+            return self.__targets[execute_menu_id]
+        except KeyError as e:
+            raise ApiException(f'Unknown execute menu "{execute_menu_id}". Specify an ExecutionTarget for it. Known menus are {list(self.__targets.keys())}') from e
+
+
+    def create_execution(self, execute_menu_id: str | ExecutionTarget, params: dict | None = None, *, key: Hashable = None) -> Execution:
+        target = execute_menu_id if isinstance(execute_menu_id, ExecutionTarget) else self.get_target(execute_menu_id)
+        return Execution(target, params, key)
+
+
+    def launch(self, executions: Iterable[Execution | tuple]) -> list[Execution]:
+        # EXECUTE は並列に送信し、ITA への反映は待たない。終了の確認は poll でまとめて行う
+        executions = [execution if isinstance(execution, Execution) else self.create_execution(*execution) for execution in executions]
+        jobs = [
+            ApiJob(
+                execution.target.execute_menu_id,
+                XCommand.EXECUTE,
+                execution.params,
+                handler=self.__create_handler(execution.target),
+                wait_func=lambda api_response: None,
+                key=index
+            )
+            for index, execution in enumerate(executions)
+        ]
+
+        for result in self.__api_context.execute_jobs(jobs, ordered=False, max_workers=self.__max_workers):
+            execution = executions[result.index]
+            if result.succeeded:
+                execution.set_submitted(result.value, self.__clock())
+            else:
+                execution.set_exception(result.exception if result.exception is not None else ApiException(f'{execution!r} was cancelled.'), self.__clock())
+
+        return executions
+
+
+    def poll(self, executions: Iterable[Execution]) -> list[Execution]:
+        # 状態を確認するメニューごとに、実行中の ID をまとめて1回の FILTER で取得する
+        waiting: dict[str, dict[str, Execution]] = {}
+        for execution in executions:
+            if not execution.finished and execution.execution_id is not None:
+                waiting.setdefault(execution.target.status_menu_id, {})[execution.execution_id] = execution
+
+        finished = []
+        for status_menu_id, waiting_executions in waiting.items():
+            api_request = self.__api_context.create_api_request(status_menu_id)
+            ids = sorted(waiting_executions.keys())
+
+            for begin in range(0, len(ids), self.__max_ids_per_filter):
+                with api_request.send_post(XCommand.FILTER_DATAONLY, {CommonIndex.ID: create_list_filter(ids[begin:begin + self.__max_ids_per_filter])}, cache=False) as api_response:
+                    # 一時的な障害で監視全体を止めないよう、取得に失敗した分は記録だけして次の周期で確認し直す
+                    if is_transient_failure(api_response):
+                        self.__record_poll_error(ApiException(f'Failed to poll statuses. Menu ID: {status_menu_id}, Status: {api_response.status}'), api_response.exception)
+                        continue
+
+                    json_object = read_json_object(api_response)
+
+                statuses = []
+                for row in to_dict(json_object.get('resultdata', {}).get('CONTENTS', {}).get('BODY')).values():
+                    row = to_dict(row)
+                    execution = waiting_executions.get(str(row.get(CommonIndex.ID)))
+                    if execution is not None:
+                        statuses.append((execution, str(row.get(api_request.indexer[execution.target.status_column], '')), row))
+
+                with self.__lock:
+                    self.__poll_count += 1
+                    self.__consecutive_poll_error_count = 0
+
+                updated_at = self.__clock()
+                for execution, status, row in statuses:
+                    if execution.set_status(status, row, updated_at):
+                        finished.append(execution)
+
+        return finished
+
+
+    def iter_completed(self, executions: Iterable[Execution], *, timeout: float | None = None) -> Iterator[Execution]:
+        # 終了した順に返す。EXECUTE に失敗したものは最初に返す
+        executions = list(executions)
+        deadline = self.__clock() + timeout if timeout is not None else None
+
+        yield from [execution for execution in executions if execution.finished]
+
+        while True:
+            yield from self.poll(executions)
+
+            remaining = [execution for execution in executions if not execution.finished]
+            if not remaining:
+                return
+
+            if deadline is not None and self.__clock() >= deadline:
+                raise ApiException(f'{len(remaining)} execution(s) did not finish within {timeout} seconds: {remaining}')
+
+            self.__sleep(self.__interval if deadline is None else max(0.0, min(self.__interval, deadline - self.__clock())))
+
+
+    def run(self, executions: Iterable[Execution | tuple], *, timeout: float | None = None) -> Iterator[Execution]:
+        return self.iter_completed(self.launch(executions), timeout=timeout)
+
+
+    def __record_poll_error(self, exception: ApiException, cause: BaseException | None) -> None:
+        exception.__cause__ = cause
+
+        with self.__lock:
+            self.__poll_error_count += 1
+            self.__consecutive_poll_error_count += 1
+            self.__last_poll_error = exception
+            exceeded = self.__max_consecutive_poll_errors is not None and self.__consecutive_poll_error_count >= self.__max_consecutive_poll_errors
+
+        # 障害が続く場合は、timeout を指定していなくても監視を打ち切る
+        if exceeded:
+            raise exception
+
+
+    def __create_handler(self, target: ExecutionTarget):
+        def handler(api_response: ApiResponse) -> str:
+            execution_id = find_execution_id(read_json_object(api_response).get('resultdata'), target.id_key)
+            if execution_id is None:
+                raise ApiException(f'Response does not contain {target.id_key}. Menu ID: {api_response.menu_id}')
+
+            return execution_id
+
+        return handler
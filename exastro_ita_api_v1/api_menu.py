@@ -1,15 +1,23 @@
 import collections.abc
+import concurrent.futures
+import json
 import pathlib
+import threading
+import time
 import uuid
 
-from typing import Sequence
+from typing import Any, BinaryIO, Callable, Collection, Sequence
 
 from .api import *
+from .api_stream import *
 from .constants import *
 
 
 class Record(collections.abc.MutableMapping[str, str], IndexerMixin):
-    def __init__(self, indexer: Indexer, values: dict[str, str]) -> None:
+    __slots__ = ('__indexer', '__values')
+
+
+    def __init__(self, indexer: Indexer, values: MutableMapping[str, str]) -> None:
         self.__indexer = indexer
         self.__values = values
 
@@ -41,7 +49,7 @@ class Record(collections.abc.MutableMapping[str, str], IndexerMixin):
 
 
     @property
-    def values(self) -> dict[str, str]:
+    def values(self) -> MutableMapping[str, str]:
         return self.__values
 
 
@@ -65,7 +73,7 @@ class Record(collections.abc.MutableMapping[str, str], IndexerMixin):
     def merge(self, other: 'Record') -> None:
         self.check_acceptable(other)
 
-        self.__values |= other.values
+        self.__values.update(other.values)
 
 
     def to_editable(self, kept_indexes: list[str] = []):
@@ -74,11 +82,12 @@ class Record(collections.abc.MutableMapping[str, str], IndexerMixin):
         self.values.update(kept_values)
 
 
-    def to_edit_parameters(self) -> dict:
+    def to_edit_parameters(self, *, encode_files: bool = True) -> dict:
+        # encode_files=False の場合 pathlib.Path はそのまま残し、送信時にストリーミングでエンコードする
         def convert_value(value: str) -> str:
             result = value
     
-            if isinstance(value, pathlib.Path):
+            if isinstance(value, pathlib.Path) and encode_files:
                 result = base64.b64encode(value.read_bytes()).decode()
     
             return result
@@ -89,6 +98,9 @@ class Record(collections.abc.MutableMapping[str, str], IndexerMixin):
 
 
 class Row(IndexerMixin):
+    __slots__ = ('__indexer', '__body', '__file')
+
+
     def __init__(self,
         indexer: Indexer,
         body_values: StrBlurDict = None,
@@ -108,6 +120,18 @@ class Row(IndexerMixin):
         )
 
 
+    @classmethod
+    def from_records(cls, body: Record, file: Record) -> 'Row':
+        body.check_acceptable(file)
+
+        row = cls.__new__(cls)
+        row.__indexer = body.indexer
+        row.__body = body
+        row.__file = file
+
+        return row
+
+
     @property
     def indexer(self) -> Indexer:
         return self.__indexer
@@ -128,6 +152,11 @@ class Row(IndexerMixin):
         return self.body.values[CommonIndex.ID]
 
 
+    @property
+    def discarded(self) -> bool:
+        return self.body.values.get(CommonIndex.廃止) not in (None, '', '0')
+
+
     def merge(self, row: 'Row'):
         self.check_acceptable(row)
 
@@ -158,25 +187,45 @@ class Row(IndexerMixin):
 
 # FILTERのみ受け入れ可能。FILTER_DATAONLYは受入不可
 class Menu(IndexerMixin):
-    def __init__(self, indexer: Indexer, json_object: dict | None = None) -> None:
+    def __init__(self, indexer: Indexer, json_object: dict | None = None, *, timings: ApiTimings | None = None) -> None:
         self.__indexer: Indexer = indexer
         self.__rows: dict[str, Row] = {}
+        self.__row_indexes: dict[tuple[str, ...], dict[tuple, dict[str, Row]]] = {}
 
         if json_object is not None:
-            body_entries = to_dict(json_object['resultdata']['CONTENTS']['BODY'])
-            file_entries = to_dict(json_object['resultdata']['CONTENTS']['UPLOAD_FILE'])
+            begin_time = time.perf_counter()
+            self.__load(json_object)
+            if timings is not None:
+                timings.add('build', time.perf_counter() - begin_time)
+
+
+    def __load(self, json_object: dict) -> None:
+        body_entries = to_dict(json_object['resultdata']['CONTENTS']['BODY'])
+        file_entries = to_dict(json_object['resultdata']['CONTENTS']['UPLOAD_FILE'])
 
-            for index in body_entries.keys():
-                if int(index) == 0:
-                    continue
+        for index in body_entries.keys():
+            if int(index) == 0:
+                continue
 
-                row = Row(
-                    indexer=indexer,
-                    body_values=body_entries.get(index),
-                    file_values=file_entries.get(index)
-                )
+            row = Row(
+                indexer=self.__indexer,
+                body_values=body_entries.get(index),
+                file_values=file_entries.get(index)
+            )
 
-                self.__rows[row.id] = row
+            self.__rows[row.id] = row
+
+
+    @classmethod
+    def from_stream(cls, indexer: Indexer, api_response: ApiResponse, *, chunk_size: int = 64 * 1024) -> 'Menu':
+        menu = cls(indexer)
+
+        # 受信、デコード、構築が交互に行われるため、まとめて build として計測する
+        with api_response.timings.measure('build'):
+            for row in iter_rows(indexer, api_response.open_stream(), chunk_size=chunk_size, files=True):
+                menu.merge_row(row)
+
+        return menu
 
 
     @property
@@ -214,28 +263,336 @@ class Menu(IndexerMixin):
             id = str(uuid.uuid4())
 
         self.__rows[id] = row
+        self.__add_to_row_indexes(id, row)
 
 
     def merge_row(self, row: Row) -> None:
         base_row = self.__rows.get(row.id)
         if base_row:
+            # マージで値が変わるため、索引から外してから登録し直す
+            self.__remove_from_row_indexes(row.id, base_row)
             base_row.merge(row)
+            self.__add_to_row_indexes(row.id, base_row)
         else:
             self.add_row(row)
 
 
-    def to_edit_parameters(self) -> dict:
-        result = {
-            str(index): row.body.to_edit_parameters() for index, row in enumerate(self.__rows.values())
-        }
+    def iter_rows(self) -> Iterator[Row]:
+        return iter(self.__rows.values())
+
+
+    def create_index(self, *column_names: str) -> None:
+        if not column_names:
+            raise ApiException('At least one column name is required to create an index.')
+
+        key_indexes = self.__to_key_indexes(column_names)
+        row_index: dict[tuple, dict[str, Row]] = {}
+        for id, row in self.__rows.items():
+            row_index.setdefault(self.__to_index_key(key_indexes, row), {})[id] = row
+
+        self.__row_indexes[key_indexes] = row_index
+
+
+    def drop_index(self, *column_names: str) -> None:
+        self.__row_indexes.pop(self.__to_key_indexes(column_names), None)
+
+
+    def reindex(self) -> None:
+        # Row を直接書き換えた場合は索引を作り直す必要がある
+        for key_indexes in list(self.__row_indexes.keys()):
+            row_index: dict[tuple, dict[str, Row]] = {}
+            for id, row in self.__rows.items():
+                row_index.setdefault(self.__to_index_key(key_indexes, row), {})[id] = row
+
+            self.__row_indexes[key_indexes] = row_index
+
+
+    def find_by(self, criteria: Mapping[str, str] | None = None, **kwargs: str) -> list[Row]:
+        conditions = {self.indexer[column_name]: value for column_name, value in {**(criteria if criteria else {}), **kwargs}.items()}
+        key_indexes = tuple(sorted(conditions.keys(), key=int))
+
+        row_index = self.__row_indexes.get(key_indexes)
+        if row_index is not None:
+            return list(row_index.get(tuple(conditions[index] for index in key_indexes), {}).values())
+
+        # 索引がない場合は全件を走査する
+        return [
+            row for row in self.__rows.values()
+            if all(row.body.values.get(index) == value for index, value in conditions.items())
+        ]
+
+
+    def find_one_by(self, criteria: Mapping[str, str] | None = None, **kwargs: str) -> Row | None:
+        rows = self.find_by(criteria, **kwargs)
+        return rows[0] if rows else None
+
+
+    def where(self, predicate: Callable[[Row], bool]) -> Iterator[Row]:
+        return (row for row in self.__rows.values() if predicate(row))
+
+
+    def __to_key_indexes(self, column_names: Sequence[str]) -> tuple[str, ...]:
+        return tuple(sorted({self.indexer[column_name] for column_name in column_names}, key=int))
+
+
+    def __to_index_key(self, key_indexes: tuple[str, ...], row: Row) -> tuple:
+        return tuple(row.body.values.get(index) for index in key_indexes)
+
+
+    def __add_to_row_indexes(self, id: str, row: Row) -> None:
+        for key_indexes, row_index in self.__row_indexes.items():
+            row_index.setdefault(self.__to_index_key(key_indexes, row), {})[id] = row
+
+
+    def __remove_from_row_indexes(self, id: str, row: Row) -> None:
+        for key_indexes, row_index in self.__row_indexes.items():
+            index_key = self.__to_index_key(key_indexes, row)
+            rows = row_index.get(index_key)
+            if rows is not None:
+                rows.pop(id, None)
+                if not rows:
+                    del row_index[index_key]
+
+
+    def to_edit_parameters(self, *, encode_files: bool = True) -> dict:
+        return rows_to_edit_parameters(list(self.__rows.values()), encode_files=encode_files)
+
+
+    def split_rows(self, *, max_rows: int = 500, max_bytes: int = 8 * 1024 * 1024) -> list[list[Row]]:
+        return split_rows(list(self.__rows.values()), max_rows=max_rows, max_bytes=max_bytes)
+
+
+    def bulk_edit(
+        self,
+        api_request: ApiRequest,
+        *,
+        max_rows: int = 500,
+        max_bytes: int = 8 * 1024 * 1024,
+        concurrency: int = 1,
+        max_retries: int = 1,
+        retry_codes: Collection[str] = (),
+        wait_func: Callable | None = None,
+        wait_func_args: dict = {}
+    ) -> 'BulkEditResult':
+        self.check_acceptable(api_request)
+
+        bulk_edit_result = BulkEditResult()
+        pending_rows = list(self.__rows.values())
+
+        def send_chunk(rows: list[Row]) -> list[tuple[Row, EditResult | None, str]]:
+            with api_request.send_post(XCommand.EDIT, rows_to_edit_parameters(rows, encode_files=False), wait_func=wait_func, wait_func_args=wait_func_args) as api_response:
+                # ファイルを含む実際の送信サイズで集計する
+                bulk_edit_result.add_request(api_response.request_size)
+
+                if api_response.exception is not None:
+                    return [(row, None, str(api_response.exception)) for row in rows]
+
+                if not api_response.succeeded:
+                    return [(row, None, f'EDIT failed. status: {api_response.status}') for row in rows]
+
+                edit_results = parse_edit_results(api_response.json_object)
+
+            return [
+                (row, edit_results[index] if index < len(edit_results) else None, '' if index < len(edit_results) else 'No result returned for the row.')
+                for index, row in enumerate(rows)
+            ]
+
+        begin_time = time.monotonic()
+
+        def is_retryable(row: Row, edit_result: EditResult | None) -> bool:
+            # 結果が分からない登録は反映済みの可能性があり、再送すると重複するため再送しない。
+            # 更新、廃止、復活は反映済みであれば最終更新日時の不一致で拒否されるため再送できる。
+            # 結果コードがある行は、一時的なエラーとして指定されたコードの場合のみ再送する
+            if edit_result is None:
+                return row.body.values.get(CommonIndex.実行処理種別) != 実行処理種別.登録
+
+            return edit_result.code in retry_codes
+
+        # 失敗した行のうち、再送できるもののみを再送する
+        for _ in range(max_retries + 1):
+            if not pending_rows:
+                break
+
+            chunks = split_rows(pending_rows, max_rows=max_rows, max_bytes=max_bytes)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                outcomes = [outcome for chunk_outcomes in executor.map(send_chunk, chunks) for outcome in chunk_outcomes]
+
+            pending_rows = []
+            for row, edit_result, message in outcomes:
+                if edit_result is not None and edit_result.succeeded:
+                    bulk_edit_result.add_succeeded(row, edit_result)
+                else:
+                    if is_retryable(row, edit_result):
+                        pending_rows.append(row)
+                    bulk_edit_result.set_failed(row, edit_result, edit_result.message if edit_result else message)
+
+        bulk_edit_result.set_elapsed(time.monotonic() - begin_time)
+        return bulk_edit_result
+
+
+def iter_rows(indexer: Indexer, fp: Readable | BinaryIO, *, chunk_size: int = 64 * 1024, files: bool = False) -> Iterator[Row]:
+    # FILTER のレスポンスを読みながら、1件につき1つの完成した Row を返す。
+    # 既定の files=False では UPLOAD_FILE を読み飛ばし、読み込んだ行をすぐに返すため、保持するのは1行分のみ。
+    # files=True ではファイルの値も Row に含める。ITA は BODY の後に UPLOAD_FILE を返すため、
+    # この場合はファイルの値が揃うまで全行を保持することになり、メモリ使用量はレスポンス全体に比例する
+    waiting_rows: dict[str, Row] = {}
+    pending_file_values: dict[str, dict[str, Any]] = {}
+    upload_file_read = False
+
+    for section, index, values in iter_contents(fp, chunk_size=chunk_size):
+        if section == 'UPLOAD_FILE':
+            if not files:
+                continue
+
+            upload_file_read = True
+
+        if int(index) == 0:
+            continue
+
+        if section == 'BODY':
+            row = Row(
+                indexer=indexer,
+                body_values=values,
+                file_values=pending_file_values.pop(index, None)
+            )
+
+            if files and not upload_file_read:
+                waiting_rows[index] = row
+            else:
+                yield row
+
+        else:
+            # ファイルを持たない行の UPLOAD_FILE は null のみのため、値のある項目だけを残す
+            file_values = {key: value for key, value in to_dict(values).items() if value is not None}
+            row = waiting_rows.pop(index, None)
+            if row is not None:
+                row.file.values.update(file_values)
+                yield row
+            elif file_values:
+                pending_file_values[index] = file_values
+
+    # UPLOAD_FILE に対応する項目がなかった行
+    yield from waiting_rows.values()
+
+
+def rows_to_edit_parameters(rows: Sequence[Row], *, encode_files: bool = True) -> dict:
+    result = {
+        str(index): row.body.to_edit_parameters(encode_files=encode_files) for index, row in enumerate(rows)
+    }
+
+    upload_file = {}
+    for index, row in enumerate(rows):
+        parameters = row.file.to_edit_parameters(encode_files=encode_files)
+        if parameters:
+            upload_file[str(index)] = parameters
+
+    if upload_file:
+        result['UPLOAD_FILE'] = upload_file
+
+    return result
+
+
+def estimate_edit_size(row: Row) -> int:
+    # ファイルは読み込まずに base64 エンコード後のサイズを見積もる
+    def estimate_value_size(value) -> int:
+        if isinstance(value, pathlib.Path):
+            return (value.stat().st_size + 2) // 3 * 4
+        else:
+            return len(json.dumps(value, ensure_ascii=False).encode())
+
+    return sum(
+        len(index) + estimate_value_size(value) + 4
+        for record in (row.body, row.file) for index, value in record.values.items()
+    )
+
+
+def split_rows(rows: Sequence[Row], *, max_rows: int = 500, max_bytes: int = 8 * 1024 * 1024) -> list[list[Row]]:
+    chunks: list[list[Row]] = []
+    chunk: list[Row] = []
+    chunk_size = 0
+
+    for row in rows:
+        row_size = estimate_edit_size(row)
+
+        # 1行で上限を超える場合も、その行だけのチャンクとして送信する
+        if chunk and (len(chunk) >= max_rows or chunk_size + row_size > max_bytes):
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+
+        chunk.append(row)
+        chunk_size += row_size
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+class BulkEditResult:
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__succeeded: list[tuple[Row, EditResult]] = []
+        self.__failed: dict[int, tuple[Row, EditResult | None, str]] = {}
+        self.__request_count = 0
+        self.__bytes_sent = 0
+        self.__elapsed = 0.0
+
+
+    @property
+    def succeeded(self) -> list[tuple[Row, EditResult]]:
+        return list(self.__succeeded)
+
+
+    @property
+    def failed(self) -> list[tuple[Row, EditResult | None, str]]:
+        return list(self.__failed.values())
+
+
+    @property
+    def row_count(self) -> int:
+        return len(self.__succeeded) + len(self.__failed)
+
+
+    @property
+    def request_count(self) -> int:
+        return self.__request_count
+
+
+    @property
+    def bytes_sent(self) -> int:
+        return self.__bytes_sent
+
+
+    @property
+    def elapsed(self) -> float:
+        return self.__elapsed
+
+
+    @property
+    def rows_per_second(self) -> float:
+        return len(self.__succeeded) / self.__elapsed if self.__elapsed > 0 else 0.0
+
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.__bytes_sent / self.__elapsed if self.__elapsed > 0 else 0.0
+
+
+    def add_request(self, size: int) -> None:
+        with self.__lock:
+            self.__request_count += 1
+            self.__bytes_sent += size
+
+
+    def add_succeeded(self, row: Row, edit_result: EditResult) -> None:
+        self.__succeeded.append((row, edit_result))
+        self.__failed.pop(id(row), None)
+
 
-        upload_file = {}
-        for index, row in enumerate(self.__rows.values()):
-            parameters = row.file.to_edit_parameters()
-            if parameters:
-                upload_file[str(index)] = parameters
+    def set_failed(self, row: Row, edit_result: EditResult | None, message: str) -> None:
+        self.__failed[id(row)] = (row, edit_result, message)
 
-        if upload_file:
-            result['UPLOAD_FILE'] = upload_file
 
-        return result
+    def set_elapsed(self, elapsed: float) -> None:
+        self.__elapsed = elapsed
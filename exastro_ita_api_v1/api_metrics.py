@@ -0,0 +1,336 @@
+import bisect
+import contextvars
+import json
+import threading
+
+from typing import Callable, Sequence
+
+from .api import *
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.__buckets = tuple(sorted(buckets))
+        # 末尾は +Inf のバケット
+        self.__counts = [0] * (len(self.__buckets) + 1)
+        self.__count = 0
+        self.__sum = 0.0
+        self.__max = 0.0
+
+
+    @property
+    def buckets(self) -> tuple[float, ...]:
+        return self.__buckets
+
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+
+    @property
+    def max(self) -> float:
+        return self.__max
+
+
+    @property
+    def mean(self) -> float:
+        return self.__sum / self.__count if self.__count else 0.0
+
+
+    def observe(self, value: float) -> None:
+        self.__counts[bisect.bisect_left(self.__buckets, value)] += 1
+        self.__count += 1
+        self.__sum += value
+        if value > self.__max:
+            self.__max = value
+
+
+    def cumulative_counts(self) -> list[int]:
+        counts = []
+        total = 0
+        for count in self.__counts:
+            total += count
+            counts.append(total)
+
+        return counts
+
+
+    def quantile(self, q: float) -> float:
+        # バケット内は一様分布とみなして線形補間する
+        if self.__count == 0:
+            return 0.0
+
+        rank = q * self.__count
+        lower_bound = 0.0
+        total = 0
+        for index, count in enumerate(self.__counts):
+            upper_bound = self.__buckets[index] if index < len(self.__buckets) else self.__max
+            if count and total + count >= rank:
+                return lower_bound + (min(upper_bound, self.__max) - lower_bound) * (rank - total) / count
+
+            total += count
+            lower_bound = upper_bound
+
+        return self.__max
+
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.__count,
+            'sum': self.__sum,
+            'mean': self.mean,
+            'max': self.__max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99)
+        }
+
+
+class RequestMetrics:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.__statuses: dict[str, int] = {}
+        self.__latency = Histogram(buckets)
+        self.__wait_duration = Histogram(buckets)
+        self.__request_bytes = 0
+        self.__response_bytes = 0
+
+
+    @property
+    def count(self) -> int:
+        return sum(self.__statuses.values())
+
+
+    @property
+    def statuses(self) -> dict[str, int]:
+        return self.__statuses
+
+
+    @property
+    def latency(self) -> Histogram:
+        return self.__latency
+
+
+    @property
+    def wait_duration(self) -> Histogram:
+        return self.__wait_duration
+
+
+    @property
+    def request_bytes(self) -> int:
+        return self.__request_bytes
+
+
+    @property
+    def response_bytes(self) -> int:
+        return self.__response_bytes
+
+
+    def add_response(self, status: str, latency: float, request_size: int, response_size: int | None) -> None:
+        self.__statuses[status] = self.__statuses.get(status, 0) + 1
+        self.__latency.observe(latency)
+        self.__request_bytes += request_size
+        self.__response_bytes += response_size if response_size is not None else 0
+
+
+    def add_wait(self, wait_duration: float) -> None:
+        self.__wait_duration.observe(wait_duration)
+
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'statuses': dict(self.__statuses),
+            'latency': self.__latency.to_dict(),
+            'wait_duration': self.__wait_duration.to_dict(),
+            'request_bytes': self.__request_bytes,
+            'response_bytes': self.__response_bytes
+        }
+
+
+class MetricsHook(EventHook):
+    def __init__(
+        self,
+        *,
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> None:
+        self.__buckets = tuple(buckets)
+        self.__metrics: dict[tuple[str, str], RequestMetrics] = {}
+        self.__lock = threading.Lock()
+        # 待ち合わせ関数には XCommand が渡されないため、直前の応答の XCommand を覚えておく
+        self.__last_xcommand: contextvars.ContextVar[str] = contextvars.ContextVar(f'last_xcommand_{id(self)}', default='')
+        self.__wait_xcommands: contextvars.ContextVar[tuple[str, ...]] = contextvars.ContextVar(f'wait_xcommands_{id(self)}', default=())
+        self.__concurrency: dict[str, dict[str, int]] = {}
+
+
+    @property
+    def metrics(self) -> dict[tuple[str, str], RequestMetrics]:
+        return self.__metrics
+
+
+    @property
+    def concurrency(self) -> dict[str, dict[str, int]]:
+        with self.__lock:
+            return {name: dict(values) for name, values in self.__concurrency.items()}
+
+
+    def on_response(
+        self,
+        api_request: 'ApiRequest',
+        api_response: 'ApiResponse'
+    ) -> None:
+        self.__last_xcommand.set(api_response.xcommand or api_response.http_method)
+
+
+    def on_response_complete(
+        self,
+        api_request: 'ApiRequest',
+        api_response: 'ApiResponse',
+        timings: ApiTimings
+    ) -> None:
+        # 本文を読み終えた時点で記録する。所要時間は各フェーズの合計で、待ち合わせ関数の時間は含まない
+        xcommand = api_response.xcommand or api_response.http_method
+        status = 'error' if api_response.exception is not None else str(api_response.status)
+
+        with self.__lock:
+            self.__get_metrics(api_request.menu_id, xcommand).add_response(
+                status, timings.total, api_response.request_size, api_response.received_size
+            )
+
+
+    def before_wait_func(
+        self,
+        api_request: 'ApiRequest',
+        wait_func: Callable,
+        wait_func_args: dict
+    ) -> None:
+        self.__wait_xcommands.set(self.__wait_xcommands.get() + (self.__last_xcommand.get(),))
+
+
+    def after_wait_func(
+        self,
+        api_request: 'ApiRequest',
+        wait_func: Callable,
+        wait_func_args: dict,
+        wait_duration: float
+    ) -> None:
+        wait_xcommands = self.__wait_xcommands.get()
+        if not wait_xcommands:
+            return
+        self.__wait_xcommands.set(wait_xcommands[:-1])
+
+        with self.__lock:
+            self.__get_metrics(api_request.menu_id, wait_xcommands[-1]).add_wait(wait_duration)
+
+
+    def on_concurrency_change(
+        self,
+        name: str,
+        limit: int,
+        in_flight: int,
+        queue_depth: int,
+        reason: str
+    ) -> None:
+        with self.__lock:
+            self.__concurrency[name] = {'limit': limit, 'in_flight': in_flight, 'queue_depth': queue_depth}
+
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__metrics = {}
+
+
+    def to_dict(self) -> dict:
+        with self.__lock:
+            return {
+                menu_id: {
+                    xcommand: metrics.to_dict()
+                    for (metrics_menu_id, xcommand), metrics in sorted(self.__metrics.items())
+                    if metrics_menu_id == menu_id
+                }
+                for menu_id in sorted({menu_id for menu_id, _ in self.__metrics.keys()})
+            }
+
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+
+    def to_prometheus(self, prefix: str = 'exastro_ita') -> str:
+        lines: list[str] = []
+
+        with self.__lock:
+            items = sorted(self.__metrics.items())
+
+            lines.append(f'# HELP {prefix}_requests_total Number of API requests.')
+            lines.append(f'# TYPE {prefix}_requests_total counter')
+            for (menu_id, xcommand), metrics in items:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'{prefix}_requests_total{self.__labels(menu_id=menu_id, xcommand=xcommand, status=status)} {count}')
+
+            self.__append_histograms(lines, f'{prefix}_request_duration_seconds', 'API request latency in seconds.', [
+                (menu_id, xcommand, metrics.latency) for (menu_id, xcommand), metrics in items if metrics.latency.count
+            ])
+
+            for name, help_text, attribute in (
+                ('request_bytes_total', 'Bytes sent in API request bodies.', 'request_bytes'),
+                ('response_bytes_total', 'Bytes received in API response bodies.', 'response_bytes')
+            ):
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} counter')
+                for (menu_id, xcommand), metrics in items:
+                    if metrics.latency.count:
+                        lines.append(f'{prefix}_{name}{self.__labels(menu_id=menu_id, xcommand=xcommand)} {getattr(metrics, attribute)}')
+
+            self.__append_histograms(lines, f'{prefix}_wait_duration_seconds', 'Duration of wait functions in seconds.', [
+                (menu_id, xcommand, metrics.wait_duration) for (menu_id, xcommand), metrics in items if metrics.wait_duration.count
+            ])
+
+            # 同時実行数の制御が有効な場合のみ、最後に通知された値を出力する
+            for name, help_text in (
+                ('limit', 'Current concurrency limit.'),
+                ('queue_depth', 'Requests waiting for a concurrency slot.')
+            ):
+                if self.__concurrency:
+                    lines.append(f'# HELP {prefix}_concurrency_{name} {help_text}')
+                    lines.append(f'# TYPE {prefix}_concurrency_{name} gauge')
+                for budget, values in sorted(self.__concurrency.items()):
+                    lines.append(f'{prefix}_concurrency_{name}{self.__labels(budget=budget)} {values[name]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def __get_metrics(self, menu_id: str, xcommand: str) -> RequestMetrics:
+        metrics = self.__metrics.get((menu_id, xcommand))
+        if metrics is None:
+            metrics = self.__metrics[(menu_id, xcommand)] = RequestMetrics(self.__buckets)
+
+        return metrics
+
+
+    def __append_histograms(self, lines: list[str], name: str, help_text: str, histograms: list[tuple[str, str, Histogram]]) -> None:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+
+        for menu_id, xcommand, histogram in histograms:
+            bounds = [repr(float(bucket)) for bucket in histogram.buckets] + ['+Inf']
+            for bound, count in zip(bounds, histogram.cumulative_counts()):
+                lines.append(f'{name}_bucket{self.__labels(menu_id=menu_id, xcommand=xcommand, le=bound)} {count}')
+
+            lines.append(f'{name}_sum{self.__labels(menu_id=menu_id, xcommand=xcommand)} {histogram.sum}')
+            lines.append(f'{name}_count{self.__labels(menu_id=menu_id, xcommand=xcommand)} {histogram.count}')
+
+
+    def __labels(self, **labels: str) -> str:
+        def escape(value: str) -> str:
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
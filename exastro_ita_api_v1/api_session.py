@@ -0,0 +1,153 @@
+import html
+import http.cookiejar
+import os
+import pathlib
+import re
+import threading
+
+from .api import *
+
+
+INPUT_TAG_PATTERN = re.compile(r'<input\b[^>]*>', re.IGNORECASE)
+ATTRIBUTE_PATTERN = re.compile(r'''([^\s=/>]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''')
+
+
+def find_input_value(body: str, name: str) -> str:
+    # ページ全体を DOM に変換せず、input 要素だけを先頭から順に調べる
+    for match in INPUT_TAG_PATTERN.finditer(body):
+        # 一致しなかった引用符の種類のグループは空文字列になるため、連結して値を取り出す
+        attributes = {
+            key.lower(): html.unescape(''.join(values))
+            for key, *values in ATTRIBUTE_PATTERN.findall(match.group(0))
+        }
+        if attributes.get('name') == name:
+            return attributes.get('value', '')
+
+    return ''
+
+
+class WebSession:
+    def __init__(
+        self,
+        cookie_jar: http.cookiejar.CookieJar | None = None,
+        *,
+        path: str | os.PathLike | None = None
+    ) -> None:
+        self.__path = pathlib.Path(path) if path else None
+        self.__cookie_jar = cookie_jar if cookie_jar is not None else http.cookiejar.LWPCookieJar() if self.__path else http.cookiejar.CookieJar()
+        self.__lock = threading.Lock()
+        self.__generation = 0
+
+        # ITA のセッション Cookie は有効期限を持たないため、破棄対象の Cookie も保存と読み込みの対象にする
+        if self.__path is not None and self.__path.exists() and isinstance(self.__cookie_jar, http.cookiejar.FileCookieJar):
+            try:
+                self.__cookie_jar.load(str(self.__path), ignore_discard=True)
+            except (OSError, http.cookiejar.LoadError):
+                self.__cookie_jar.clear()
+
+
+    @property
+    def cookie_jar(self) -> http.cookiejar.CookieJar:
+        return self.__cookie_jar
+
+
+    @property
+    def path(self) -> pathlib.Path | None:
+        return self.__path
+
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
+
+    def authenticate(self, web_request: WebRequest, generation: int) -> None:
+        # 401 を受け取ったスレッドのうち最初の1つだけがログインし、残りはその結果を使って再送する
+        with self.__lock:
+            if self.__generation != generation:
+                return
+
+            web_request.login()
+            self.__generation += 1
+            self.__save()
+
+
+    def save(self) -> None:
+        with self.__lock:
+            self.__save()
+
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__cookie_jar.clear()
+            self.__generation += 1
+            self.__save()
+
+
+    def __save(self) -> None:
+        if self.__path is None or not isinstance(self.__cookie_jar, http.cookiejar.FileCookieJar):
+            return
+
+        # Cookie はログイン情報と同等に扱い、所有者のみ読み書きできるファイルに保存する
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        os.close(os.open(self.__path, os.O_WRONLY | os.O_CREAT, 0o600))
+        self.__cookie_jar.save(str(self.__path), ignore_discard=True)
+
+
+class WebSessionPool:
+    def __init__(
+        self,
+        *,
+        max_size: int = 1,
+        directory: str | os.PathLike | None = None,
+        name: str = 'web_session'
+    ) -> None:
+        # ITA (PHP) は同じセッションへのリクエストを直列に処理するため、並列に操作する場合は複数のセッションを使う
+        self.__max_size = max(1, max_size)
+        self.__directory = pathlib.Path(directory) if directory else None
+        self.__name = re.sub(r'[^\w.-]', '_', name)
+        self.__sessions: list[WebSession] = []
+        self.__next_index = 0
+        self.__lock = threading.Lock()
+
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
+
+
+    @property
+    def directory(self) -> pathlib.Path | None:
+        return self.__directory
+
+
+    @property
+    def sessions(self) -> list[WebSession]:
+        with self.__lock:
+            return list(self.__sessions)
+
+
+    def get(self) -> WebSession:
+        with self.__lock:
+            if len(self.__sessions) < self.__max_size:
+                session = WebSession(path=self.__directory / f'{self.__name}_{len(self.__sessions)}.lwp' if self.__directory else None)
+                self.__sessions.append(session)
+                return session
+
+            session = self.__sessions[self.__next_index % len(self.__sessions)]
+            self.__next_index += 1
+            return session
+
+
+    def save(self) -> None:
+        for session in self.sessions:
+            session.save()
+
+
+    def clear(self) -> None:
+        for session in self.sessions:
+            session.clear()
+
+
+    def close(self) -> None:
+        self.save()
@@ -0,0 +1,459 @@
+import base64
+import binascii
+import codecs
+import gzip
+import io
+import json
+import pathlib
+import zlib
+
+from collections.abc import Iterable, Iterator
+from typing import Any, BinaryIO, Protocol, Sequence
+
+
+class Readable(Protocol):
+    def read(self, amt: int) -> bytes: ...
+
+
+class JsonStreamReader:
+    def __init__(self, fp: Readable | BinaryIO, *, chunk_size: int = 64 * 1024) -> None:
+        self.__fp = fp
+        self.__chunk_size = chunk_size
+        self.__decoder = codecs.getincrementaldecoder('utf-8')()
+        self.__json_decoder = json.JSONDecoder()
+        self.__buffer = ''
+        self.__position = 0
+        self.__eof = False
+
+
+    def peek(self) -> str | None:
+        while True:
+            while self.__position < len(self.__buffer) and self.__buffer[self.__position] in ' \t\r\n':
+                self.__position += 1
+
+            if self.__position < len(self.__buffer):
+                return self.__buffer[self.__position]
+
+            if not self.__fill():
+                return None
+
+
+    def expect(self, char: str) -> None:
+        actual = self.peek()
+        if actual != char:
+            raise json.JSONDecodeError(f'Expecting "{char}" but found "{actual}"', self.__buffer, self.__position)
+
+        self.__position += 1
+
+
+    def read_value(self) -> Any:
+        self.peek()
+
+        while True:
+            try:
+                value, end = self.__json_decoder.raw_decode(self.__buffer, self.__position)
+            except json.JSONDecodeError:
+                # 値が途中で途切れている可能性があるので、読み足して再試行する
+                if not self.__fill(grow=True):
+                    raise
+                continue
+
+            # バッファ末尾で終わる数値は続きがある可能性がある
+            if end == len(self.__buffer) and isinstance(value, (int, float)) and not isinstance(value, bool):
+                if self.__fill(grow=True):
+                    continue
+
+            self.__position = end
+            return value
+
+
+    def iter_object(self) -> Iterator[str]:
+        # キーを返すたびに、呼び出し側がその値を読み進める必要がある
+        self.expect('{')
+        if self.peek() == '}':
+            self.__position += 1
+            return
+
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+
+            if self.peek() == ',':
+                self.__position += 1
+            else:
+                self.expect('}')
+                return
+
+
+    def iter_array(self) -> Iterator[int]:
+        # 要素番号を返すたびに、呼び出し側がその値を読み進める必要がある
+        self.expect('[')
+        if self.peek() == ']':
+            self.__position += 1
+            return
+
+        index = 0
+        while True:
+            yield index
+            index += 1
+
+            if self.peek() == ',':
+                self.__position += 1
+            else:
+                self.expect(']')
+                return
+
+
+    def iter_string(self) -> Iterator[str]:
+        # 文字列の値を全体を保持せずに少しずつ返す
+        self.expect('"')
+
+        while True:
+            if self.__position >= len(self.__buffer) and not self.__fill():
+                raise json.JSONDecodeError('Unterminated string', self.__buffer, self.__position)
+
+            quote = self.__buffer.find('"', self.__position)
+            backslash = self.__buffer.find('\\', self.__position)
+            end = min(position for position in (quote, backslash, len(self.__buffer)) if position >= 0)
+
+            if end > self.__position:
+                yield self.__buffer[self.__position:end]
+                self.__position = end
+
+            if end == quote:
+                self.__position += 1
+                return
+
+            if end == backslash:
+                # エスケープシーケンスはサロゲートペアの \uXXXX\uXXXX でも 12 文字に収まる
+                while len(self.__buffer) - self.__position < 12 and self.__fill():
+                    pass
+
+                escaped, length = self.__decode_escape(self.__buffer[self.__position:self.__position + 12])
+                yield escaped
+                self.__position += length
+
+
+    def seek(self, keys: Sequence[str]) -> bool:
+        # キーを順にたどり、対象の値の直前まで読み進める
+        for key in keys:
+            if self.peek() != '{':
+                return False
+
+            for object_key in self.iter_object():
+                if object_key == key:
+                    break
+                self.read_value()
+            else:
+                return False
+
+        return True
+
+
+    def iter_items(self) -> Iterator[tuple[str, Any]]:
+        # PHP の配列は JSON では配列またはオブジェクトになるため、どちらも (キー, 値) として扱う
+        if self.peek() == '[':
+            for index in self.iter_array():
+                yield str(index), self.read_value()
+        else:
+            for key in self.iter_object():
+                yield key, self.read_value()
+
+
+    def __decode_escape(self, text: str) -> tuple[str, int]:
+        if text.startswith('\\u'):
+            # PHP の json_encode は BMP 外の文字をサロゲートペアで出力するため、1文字に戻す
+            code_point = int(text[2:6], 16)
+            if 0xD800 <= code_point <= 0xDBFF and text[6:8] == '\\u' and 0xDC00 <= int(text[8:12], 16) <= 0xDFFF:
+                return chr(0x10000 + ((code_point - 0xD800) << 10) + (int(text[8:12], 16) - 0xDC00)), 12
+
+            return chr(code_point), 6
+
+        try:
+            return json.loads('"' + text[:2] + '"'), 2
+        except json.JSONDecodeError as e:
+            raise json.JSONDecodeError(f'Invalid escape "{text[:2]}"', self.__buffer, self.__position) from e
+
+
+    def __fill(self, grow: bool = False) -> bool:
+        if self.__eof:
+            return False
+
+        # 読み終えた部分を捨ててから読み足す
+        if self.__position > 0:
+            self.__buffer = self.__buffer[self.__position:]
+            self.__position = 0
+
+        # 途切れた値の再試行が二乗オーダーにならないよう、バッファ長に応じて読み込み量を増やす
+        size = max(self.__chunk_size, len(self.__buffer)) if grow else self.__chunk_size
+
+        chunk = self.__fp.read(size)
+        if not chunk:
+            self.__eof = True
+            self.__buffer += self.__decoder.decode(b'', final=True)
+            return False
+
+        self.__buffer += self.__decoder.decode(chunk)
+        return True
+
+
+def iter_contents(fp: Readable | BinaryIO, *, chunk_size: int = 64 * 1024) -> Iterator[tuple[str, str, Any]]:
+    reader = JsonStreamReader(fp, chunk_size=chunk_size)
+
+    if reader.peek() != '{':
+        return
+
+    for key in reader.iter_object():
+        if key != 'resultdata' or reader.peek() != '{':
+            reader.read_value()
+            continue
+
+        for resultdata_key in reader.iter_object():
+            if resultdata_key != 'CONTENTS' or reader.peek() != '{':
+                reader.read_value()
+                continue
+
+            for contents_key in reader.iter_object():
+                if contents_key in ('BODY', 'UPLOAD_FILE') and reader.peek() in ('{', '['):
+                    for index, values in reader.iter_items():
+                        yield contents_key, index, values
+                else:
+                    reader.read_value()
+
+
+def iter_base64_decoded(chunks: Iterable[str]) -> Iterator[bytes]:
+    # 4 文字単位でデコードすれば、途中で区切っても結果は変わらない
+    remainder = ''
+    for chunk in chunks:
+        text = remainder + ''.join(chunk.split())
+        length = len(text) - len(text) % 4
+        remainder = text[length:]
+
+        if length:
+            yield binascii.a2b_base64(text[:length])
+
+    if remainder:
+        yield binascii.a2b_base64(remainder)
+
+
+SUPPORTED_CONTENT_ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+
+
+class DecompressingReader:
+    # Content-Encoding が gzip / deflate のレスポンスを読みながら展開する
+    def __init__(self, fp: Readable | BinaryIO, encoding: str, *, chunk_size: int = 64 * 1024) -> None:
+        if encoding not in SUPPORTED_CONTENT_ENCODINGS:
+            raise ValueError(f'Unsupported content encoding "{encoding}". Supported encodings are {list(SUPPORTED_CONTENT_ENCODINGS)}')
+
+        self.__fp = fp
+        self.__encoding = encoding
+        self.__chunk_size = chunk_size
+        self.__decompressor: Any = None
+        self.__pending = b''
+        self.__eof = False
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    @property
+    def encoding(self) -> str:
+        return self.__encoding
+
+
+    def read(self, amt: int | None = None) -> bytes:
+        if amt is None or amt < 0:
+            return b''.join(iter(lambda: self.read(self.__chunk_size), b''))
+
+        while not self.__pending and not self.__eof:
+            data = self.__decompressor.unconsumed_tail if self.__decompressor is not None else b''
+            if not data:
+                data = self.__fp.read(self.__chunk_size)
+
+            if data and self.__decompressor is None and len(data) < 2:
+                # zlib ヘッダの判別には先頭 2 バイトが必要
+                data += self.__fp.read(1)
+
+            if data:
+                # 展開後のサイズを制限し、圧縮率の高いデータでもメモリを使いすぎないようにする
+                self.__pending = self.__get_decompressor(data).decompress(data, max(amt, self.__chunk_size))
+            else:
+                self.__pending = self.__decompressor.flush() if self.__decompressor is not None else b''
+                self.__eof = True
+
+        chunk, self.__pending = self.__pending[:amt], self.__pending[amt:]
+        return chunk
+
+
+    def close(self) -> None:
+        if hasattr(self.__fp, 'close'):
+            self.__fp.close()
+
+
+    def __get_decompressor(self, data: bytes) -> Any:
+        if self.__decompressor is None:
+            if self.__encoding == 'deflate' and (len(data) < 2 or data[0] & 0x0f != 8 or ((data[0] << 8) | data[1]) % 31):
+                # zlib ヘッダのない deflate を返すサーバもある
+                self.__decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            else:
+                # gzip と zlib のヘッダを自動で判別する
+                self.__decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+
+        return self.__decompressor
+
+
+def get_content_encoding(headers: Any) -> str | None:
+    content_encoding = (headers.get('Content-Encoding') or '').strip().lower()
+    return content_encoding if content_encoding and content_encoding != 'identity' else None
+
+
+def decompress_body(body: bytes, encoding: str | None) -> bytes:
+    return DecompressingReader(io.BytesIO(body), encoding).read() if encoding else body
+
+
+def compress_body(body: bytes, *, level: int = 6) -> bytes:
+    # mtime を固定し、同じ本文からは同じ圧縮結果が得られるようにする
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class CountingIterable(Iterable[bytes]):
+    # chunked 転送で送信したバイト数を送信後に参照できるようにする
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.__chunks = chunks
+        self.__size = 0
+
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.__chunks:
+            self.__size += len(chunk)
+            yield chunk
+
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+
+class CountingReader:
+    # レスポンス本文として実際に受信したバイト数を数える。圧縮されている場合は展開前のバイト数になる
+    def __init__(self, fp: Readable | BinaryIO) -> None:
+        self.__fp = fp
+        self.__size = 0
+        self.__eof = False
+
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+
+    @property
+    def eof(self) -> bool:
+        return self.__eof
+
+
+    def read(self, amt: int | None = None) -> bytes:
+        chunk = self.__fp.read(amt) if amt is not None else self.__fp.read()  # type: ignore[call-arg]
+        self.__size += len(chunk)
+        if amt is None or amt < 0 or (not chunk and amt > 0):
+            self.__eof = True
+        return chunk
+
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        if hasattr(self.__fp, 'readinto'):
+            length = self.__fp.readinto(buffer)
+        else:
+            chunk = self.__fp.read(len(buffer))
+            length = len(chunk)
+            buffer[:length] = chunk
+
+        self.__size += length
+        if not length and len(buffer) > 0:
+            self.__eof = True
+        return length
+
+
+    def close(self) -> None:
+        if hasattr(self.__fp, 'close'):
+            self.__fp.close()
+
+
+def contains_path(value: Any) -> bool:
+    if isinstance(value, pathlib.Path):
+        return True
+    elif isinstance(value, dict):
+        return any(contains_path(item) for item in value.values())
+    elif isinstance(value, (list, tuple)):
+        return any(contains_path(item) for item in value)
+    else:
+        return False
+
+
+def iter_json_chunks(value: Any, *, chunk_size: int = 64 * 1024, file_block_size: int = 48 * 1024) -> Iterator[bytes]:
+    # pathlib.Path の値はファイルを少しずつ base64 エンコードしながら JSON 文字列として書き出す
+    buffer = bytearray()
+
+    for fragment in iter_json_fragments(value, file_block_size=file_block_size):
+        buffer += fragment
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_json_fragments(value: Any, *, file_block_size: int = 48 * 1024) -> Iterator[bytes]:
+    if isinstance(value, pathlib.Path):
+        yield b'"'
+        yield from iter_base64_blocks(value, block_size=file_block_size)
+        yield b'"'
+
+    elif not contains_path(value):
+        yield json.dumps(value, ensure_ascii=False).encode()
+
+    elif isinstance(value, dict):
+        yield b'{'
+        for position, (key, item) in enumerate(value.items()):
+            if position > 0:
+                yield b','
+            yield json.dumps(str(key), ensure_ascii=False).encode() + b':'
+            yield from iter_json_fragments(item, file_block_size=file_block_size)
+        yield b'}'
+
+    else:
+        yield b'['
+        for position, item in enumerate(value):
+            if position > 0:
+                yield b','
+            yield from iter_json_fragments(item, file_block_size=file_block_size)
+        yield b']'
+
+
+def iter_base64_blocks(path: pathlib.Path, *, block_size: int = 48 * 1024) -> Iterator[bytes]:
+    # 3 バイト単位でエンコードすれば、途中にパディングが入らない
+    block_size = max(3, block_size - block_size % 3)
+    remainder = b''
+
+    with path.open('rb') as file:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+
+            block = remainder + block
+            length = len(block) - len(block) % 3
+            remainder = block[length:]
+
+            if length:
+                yield base64.b64encode(block[:length])
+
+    if remainder:
+        yield base64.b64encode(remainder)
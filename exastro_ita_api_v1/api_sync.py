@@ -0,0 +1,97 @@
+import datetime
+
+from .api import *
+from .api_menu import *
+from .constants import *
+
+
+class MenuSynchronizer(IndexerMixin):
+    TIMESTAMP_FORMATS = ('%Y/%m/%d %H:%M:%S.%f', '%Y/%m/%d %H:%M:%S')
+
+
+    def __init__(
+        self,
+        api_request: ApiRequest,
+        *,
+        menu: Menu | None = None,
+        high_water_mark: str | None = None,
+        timestamp_column_name: str = '最終更新日時',
+        overlap_seconds: float = 5.0
+    ) -> None:
+        # 最終更新日時は反映より前の時刻で記録されるため、前回の取得後に古い時刻の行が反映される場合がある。
+        # 重複して取得した行は merge_row で同じ結果になるため、既定で少し遡って取得する
+        self.__api_request = api_request
+        self.__menu = menu if menu is not None else Menu(api_request.indexer)
+        self.__high_water_mark = high_water_mark
+        self.__timestamp_column_name = timestamp_column_name
+        self.__overlap_seconds = overlap_seconds
+
+        self.check_acceptable(self.__menu)
+
+
+    @property
+    def api_request(self) -> ApiRequest:
+        return self.__api_request
+
+
+    @property
+    def indexer(self) -> Indexer:
+        return self.__api_request.indexer
+
+
+    @property
+    def menu(self) -> Menu:
+        return self.__menu
+
+
+    @property
+    def high_water_mark(self) -> str | None:
+        return self.__high_water_mark
+
+
+    def reset(self) -> None:
+        self.__menu = Menu(self.indexer)
+        self.__high_water_mark = None
+
+
+    def sync(self, params: dict | None = None) -> list[Row]:
+        timestamp_index = self.indexer[self.__timestamp_column_name]
+
+        # 廃止された行も取り込むため、廃止状態では絞り込まない
+        filter_params = dict(params) if params else {}
+        if self.__high_water_mark is not None:
+            filter_params[timestamp_index] = create_range_filter(start=self.__to_range_start(self.__high_water_mark))
+
+        # 前回と同じ条件でも新しい変更を取得するため、応答キャッシュは使わない
+        with self.__api_request.send_post(XCommand.FILTER, filter_params, cache=False) as api_response:
+            # 失敗した応答を変更なしとして扱うと、取りこぼしたまま最終更新日時を進めてしまうため例外にする
+            if not api_response.succeeded:
+                raise ApiException(f'Failed to sync. Menu ID: {self.__api_request.menu_id}, Status: {api_response.status}') from api_response.exception
+
+            changed_menu = Menu(self.indexer, api_response.json_object)
+
+        changed_rows = list(changed_menu.rows)
+        for row in changed_rows:
+            self.__menu.merge_row(row)
+
+            timestamp = row.body.values.get(timestamp_index)
+            if timestamp and (self.__high_water_mark is None or self.__high_water_mark < timestamp):
+                self.__high_water_mark = timestamp
+
+        return changed_rows
+
+
+    def __to_range_start(self, high_water_mark: str) -> str:
+        if self.__overlap_seconds <= 0:
+            return high_water_mark
+
+        # 反映が遅れた更新を取りこぼさないよう、重複させて取得する
+        for timestamp_format in MenuSynchronizer.TIMESTAMP_FORMATS:
+            try:
+                timestamp = datetime.datetime.strptime(high_water_mark, timestamp_format)
+            except ValueError:
+                continue
+
+            return (timestamp - datetime.timedelta(seconds=self.__overlap_seconds)).strftime(timestamp_format)
+
+        return high_water_mark
@@ -0,0 +1,98 @@
+import contextlib
+import time
+
+from collections.abc import Iterator
+from typing import Callable
+
+
+class ApiTimings:
+    # encode:   リクエストパラメータの JSON エンコード
+    # connect:  TCP / TLS の接続確立 (プールの接続を再利用した場合は 0)
+    # send:     リクエストの送信 (ファイルを含む場合はエンコードしながらの送信)
+    # wait:     送信完了からレスポンスヘッダ受信まで (サーバの処理時間)
+    # transfer: レスポンス本文の受信
+    # decode:   レスポンス本文の JSON デコード
+    # build:    Menu の構築
+    PHASES = ('encode', 'connect', 'send', 'wait', 'transfer', 'decode', 'build')
+
+    __slots__ = ('__clock', '__durations')
+
+
+    def __init__(self, *, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.__clock = clock
+        self.__durations: dict[str, float] = {}
+
+
+    def __repr__(self) -> str:
+        return 'ApiTimings(' + ', '.join(f'{phase}={duration:.6f}' for phase, duration in self.items()) + ')'
+
+
+    @property
+    def clock(self) -> Callable[[], float]:
+        return self.__clock
+
+
+    @property
+    def encode(self) -> float | None:
+        return self.__durations.get('encode')
+
+
+    @property
+    def connect(self) -> float | None:
+        return self.__durations.get('connect')
+
+
+    @property
+    def send(self) -> float | None:
+        return self.__durations.get('send')
+
+
+    @property
+    def wait(self) -> float | None:
+        return self.__durations.get('wait')
+
+
+    @property
+    def transfer(self) -> float | None:
+        return self.__durations.get('transfer')
+
+
+    @property
+    def decode(self) -> float | None:
+        return self.__durations.get('decode')
+
+
+    @property
+    def build(self) -> float | None:
+        return self.__durations.get('build')
+
+
+    @property
+    def total(self) -> float:
+        return sum(self.__durations.values())
+
+
+    def get(self, phase: str) -> float | None:
+        return self.__durations.get(phase)
+
+
+    def add(self, phase: str, duration: float) -> None:
+        # 同じフェーズを複数回計測した場合 (再送など) は合算する
+        self.__durations[phase] = self.__durations.get(phase, 0.0) + duration
+
+
+    @contextlib.contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        begin_time = self.__clock()
+        try:
+            yield
+        finally:
+            self.add(phase, self.__clock() - begin_time)
+
+
+    def items(self) -> list[tuple[str, float]]:
+        return [(phase, self.__durations[phase]) for phase in self.PHASES if phase in self.__durations]
+
+
+    def to_dict(self) -> dict[str, float]:
+        return dict(self.items())
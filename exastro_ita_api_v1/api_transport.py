@@ -0,0 +1,433 @@
+import collections
+import hashlib
+import http.client
+import io
+import json
+import os
+import pathlib
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+
+from collections.abc import Iterable, Iterator
+from typing import Any, BinaryIO, Protocol
+
+from .api_connection import *
+from .api_stream import *
+from .api_timing import *
+
+
+class Transport(Protocol):
+    def urlopen(
+        self,
+        method: str,
+        url: str,
+        body: bytes | Iterable[bytes] | None = None,
+        headers: dict[str, str] | None = None,
+        *,
+        timings: ApiTimings | None = None
+    ) -> Any: ...
+
+
+    def close(self) -> None: ...
+
+
+def to_http_message(header_items: Iterable[tuple[str, str]]) -> http.client.HTTPMessage:
+    return http.client.parse_headers(io.BytesIO(''.join(f'{name}: {value}\r\n' for name, value in header_items).encode('latin-1') + b'\r\n'))
+
+
+class TransportRecord:
+    # 1レコードは '>III' (メタ情報長, リクエスト本文長, レスポンス本文長) の後にそれぞれの本体が続く
+    HEADER = struct.Struct('>III')
+
+    __slots__ = ('__metadata', '__request_body', '__response_body')
+
+
+    def __init__(self, metadata: dict, request_body: bytes, response_body: bytes) -> None:
+        self.__metadata = metadata
+        self.__request_body = request_body
+        self.__response_body = response_body
+
+
+    def __repr__(self) -> str:
+        return f'TransportRecord(method={self.method!r}, url={self.url!r}, status={self.status!r}, duration={self.duration:.6f})'
+
+
+    @property
+    def metadata(self) -> dict:
+        return self.__metadata
+
+
+    @property
+    def method(self) -> str:
+        return self.__metadata['method']
+
+
+    @property
+    def url(self) -> str:
+        return self.__metadata['url']
+
+
+    @property
+    def request_headers(self) -> dict[str, str]:
+        return self.__metadata['request_headers']
+
+
+    @property
+    def request_body(self) -> bytes:
+        return self.__request_body
+
+
+    @property
+    def status(self) -> int:
+        return self.__metadata.get('status', -1)
+
+
+    @property
+    def reason(self) -> str:
+        return self.__metadata.get('reason', '')
+
+
+    @property
+    def response_headers(self) -> list[tuple[str, str]]:
+        return [(name, value) for name, value in self.__metadata.get('response_headers', [])]
+
+
+    @property
+    def response_body(self) -> bytes:
+        return self.__response_body
+
+
+    @property
+    def error(self) -> str | None:
+        return self.__metadata.get('error')
+
+
+    @property
+    def started_at(self) -> float:
+        return self.__metadata.get('started_at', 0.0)
+
+
+    @property
+    def duration(self) -> float:
+        return self.__metadata.get('duration', 0.0)
+
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return self.__metadata.get('timings', {})
+
+
+    @property
+    def xcommand(self) -> str | None:
+        return self.get_request_header('X-Command')
+
+
+    @property
+    def decoded_request_body(self) -> bytes:
+        # 圧縮して送信した EDIT の本文は、記録にも圧縮されたまま残っている
+        content_encoding = (self.get_request_header('Content-Encoding') or '').strip().lower()
+        return decompress_body(self.__request_body, content_encoding) if content_encoding and content_encoding != 'identity' else self.__request_body
+
+
+    def get_request_header(self, name: str) -> str | None:
+        return {header_name.lower(): value for header_name, value in self.request_headers.items()}.get(name.lower())
+
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return make_record_key(self.method, self.url, self.__request_body)
+
+
+    def to_response(self) -> BufferedResponse:
+        if self.error is not None:
+            raise ConnectionError(f'Recorded transport error: {self.error}')
+
+        return BufferedResponse(self.status, self.reason, to_http_message(self.response_headers), self.__response_body)
+
+
+    def write(self, file: BinaryIO, *, compress: bool = True) -> None:
+        metadata = dict(self.__metadata, compressed=compress)
+        request_body = zlib.compress(self.__request_body, 1) if compress else self.__request_body
+        response_body = zlib.compress(self.__response_body, 1) if compress else self.__response_body
+        encoded_metadata = json.dumps(metadata, ensure_ascii=False, separators=(',', ':')).encode()
+
+        # 1回の write で書き込み、途中で中断されても末尾の1レコードが欠けるだけにする
+        file.write(TransportRecord.HEADER.pack(len(encoded_metadata), len(request_body), len(response_body)) + encoded_metadata + request_body + response_body)
+
+
+    @classmethod
+    def read(cls, file: BinaryIO) -> 'TransportRecord | None':
+        header = file.read(TransportRecord.HEADER.size)
+        if len(header) < TransportRecord.HEADER.size:
+            return None
+
+        metadata_length, request_body_length, response_body_length = TransportRecord.HEADER.unpack(header)
+        payload = file.read(metadata_length + request_body_length + response_body_length)
+        if len(payload) < metadata_length + request_body_length + response_body_length:
+            # 記録中に中断された末尾のレコードは読み飛ばす
+            return None
+
+        metadata = json.loads(payload[:metadata_length])
+        request_body = payload[metadata_length:metadata_length + request_body_length]
+        response_body = payload[metadata_length + request_body_length:]
+
+        if metadata.pop('compressed', False):
+            request_body = zlib.decompress(request_body)
+            response_body = zlib.decompress(response_body)
+
+        return cls(metadata, request_body, response_body)
+
+
+# 記録ファイルに認証情報を残さない。再生時の照合はメソッド・URL・本文だけで行うため、ヘッダは伏せても困らない
+REDACTED_VALUE = '***'
+REDACTED_HEADERS = ('authorization', 'proxy-authorization')
+REDACTED_COOKIE_HEADERS = ('cookie', 'set-cookie')
+REDACTED_FORM_FIELDS = ('username', 'password')
+
+
+def redact_header_value(name: str, value: str) -> str:
+    if name.lower() in REDACTED_HEADERS:
+        return REDACTED_VALUE
+
+    if name.lower() == 'cookie':
+        # Cookie の名前は残し、値だけを伏せる
+        return '; '.join(item.split('=', 1)[0] + '=' + REDACTED_VALUE for item in value.split(';') if item.strip())
+
+    if name.lower() == 'set-cookie':
+        cookie, separator, attributes = value.partition(';')
+        return cookie.split('=', 1)[0] + '=' + REDACTED_VALUE + separator + attributes
+
+    return value
+
+
+def redact_request_body(body: bytes, headers: dict[str, str] | None) -> bytes:
+    # ログインフォームのユーザ名とパスワードを伏せる。伏せた本文をもう一度伏せても同じ結果になる
+    content_type = next((value for name, value in (headers or {}).items() if name.lower() == 'content-type'), '')
+    if not body or not content_type.lower().startswith('application/x-www-form-urlencoded'):
+        return body
+
+    fields = urllib.parse.parse_qsl(body.decode('latin-1'), keep_blank_values=True)
+    if not any(name in REDACTED_FORM_FIELDS for name, _ in fields):
+        return body
+
+    return urllib.parse.urlencode([(name, REDACTED_VALUE if name in REDACTED_FORM_FIELDS else value) for name, value in fields]).encode()
+
+
+def make_record_key(method: str, url: str, body: bytes | None) -> tuple[str, str, str]:
+    return (method.upper(), url, hashlib.sha256(body if body else b'').hexdigest())
+
+
+def read_records(path: str | os.PathLike) -> Iterator[TransportRecord]:
+    with open(path, 'rb') as file:
+        while True:
+            record = TransportRecord.read(file)
+            if record is None:
+                return
+
+            yield record
+
+
+class RecordingTransport:
+    def __init__(
+        self,
+        transport: Transport,
+        path: str | os.PathLike,
+        *,
+        compress: bool = True,
+        clock=time.monotonic
+    ) -> None:
+        self.__transport = transport
+        self.__path = pathlib.Path(path)
+        self.__compress = compress
+        self.__clock = clock
+        self.__origin = clock()
+        self.__file = self.__path.open('ab')
+        self.__lock = threading.Lock()
+        self.__record_count = 0
+
+
+    @property
+    def transport(self) -> Transport:
+        return self.__transport
+
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self.__path
+
+
+    @property
+    def record_count(self) -> int:
+        return self.__record_count
+
+
+    def urlopen(
+        self,
+        method: str,
+        url: str,
+        body: bytes | Iterable[bytes] | None = None,
+        headers: dict[str, str] | None = None,
+        *,
+        timings: ApiTimings | None = None
+    ) -> BufferedResponse:
+        timings = timings if timings is not None else ApiTimings()
+
+        # chunked 転送の本文は送信しながら控えておく
+        request_chunks: list[bytes] = []
+        if body is not None and not isinstance(body, (bytes, bytearray)):
+            source = body
+            def tee() -> Iterator[bytes]:
+                for chunk in source:
+                    request_chunks.append(chunk)
+                    yield chunk
+            body = tee()
+        elif body is not None:
+            request_chunks.append(bytes(body))
+
+        started_at = self.__clock()
+        metadata: dict[str, Any] = {
+            'started_at': started_at - self.__origin,
+            'method': method,
+            'url': url,
+            'request_headers': {name: redact_header_value(name, value) for name, value in headers.items()} if headers else {}
+        }
+
+        try:
+            with self.__transport.urlopen(method, url, body, headers, timings=timings) as response:
+                with timings.measure('transfer'):
+                    response_body = response.read()
+
+                metadata.update({
+                    'status': response.status,
+                    'reason': response.reason,
+                    'response_headers': [(name, redact_header_value(name, value)) for name, value in response.headers.items()]
+                })
+        except Exception as e:
+            metadata.update({'error': f'{type(e).__name__}: {e}', 'duration': self.__clock() - started_at, 'timings': timings.to_dict()})
+            self.__write(TransportRecord(metadata, redact_request_body(b''.join(request_chunks), headers), b''))
+            raise
+
+        metadata.update({'duration': self.__clock() - started_at, 'timings': timings.to_dict()})
+        self.__write(TransportRecord(metadata, redact_request_body(b''.join(request_chunks), headers), response_body))
+
+        # 呼び出し元には伏せる前の Set-Cookie を返す
+        return BufferedResponse(metadata['status'], metadata['reason'], response.headers, response_body)
+
+
+    def close(self) -> None:
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+        self.__transport.close()
+
+
+    def __write(self, record: TransportRecord) -> None:
+        with self.__lock:
+            record.write(self.__file, compress=self.__compress)
+            self.__file.flush()
+            self.__record_count += 1
+
+
+class ReplayTransport:
+    def __init__(
+        self,
+        records: str | os.PathLike | Iterable[TransportRecord],
+        *,
+        pace: float = 0.0,
+        loop: bool = True,
+        sleep=time.sleep
+    ) -> None:
+        # pace=0 は待ち合わせなし、pace=1 は記録時の応答時間どおり、pace=0.5 はその半分の時間で応答する
+        self.__records = list(read_records(records) if isinstance(records, (str, os.PathLike)) else records)
+        self.__pace = pace
+        self.__loop = loop
+        self.__sleep = sleep
+        self.__queues: dict[tuple[str, str, str], collections.deque[TransportRecord]] = {}
+        self.__lock = threading.Lock()
+        self.__replay_count = 0
+
+        self.reset()
+
+
+    @property
+    def records(self) -> list[TransportRecord]:
+        return self.__records
+
+
+    @property
+    def pace(self) -> float:
+        return self.__pace
+
+
+    @property
+    def replay_count(self) -> int:
+        return self.__replay_count
+
+
+    def reset(self) -> None:
+        # 同じリクエストが複数回記録されている場合は記録順に返す
+        with self.__lock:
+            self.__queues = {}
+            for record in self.__records:
+                self.__queues.setdefault(record.key, collections.deque()).append(record)
+
+
+    def urlopen(
+        self,
+        method: str,
+        url: str,
+        body: bytes | Iterable[bytes] | None = None,
+        headers: dict[str, str] | None = None,
+        *,
+        timings: ApiTimings | None = None
+    ) -> BufferedResponse:
+        timings = timings if timings is not None else ApiTimings()
+
+        with timings.measure('send'):
+            request_body = b''.join(body) if body is not None and not isinstance(body, (bytes, bytearray)) else bytes(body) if body else b''
+
+        # 記録時と同じくログインフォームを伏せてから照合する
+        key = make_record_key(method, url, redact_request_body(request_body, headers))
+        with self.__lock:
+            queue = self.__queues.get(key)
+            if not queue:
+                raise ConnectionError(f'No recorded response for {method} {url} ({len(request_body)} bytes body).')
+
+            record = queue.popleft()
+            # 繰り返し再生できるよう、使った記録は末尾に戻す
+            if self.__loop:
+                queue.append(record)
+            self.__replay_count += 1
+
+        if self.__pace > 0:
+            with timings.measure('wait'):
+                self.__sleep(record.duration * self.__pace)
+
+        return record.to_response()
+
+
+    def close(self) -> None:
+        pass
+
+
+def iter_api_records(records: Iterable[TransportRecord], *, repeat: int = 1) -> Iterator['ApiJob']:
+    # REST API の記録を ApiJob に戻す。Web 画面の記録は対象外。
+    # 待ち合わせ中の問い合わせも記録に含まれているため、再生時は待ち合わせ関数を呼び出さない
+    from .api_executor import ApiJob
+
+    jobs = []
+    for record in records:
+        if record.xcommand is None:
+            continue
+
+        menu_id = urllib.parse.parse_qs(urllib.parse.urlsplit(record.url).query).get('no', [''])[0]
+        request_body = record.decoded_request_body
+        params = json.loads(request_body) if request_body else None
+        jobs.append(ApiJob(menu_id, record.xcommand, params, wait_func=lambda api_response: None))
+
+    for _ in range(repeat):
+        yield from jobs
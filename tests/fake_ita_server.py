@@ -0,0 +1,397 @@
+import argparse
+import base64
+import datetime
+import gzip
+import http.server
+import json
+import socket
+import threading
+import time
+import urllib.parse
+
+from typing import Any
+
+
+REST_API_PATH = '/default/menu/07_rest_api_ver1.php'
+AUTH_PATH = '/common/common_auth.php'
+BROWSE_PATH = '/default/menu/01_browse.php'
+
+COMMON_COLUMN_NAMES = ['実行処理種別', '廃止', 'ID']
+DATA_COLUMN_NAMES = ['ホスト名', 'IPアドレス', '備考', 'ファイル']
+LAST_UPDATE_COLUMN_NAMES = ['最終更新日時', '更新用の最終更新日時', '最終更新者']
+
+SESSION_COOKIE = 'fake_ita_session=authenticated'
+
+
+class FakeMenu:
+    def __init__(self, menu_id: str, *, rows: int = 0, extra_columns: int = 0) -> None:
+        self.__menu_id = menu_id
+        self.__column_names = (
+            COMMON_COLUMN_NAMES
+            + DATA_COLUMN_NAMES
+            + [f'項目{number:03}' for number in range(1, extra_columns + 1)]
+            + LAST_UPDATE_COLUMN_NAMES
+        )
+        self.__positions = {column_name: str(position) for position, column_name in enumerate(self.__column_names)}
+        self.__rows: dict[str, list[str]] = {}
+        self.__next_id = 1
+        self.__lock = threading.Lock()
+
+        for number in range(rows):
+            self.register({
+                self.position('ホスト名'): f'host-{number:06}',
+                self.position('IPアドレス'): f'10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}',
+                **{str(position): f'value-{number}-{position}' for position in range(len(DATA_COLUMN_NAMES) + 3, len(self.__column_names) - 3)}
+            })
+
+
+    @property
+    def menu_id(self) -> str:
+        return self.__menu_id
+
+
+    @property
+    def column_names(self) -> list[str]:
+        return self.__column_names
+
+
+    @property
+    def rows(self) -> dict[str, list[str]]:
+        return self.__rows
+
+
+    @property
+    def lock(self) -> threading.Lock:
+        return self.__lock
+
+
+    def position(self, column_name: str) -> str:
+        return self.__positions[column_name]
+
+
+    def register(self, values: dict[str, Any]) -> list[str]:
+        row = [''] * len(self.__column_names)
+        for index, value in values.items():
+            if index.isdigit() and int(index) < len(row) and value is not None:
+                row[int(index)] = str(value)
+
+        row[0] = ''
+        row[1] = ''
+        row[2] = str(self.__next_id)
+        self.__next_id += 1
+        self.__touch(row)
+
+        self.__rows[row[2]] = row
+        return row
+
+
+    def edit(self, values: dict[str, Any]) -> list:
+        operation = values.get('0')
+        if operation == '登録':
+            return ['000', self.register(values)[2], '']
+
+        row = self.__rows.get(str(values.get('2')))
+        if row is None:
+            return ['002', values.get('2', ''), 'Record not found.']
+
+        # 更新用の最終更新日時による楽観ロック
+        if values.get(self.position('更新用の最終更新日時')) != row[int(self.position('更新用の最終更新日時'))]:
+            return ['002', row[2], 'The record has been updated by another user.']
+
+        if operation == '更新':
+            protected = {'0', '1', '2'} | {self.position(column_name) for column_name in LAST_UPDATE_COLUMN_NAMES}
+            for index, value in values.items():
+                if index.isdigit() and index not in protected and int(index) < len(row) and value is not None:
+                    row[int(index)] = str(value)
+        elif operation == '廃止':
+            row[1] = '廃止'
+        elif operation == '復活':
+            row[1] = ''
+        else:
+            return ['001', row[2], f'Unknown operation "{operation}".']
+
+        self.__touch(row)
+        return ['000', row[2], '']
+
+
+    def filter(self, params: dict[str, Any]) -> list[list[str]]:
+        # ID の完全一致は全件走査しない
+        row_id = params.get('2', {}).get('NORMAL')
+        rows = [self.__rows[row_id]] if row_id in self.__rows else [] if row_id is not None else list(self.__rows.values())
+
+        for index, condition in params.items():
+            position = int(index)
+
+            if 'NORMAL' in condition:
+                if position == 1:
+                    discarded = condition['NORMAL'] == '1'
+                    rows = [row for row in rows if (row[1] == '廃止') == discarded]
+                else:
+                    rows = [row for row in rows if row[position] == condition['NORMAL']]
+
+            if 'LIST' in condition:
+                values = condition['LIST'].values() if isinstance(condition['LIST'], dict) else condition['LIST']
+                value_set = set(values)
+                rows = [row for row in rows if row[position] in value_set]
+
+            if 'RANGE' in condition:
+                start = condition['RANGE'].get('START', '')
+                end = condition['RANGE'].get('END', '')
+                rows = [row for row in rows if (not start or row[position] >= start) and (not end or row[position] <= end)]
+
+        return rows
+
+
+    def __touch(self, row: list[str]) -> None:
+        timestamp = datetime.datetime.now().strftime('%Y/%m/%d %H:%M:%S.%f')
+        row[int(self.position('最終更新日時'))] = timestamp
+        row[int(self.position('更新用の最終更新日時'))] = 'T_' + timestamp.replace('/', '').replace(' ', '').replace(':', '').replace('.', '')
+        row[int(self.position('最終更新者'))] = 'システム管理者'
+
+
+class FakeItaRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'FakeItaHTTPServer'
+
+
+    def setup(self) -> None:
+        super().setup()
+        # 小さな応答が Nagle アルゴリズムで遅延しないようにする
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+    def do_GET(self) -> None:
+        self.__read_body()
+        self.__delay()
+
+        if SESSION_COOKIE in self.headers.get('Cookie', ''):
+            self.__send(200, b'<html><body>menu</body></html>', content_type='text/html')
+        else:
+            self.__send(401, b'<html><body>unauthorized</body></html>', content_type='text/html')
+
+
+    def do_POST(self) -> None:
+        body = self.__read_body()
+        self.__delay()
+
+        path, _, query = self.path.partition('?')
+        if path == AUTH_PATH:
+            self.__handle_auth(urllib.parse.parse_qs(body.decode()))
+        elif path == REST_API_PATH:
+            self.__handle_rest_api(urllib.parse.parse_qs(query).get('no', [''])[0], body)
+        else:
+            self.__send(404, b'', content_type='text/html')
+
+
+    def __handle_auth(self, form: dict[str, list[str]]) -> None:
+        if 'username' not in form:
+            page = '<html><body><form method="post"><input type="hidden" name="csrf_token" value="fake-csrf-token"></form></body></html>'
+            self.__send(200, page.encode(), content_type='text/html')
+        elif form.get('username') == [self.server.username] and form.get('password') == [self.server.password] and form.get('csrf_token') == ['fake-csrf-token']:
+            self.__send(302, b'', content_type='text/html', headers={
+                'Location': BROWSE_PATH,
+                'Set-Cookie': SESSION_COOKIE + '; Path=/'
+            })
+        else:
+            self.__send(200, b'<html><body>login failed</body></html>', content_type='text/html')
+
+
+    def __handle_rest_api(self, menu_id: str, body: bytes) -> None:
+        if self.headers.get('Authorization') != self.server.credential:
+            self.__send_json(401, {'status': 'UNAUTHORIZED', 'resultdata': {}})
+            return
+
+        menu = self.server.menus.get(menu_id)
+        if menu is None:
+            self.__send_json(404, {'status': 'NOT_FOUND', 'resultdata': {}})
+            return
+
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            self.__send_json(400, {'status': 'BAD_REQUEST', 'resultdata': {}})
+            return
+
+        xcommand = self.headers.get('X-Command')
+        with menu.lock:
+            if xcommand == 'INFO':
+                self.__send_json(200, {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'INFO': menu.column_names}}})
+
+            elif xcommand == 'LIST_OPTIONS':
+                options = [{} for _ in menu.column_names]
+                options[1] = {'0': '', '1': '廃止'}
+                self.__send_json(200, {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'BODY': [menu.column_names, options]}}})
+
+            elif xcommand in ('FILTER', 'FILTER_DATAONLY'):
+                rows = menu.filter(params)
+                header = [menu.column_names] if xcommand == 'FILTER' else []
+                self.__send_json(200, {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {
+                    'RECORD_LENGTH': len(rows),
+                    'BODY': header + rows,
+                    'UPLOAD_FILE': [[None] * len(menu.column_names) for _ in header + rows]
+                }}})
+
+            elif xcommand == 'EDIT':
+                raw = [menu.edit(values) for key, values in params.items() if key != 'UPLOAD_FILE']
+                self.__send_json(200, {'status': 'SUCCEED', 'resultdata': {
+                    'LIST': {
+                        'NORMAL': {'error': {'name': 'エラー', 'ct': sum(1 for code, _, _ in raw if code != '000')}},
+                        'RAW': raw
+                    }
+                }})
+
+            else:
+                self.__send_json(400, {'status': 'BAD_REQUEST', 'resultdata': {}})
+
+
+    def __delay(self) -> None:
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+
+    def __read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b''.join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', '0')))
+
+        if self.headers.get('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+
+        return body
+
+
+    def __send_json(self, status: int, json_object: dict) -> None:
+        # PHP の json_encode と同様に / をエスケープする
+        body = json.dumps(json_object, ensure_ascii=False).replace('/', '\\/').encode()
+        self.__send(status, body, content_type='application/json')
+
+
+    def __send(self, status: int, body: bytes, *, content_type: str, headers: dict[str, str] = {}) -> None:
+        extra_headers = dict(headers)
+        if self.server.compress and 'gzip' in self.headers.get('Accept-Encoding', '') and body:
+            body = gzip.compress(body, compresslevel=1)
+            extra_headers['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeItaHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    menus: dict[str, FakeMenu]
+    latency: float
+    compress: bool
+    username: str
+    password: str
+    credential: str
+
+
+class FakeItaServer:
+    def __init__(
+        self,
+        menus: dict[str, FakeMenu] | None = None,
+        *,
+        rows: int = 100,
+        extra_columns: int = 0,
+        latency: float = 0.0,
+        compress: bool = True,
+        username: str = 'administrator',
+        password: str = 'password',
+        port: int = 0
+    ) -> None:
+        self.__server = FakeItaHTTPServer(('127.0.0.1', port), FakeItaRequestHandler)
+        self.__server.menus = menus if menus is not None else {'2100000303': FakeMenu('2100000303', rows=rows, extra_columns=extra_columns)}
+        self.__server.latency = latency
+        self.__server.compress = compress
+        self.__server.username = username
+        self.__server.password = password
+        self.__server.credential = base64.b64encode(f'{username}:{password}'.encode()).decode()
+        self.__thread: threading.Thread | None = None
+
+
+    def __enter__(self) -> 'FakeItaServer':
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+
+    @property
+    def menus(self) -> dict[str, FakeMenu]:
+        return self.__server.menus
+
+
+    @property
+    def config(self) -> dict[str, str]:
+        return {
+            'EXASTRO_PROTOCOL': 'http',
+            'EXASTRO_HOST': '127.0.0.1',
+            'EXASTRO_PORT': str(self.port),
+            'EXASTRO_USERNAME': self.__server.username,
+            'EXASTRO_PASSWORD': self.__server.password
+        }
+
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+
+
+def main() -> None:
+    # クライアントのメモリ計測にサーバの割り当てが混ざらないよう、別プロセスで起動できるようにする
+    parser = argparse.ArgumentParser(description='Stand-in server for the Exastro ITA v1 REST API.')
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--extra-columns', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--no-compress', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeItaServer(rows=args.rows, extra_columns=args.extra_columns, latency=args.latency, compress=not args.no_compress, port=args.port)
+    print(server.port, flush=True)
+
+    try:
+        server.start()
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+def test_waiting_rows_follow_edit_input():
+    with FakeItaServer(rows=2) as server:
+        with apiv1.ApiContext(server.config, default_wait_func=lambda api_response: None) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            indexer = api_request.indexer
+            last_updates = {row[2]: row[int(indexer['更新用の最終更新日時'])] for row in server.menus[MENU_ID].rows.values()}
+
+            parameters = {
+                '0': {indexer['実行処理種別']: apiv1.実行処理種別.登録, indexer['ホスト名']: 'host-new'},
+                '1': {indexer['実行処理種別']: apiv1.実行処理種別.更新, indexer['ID']: '1', indexer['備考']: 'updated', indexer['更新用の最終更新日時']: last_updates['1']},
+                '2': {indexer['実行処理種別']: apiv1.実行処理種別.廃止, indexer['ID']: '2', indexer['更新用の最終更新日時']: last_updates['2']}
+            }
+
+            with api_request.send_post(apiv1.XCommand.EDIT, parameters) as api_response:
+                waiting_rows = apiv1.AdaptiveWait().get_waiting_rows(api_response)
+
+    assert waiting_rows == {
+        '3': (apiv1.実行処理種別.登録, ''),
+        '1': (apiv1.実行処理種別.更新, last_updates['1']),
+        '2': (apiv1.実行処理種別.廃止, last_updates['2'])
+    }
+
+
+def test_is_reflected():
+    adaptive_wait = apiv1.AdaptiveWait()
+    row = {apiv1.CommonIndex.廃止: '', apiv1.CommonIndex.ID: '1', '9': 'T_2'}
+
+    # 更新は更新用の最終更新日時が送信した値から変わるまで反映されていないとみなす
+    assert not adaptive_wait.is_reflected(row, apiv1.実行処理種別.更新, 'T_2', last_update_index='9')
+    assert adaptive_wait.is_reflected(row, apiv1.実行処理種別.更新, 'T_1', last_update_index='9')
+
+    assert not adaptive_wait.is_reflected(row, apiv1.実行処理種別.廃止, 'T_1', last_update_index='9')
+    assert adaptive_wait.is_reflected(row | {apiv1.CommonIndex.廃止: '廃止'}, apiv1.実行処理種別.廃止, 'T_1', last_update_index='9')
+    assert adaptive_wait.is_reflected(row, apiv1.実行処理種別.復活, 'T_1', last_update_index='9')
+    assert not adaptive_wait.is_reflected(row | {apiv1.CommonIndex.廃止: '廃止'}, apiv1.実行処理種別.復活, 'T_1', last_update_index='9')
+    assert adaptive_wait.is_reflected(row, apiv1.実行処理種別.登録, '', last_update_index='9')
+
+
+def test_edit_returns_once_reflected():
+    with FakeItaServer(rows=1) as server:
+        with apiv1.ApiContext(server.config, default_wait_func=apiv1.AdaptiveWait(timeout=5.0)) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            indexer = api_request.indexer
+            last_update = server.menus[MENU_ID].rows['1'][int(indexer['更新用の最終更新日時'])]
+
+            begin_time = time.monotonic()
+            with api_request.send_post(apiv1.XCommand.EDIT, {'0': {
+                indexer['実行処理種別']: apiv1.実行処理種別.更新,
+                indexer['ID']: '1',
+                indexer['備考']: 'updated',
+                indexer['更新用の最終更新日時']: last_update
+            }}) as api_response:
+                assert api_response.succeeded
+
+    assert time.monotonic() - begin_time < 1.0
+
+
+def test_async_edit_with_default_wait():
+    async def main():
+        with FakeItaServer(rows=1) as server:
+            async with apiv1.AsyncApiContext(server.config, async_connection_pool=apiv1.AsyncConnectionPool(proxies={})) as api_context:
+                api_request = api_context.create_api_request(MENU_ID)
+                indexer = await api_request.load_indexer()
+                last_update = server.menus[MENU_ID].rows['1'][int(indexer['更新用の最終更新日時'])]
+
+                # 別の ApiRequest からの EDIT でも、待ち合わせ中に indexer を読み込む
+                api_request = api_context.create_api_request(MENU_ID)
+                with await api_request.send_post(apiv1.XCommand.EDIT, {'0': {
+                    indexer['実行処理種別']: apiv1.実行処理種別.更新,
+                    indexer['ID']: '1',
+                    indexer['備考']: 'updated',
+                    indexer['更新用の最終更新日時']: last_update
+                }}) as api_response:
+                    return api_response.succeeded, server.menus[MENU_ID].rows['1'][int(indexer['備考'])]
+
+    begin_time = time.monotonic()
+    assert asyncio.run(main()) == (True, 'updated')
+    assert time.monotonic() - begin_time < 2.0
+
+
+def test_seconds_argument_is_accepted():
+    with FakeItaServer(rows=1) as server:
+        with apiv1.ApiContext(server.config) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+
+            # 以前の既定の待ち合わせ関数と同じ引数を渡しても動作する
+            begin_time = time.monotonic()
+            with api_request.send_post(apiv1.XCommand.EDIT, {'0': {api_request.indexer['実行処理種別']: apiv1.実行処理種別.登録, api_request.indexer['ホスト名']: 'host-new'}}, wait_func_args={'seconds': 0.5}) as api_response:
+                assert api_response.succeeded
+            assert time.monotonic() - begin_time < 1.0
+
+            # 結果の行を特定できない場合は fallback_seconds の代わりに seconds だけ待つ
+            with api_request.send_post(apiv1.XCommand.FILTER, {}) as filter_response:
+                begin_time = time.monotonic()
+                apiv1.AdaptiveWait(fallback_seconds=10.0)(filter_response, seconds=0.0)
+                assert time.monotonic() - begin_time < 1.0
@@ -0,0 +1,104 @@
+import asyncio
+import http.client
+import io
+import json
+
+import exastro_ita_api_v1 as apiv1
+
+from exastro_ita_api_v1.api_connection import BufferedResponse
+
+
+MENU_ID = '2100000303'
+COLUMN_NAMES = ['実行処理種別', '廃止', 'ID', 'ホスト名', '備考', '最終更新日時', '更新用の最終更新日時', '最終更新者']
+
+
+class StubAsyncConnectionPool:
+    # 行 ID 1 の1行だけを持つメニューとして応答する。更新は reflect_after 回目の確認で反映されたことにする
+    def __init__(self, *, reflect_after: int = 1) -> None:
+        self.requests: list[tuple[str, str | None, dict]] = []
+        self.reflect_after = reflect_after
+        self.filter_count = 0
+        self.last_update = 'T_1'
+
+
+    async def urlopen(self, method, url, body=None, headers=None, *, timings=None) -> BufferedResponse:
+        xcommand = headers.get('X-Command')
+        self.requests.append((method, xcommand, headers))
+        # 同時に呼ばれた他のコルーチンに切り替わる機会を作る
+        await asyncio.sleep(0.01)
+
+        if xcommand == apiv1.XCommand.INFO:
+            json_object = {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'INFO': COLUMN_NAMES}}}
+        elif xcommand == apiv1.XCommand.EDIT:
+            json_object = {'status': 'SUCCEED', 'resultdata': {'LIST': {'NORMAL': {}, 'RAW': [['000', '1', '']]}}}
+        else:
+            self.filter_count += 1
+            if self.filter_count >= self.reflect_after:
+                self.last_update = 'T_2'
+            json_object = {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'RECORD_LENGTH': 1, 'BODY': [COLUMN_NAMES, ['', '', '1', 'host-1', '', '', self.last_update, '']]}}}
+
+        return BufferedResponse(200, 'OK', http.client.parse_headers(io.BytesIO(b'\r\n')), json.dumps(json_object).encode())
+
+
+    async def close(self) -> None:
+        pass
+
+
+    def count(self, xcommand: str) -> int:
+        return sum(1 for _, requested_xcommand, _ in self.requests if requested_xcommand == xcommand)
+
+
+def create_context(async_connection_pool: StubAsyncConnectionPool, **kwargs) -> apiv1.AsyncApiContext:
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+    return apiv1.AsyncApiContext(config, async_connection_pool=async_connection_pool, **kwargs)  # type: ignore[arg-type]
+
+
+def test_send_post():
+    async_connection_pool = StubAsyncConnectionPool()
+
+    async def main():
+        async with create_context(async_connection_pool) as api_context:
+            with await api_context.create_api_request(MENU_ID).send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                return api_response.succeeded, api_response.json_object['resultdata']['CONTENTS']['RECORD_LENGTH']
+
+    assert asyncio.run(main()) == (True, 1)
+
+    method, xcommand, headers = async_connection_pool.requests[0]
+    assert (method, xcommand) == ('POST', apiv1.XCommand.FILTER)
+    assert headers['Content-Type'] == 'application/json'
+    assert headers['Authorization']
+
+
+def test_load_indexer_is_single_flight():
+    async_connection_pool = StubAsyncConnectionPool()
+
+    async def main():
+        async with create_context(async_connection_pool) as api_context:
+            api_requests = [api_context.create_api_request(MENU_ID) for _ in range(3)]
+            indexers = await asyncio.gather(*[api_request.load_indexer() for api_request in api_requests + api_requests])
+
+            # 読み込み後は新しい ApiRequest でも INFO を送信しない
+            indexers.append(await api_context.create_api_request(MENU_ID).load_indexer())
+            return indexers
+
+    indexers = asyncio.run(main())
+
+    assert async_connection_pool.count(apiv1.XCommand.INFO) == 1
+    assert all(indexer is indexers[0] for indexer in indexers)
+    assert indexers[0]['ホスト名'] == '3'
+
+
+def test_edit_with_default_wait():
+    async_connection_pool = StubAsyncConnectionPool(reflect_after=2)
+
+    async def main():
+        async with create_context(async_connection_pool) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            with await api_request.send_post(apiv1.XCommand.EDIT, {'0': {'0': apiv1.実行処理種別.更新, '2': '1', '4': 'updated', '6': 'T_1'}}) as api_response:
+                return api_response.succeeded
+
+    assert asyncio.run(main())
+
+    # 既定の AdaptiveWait は、更新用の最終更新日時が変わるまで確認を繰り返す
+    assert async_connection_pool.count(apiv1.XCommand.FILTER_DATAONLY) == 2
+    assert async_connection_pool.count(apiv1.XCommand.INFO) == 1
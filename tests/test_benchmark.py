@@ -0,0 +1,167 @@
+import exastro_ita_api_v1 as apiv1
+import concurrent.futures
+import os
+import pathlib
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+
+# 件数やレイテンシは環境変数で変更できる
+BENCH_ROWS = int(os.environ.get('BENCH_ROWS', '10000'))
+BENCH_EXTRA_COLUMNS = int(os.environ.get('BENCH_EXTRA_COLUMNS', '20'))
+BENCH_LATENCY = float(os.environ.get('BENCH_LATENCY', '0'))
+BENCH_REQUESTS = int(os.environ.get('BENCH_REQUESTS', '200'))
+BENCH_CONCURRENCY = int(os.environ.get('BENCH_CONCURRENCY', '8'))
+
+MENU_ID = apiv1.MenuId.基本コンソール.機器一覧
+
+
+class Measurement:
+    def __init__(self, name: str, count: int, unit: str) -> None:
+        self.name = name
+        self.count = count
+        self.unit = unit
+        self.elapsed = 0.0
+        self.peak = 0
+
+
+    def __enter__(self) -> 'Measurement':
+        tracemalloc.start()
+        self.__begin_time = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.elapsed = time.perf_counter() - self.__begin_time
+        _, self.peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if exc_type is None:
+            print(f'\n{self.name:<40} {self.count:>8} {self.unit:<5} {self.elapsed:>9.3f} s {self.count / self.elapsed:>12,.0f} {self.unit}/s {self.peak / 1024 / 1024:>9.1f} MiB peak')
+
+
+@pytest.fixture(scope='module')
+def fake_ita_server():
+    # サーバ側のメモリ割り当てが計測に混ざらないよう別プロセスで起動する
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'tests.fake_ita_server',
+            '--rows', str(BENCH_ROWS),
+            '--extra-columns', str(BENCH_EXTRA_COLUMNS),
+            '--latency', str(BENCH_LATENCY)
+        ],
+        cwd=pathlib.Path(__file__).parent.parent,
+        stdout=subprocess.PIPE,
+        text=True
+    )
+
+    try:
+        port = process.stdout.readline().strip()  # type: ignore[union-attr]
+        yield {
+            'EXASTRO_PROTOCOL': 'http',
+            'EXASTRO_HOST': '127.0.0.1',
+            'EXASTRO_PORT': port,
+            'EXASTRO_USERNAME': 'administrator',
+            'EXASTRO_PASSWORD': 'password',
+            'EXASTRO_POOL_SIZE': str(BENCH_CONCURRENCY)
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture
+def api_request(fake_ita_server):
+    with apiv1.ApiContext(fake_ita_server) as api_context:
+        api_request = api_context.create_api_request(MENU_ID)
+        api_request.indexer
+        yield api_request
+
+
+def fetch_all(api_request: apiv1.ApiRequest) -> dict:
+    with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+        return api_response.json_object
+
+
+def test_benchmark_requests_per_second(api_request):
+    params = {apiv1.CommonIndex.ID: {'NORMAL': '1'}}
+
+    def send() -> int:
+        with api_request.send_post(apiv1.XCommand.FILTER_DATAONLY, params) as api_response:
+            return len(api_response.json_object['resultdata']['CONTENTS']['BODY'])
+
+    with Measurement('FILTER_DATAONLY (sequential)', BENCH_REQUESTS, 'req'):
+        results = [send() for _ in range(BENCH_REQUESTS)]
+
+    assert results == [1] * BENCH_REQUESTS
+
+    with concurrent.futures.ThreadPoolExecutor(BENCH_CONCURRENCY) as executor:
+        with Measurement(f'FILTER_DATAONLY (concurrency={BENCH_CONCURRENCY})', BENCH_REQUESTS, 'req'):
+            results = list(executor.map(lambda _: send(), range(BENCH_REQUESTS)))
+
+    assert results == [1] * BENCH_REQUESTS
+
+
+def test_benchmark_filter_parsing(api_request):
+    with Measurement('FILTER (body + json_object)', BENCH_ROWS, 'rows'):
+        with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+            json_object = api_response.json_object
+
+    assert len(json_object['resultdata']['CONTENTS']['BODY']) == BENCH_ROWS + 1
+
+    with Measurement('FILTER (iter_rows)', BENCH_ROWS, 'rows'):
+        with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+            # ファイルの値を待つと行を保持するため、BODY のみを読む
+            count = sum(1 for _ in api_response.iter_rows(files=False))
+
+    assert count == BENCH_ROWS
+
+
+def test_benchmark_menu_construction(api_request):
+    json_object = fetch_all(api_request)
+
+    with Measurement('Menu(json_object)', BENCH_ROWS, 'rows'):
+        menu = apiv1.Menu(api_request.indexer, json_object)
+
+    assert len(menu.rows) == BENCH_ROWS
+
+    with Measurement('ColumnarMenu(json_object)', BENCH_ROWS, 'rows'):
+        columnar_menu = apiv1.ColumnarMenu(api_request.indexer, json_object)
+
+    assert len(columnar_menu) == BENCH_ROWS
+
+    del json_object
+
+    with Measurement('Menu.from_stream (FILTER)', BENCH_ROWS, 'rows'):
+        with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+            menu = apiv1.Menu.from_stream(api_request.indexer, api_response)
+
+    assert len(menu.rows) == BENCH_ROWS
+
+
+def test_benchmark_to_edit_parameters(api_request):
+    menu = apiv1.Menu(api_request.indexer, fetch_all(api_request))
+    for row in menu.rows:
+        row.body['実行処理種別'] = apiv1.実行処理種別.更新
+
+    with Measurement('Menu.to_edit_parameters', BENCH_ROWS, 'rows'):
+        parameters = menu.to_edit_parameters()
+
+    assert len(parameters) >= BENCH_ROWS
+
+
+def test_benchmark_bulk_edit(api_request):
+    menu = apiv1.Menu(api_request.indexer, fetch_all(api_request))
+    for row in menu.rows:
+        row.body['実行処理種別'] = apiv1.実行処理種別.更新
+        row.body['備考'] = 'benchmark'
+
+    with Measurement(f'Menu.bulk_edit (concurrency={BENCH_CONCURRENCY})', BENCH_ROWS, 'rows'):
+        bulk_edit_result = menu.bulk_edit(api_request, max_rows=500, concurrency=BENCH_CONCURRENCY, wait_func=lambda api_response: None)
+
+    assert len(bulk_edit_result.succeeded) == BENCH_ROWS
+    assert not bulk_edit_result.failed
@@ -0,0 +1,114 @@
+import exastro_ita_api_v1 as apiv1
+
+
+COLUMN_NAMES = ['実行処理種別', '廃止', 'ID', 'ホスト名', '最終更新日時', '更新用の最終更新日時', '最終更新者']
+
+
+class StubResponse:
+    def __init__(self, json_object: dict | None, *, exception: Exception | None = None, request_size: int = 0) -> None:
+        self.json_object = json_object
+        self.exception = exception
+        self.request_size = request_size
+        self.status = 200 if exception is None else None
+        self.succeeded = exception is None and json_object is not None and json_object.get('status') == 'SUCCEED'
+
+
+    def __enter__(self) -> 'StubResponse':
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+class StubApiRequest(apiv1.IndexerMixin):
+    # 送信された行数ごとに、あらかじめ用意した応答を順に返す
+    def __init__(self, responses: list) -> None:
+        self.__indexer = apiv1.Indexer('2100000303', COLUMN_NAMES)
+        self.responses = responses
+        self.sent: list[dict] = []
+
+
+    @property
+    def indexer(self) -> apiv1.Indexer:
+        return self.__indexer
+
+
+    def send_post(self, xcommand: str, params: dict, **kwargs) -> StubResponse:
+        self.sent.append(params)
+        response = self.responses.pop(0)
+        return response(params) if callable(response) else response
+
+
+def create_edit_response(*codes: str, request_size: int = 0) -> StubResponse:
+    return StubResponse({'status': 'SUCCEED', 'resultdata': {'LIST': {'RAW': [[code, str(index + 1), ''] for index, code in enumerate(codes)]}}}, request_size=request_size)
+
+
+def create_menu(api_request: StubApiRequest, operations: list[str]) -> apiv1.Menu:
+    indexer = api_request.indexer
+    menu = apiv1.Menu(indexer)
+    for number, operation in enumerate(operations, 1):
+        values = {indexer['ホスト名']: f'host-{number}'}
+        if operation != apiv1.実行処理種別.登録:
+            values |= {indexer['ID']: str(number), indexer['更新用の最終更新日時']: f'T{number}'}
+        menu.add_row(menu.create_row(values, operation=operation))
+
+    return menu
+
+
+def test_registered_rows_with_unknown_outcome_are_not_resent():
+    api_request = StubApiRequest([
+        StubResponse(None, exception=ConnectionResetError('connection reset')),
+        create_edit_response('000')
+    ])
+    menu = create_menu(api_request, [apiv1.実行処理種別.登録, apiv1.実行処理種別.更新])
+
+    bulk_edit_result = menu.bulk_edit(api_request, max_retries=2)
+
+    # 登録は反映済みかもしれないため失敗として報告し、更新のみ再送する
+    assert len(api_request.sent) == 2
+    assert list(api_request.sent[1].keys()) == ['0']
+    assert api_request.sent[1]['0'][api_request.indexer['実行処理種別']] == apiv1.実行処理種別.更新
+    assert len(bulk_edit_result.succeeded) == 1
+    assert [row.body['実行処理種別'] for row, _, _ in bulk_edit_result.failed] == [apiv1.実行処理種別.登録]
+
+
+def test_missing_result_is_not_resent_for_registered_rows():
+    api_request = StubApiRequest([create_edit_response('000')])
+    menu = create_menu(api_request, [apiv1.実行処理種別.登録, apiv1.実行処理種別.登録])
+
+    bulk_edit_result = menu.bulk_edit(api_request, max_retries=2)
+
+    assert len(api_request.sent) == 1
+    assert [message for _, _, message in bulk_edit_result.failed] == ['No result returned for the row.']
+
+
+def test_fixed_failures_are_not_retried():
+    api_request = StubApiRequest([create_edit_response('000', '002')])
+    menu = create_menu(api_request, [apiv1.実行処理種別.更新, apiv1.実行処理種別.更新])
+
+    bulk_edit_result = menu.bulk_edit(api_request, max_retries=2)
+
+    assert len(api_request.sent) == 1
+    assert [edit_result.code for _, edit_result, _ in bulk_edit_result.failed] == ['002']
+
+
+def test_transient_codes_are_retried():
+    api_request = StubApiRequest([create_edit_response('000', '003'), create_edit_response('000')])
+    menu = create_menu(api_request, [apiv1.実行処理種別.登録, apiv1.実行処理種別.登録])
+
+    bulk_edit_result = menu.bulk_edit(api_request, max_retries=2, retry_codes={'003'})
+
+    assert len(api_request.sent) == 2
+    assert len(bulk_edit_result.succeeded) == 2
+    assert not bulk_edit_result.failed
+
+
+def test_bytes_sent_uses_request_size():
+    api_request = StubApiRequest([create_edit_response('000', request_size=1000), create_edit_response('000', request_size=234)])
+    menu = create_menu(api_request, [apiv1.実行処理種別.登録, apiv1.実行処理種別.登録])
+
+    bulk_edit_result = menu.bulk_edit(api_request, max_rows=1)
+
+    assert bulk_edit_result.request_count == 2
+    assert bulk_edit_result.bytes_sent == 1234
@@ -0,0 +1,54 @@
+import json
+import sys
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+PARAMS = {'0': {'3': 'ホスト/1', '4': None}, '1': {'3': 'host-2'}}
+
+
+def test_codecs_are_interchangeable():
+    for name in apiv1.JSON_CODECS.keys():
+        try:
+            json_codec = apiv1.create_json_codec(name)
+        except ImportError:
+            continue
+
+        assert json_codec.name == name
+
+        # どのコーデックで出力しても標準ライブラリで同じ値として読め、どの入力の型も受け付ける
+        data = json_codec.dumps(PARAMS)
+        assert isinstance(data, bytes)
+        assert json.loads(data) == PARAMS
+        for value in (data, bytearray(data), memoryview(data), data.decode()):
+            assert json_codec.loads(value) == PARAMS
+
+
+def test_auto_falls_back_to_the_standard_library(monkeypatch):
+    # インストールされていない場合と同様に import を失敗させる
+    monkeypatch.setitem(sys.modules, 'orjson', None)
+    monkeypatch.setitem(sys.modules, 'ujson', None)
+
+    assert type(apiv1.create_json_codec()) is apiv1.JsonCodec
+
+    with pytest.raises(ImportError):
+        apiv1.create_json_codec('orjson')
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        apiv1.create_json_codec('simplejson')
+
+
+def test_context_uses_configured_codec():
+    with FakeItaServer(rows=2) as server:
+        with apiv1.ApiContext(server.config | {'EXASTRO_JSON_CODEC': 'json'}) as api_context:
+            assert type(api_context.json_codec) is apiv1.JsonCodec
+
+            with api_context.create_api_request(MENU_ID).send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                assert api_response.json_object['resultdata']['CONTENTS']['RECORD_LENGTH'] == 2
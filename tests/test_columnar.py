@@ -0,0 +1,99 @@
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+COLUMN_NAMES = ['実行処理種別', '廃止', 'ID', 'ホスト名', '備考', '最終更新日時', '更新用の最終更新日時', '最終更新者']
+
+
+def create_json_object(rows: list[list[str]]) -> dict:
+    return {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {
+        'RECORD_LENGTH': len(rows),
+        'BODY': [COLUMN_NAMES] + rows,
+        'UPLOAD_FILE': [[None] * len(COLUMN_NAMES) for _ in range(len(rows) + 1)]
+    }}}
+
+
+def body_parameters(menu) -> dict:
+    # ColumnarMenu は値のないファイルを保持しないため、本文のみ比較する
+    return {key: value for key, value in menu.to_edit_parameters().items() if key != 'UPLOAD_FILE'}
+
+
+def test_rows_match_menu():
+    indexer = apiv1.Indexer(MENU_ID, COLUMN_NAMES)
+    json_object = create_json_object([
+        ['', '', '1', 'host-1', 'note', 'T', 'T_1', 'admin'],
+        ['', '', '2', 'host-2', 'note', 'T', 'T_2', 'admin']
+    ])
+
+    columnar_menu = apiv1.ColumnarMenu(indexer, json_object)
+    menu = apiv1.Menu(indexer, json_object)
+
+    assert len(columnar_menu) == 2
+    assert columnar_menu.column('ホスト名') == ['host-1', 'host-2']
+    assert columnar_menu.get('2')['ホスト名'] == 'host-2'
+    assert columnar_menu[-1].id == '2'
+    assert columnar_menu.get('3') is None
+    assert body_parameters(columnar_menu) == body_parameters(menu)
+    assert body_parameters(columnar_menu.to_menu()) == body_parameters(menu)
+    assert 'UPLOAD_FILE' not in columnar_menu.to_edit_parameters()
+
+    # 同じ短い文字列は1つのオブジェクトを共有する
+    assert columnar_menu[0]['備考'] is columnar_menu[1]['備考']
+
+    with pytest.raises(IndexError):
+        columnar_menu[2]
+
+
+def test_row_views_write_through():
+    indexer = apiv1.Indexer(MENU_ID, COLUMN_NAMES)
+    columnar_menu = apiv1.ColumnarMenu(indexer)
+    columnar_row = columnar_menu.append({indexer['ID']: '1', indexer['ホスト名']: 'host-1'})
+
+    row = columnar_row.to_row()
+    row.body['備考'] = 'updated'
+    del row.body.values[indexer['ホスト名']]
+    row.file.values[indexer['備考']] = 'file.txt'
+
+    assert columnar_row['備考'] == 'updated'
+    assert columnar_row.get('ホスト名') is None
+    assert columnar_menu.files[0] == {indexer['備考']: 'file.txt'}
+    assert set(row.body.values) == {indexer['ID'], indexer['備考']}
+
+    with pytest.raises(KeyError):
+        columnar_row['ホスト名']
+
+    with pytest.raises(KeyError):
+        row.body.values['99']
+
+
+def test_non_contiguous_indexes():
+    # 項目を非表示にしたメニューなど、インデックスが連番でない場合
+    indexer = apiv1.Indexer(MENU_ID, {'0': '実行処理種別', '1': '廃止', '2': 'ID', '5': 'ホスト名', '9': '更新用の最終更新日時'})
+    columnar_menu = apiv1.ColumnarMenu(indexer)
+    columnar_row = columnar_menu.append({'2': '1', '5': 'host-1', '9': 'T_1'})
+
+    assert columnar_row.id == '1'
+    assert columnar_row['ホスト名'] == 'host-1'
+    assert columnar_menu.column('更新用の最終更新日時') == ['T_1']
+    assert dict(columnar_row.to_row().body.values) == {'2': '1', '5': 'host-1', '9': 'T_1'}
+
+    columnar_row['ホスト名'] = 'host-2'
+    assert columnar_menu.to_menu().find_one_by(ID='1').body['ホスト名'] == 'host-2'
+
+
+def test_from_stream():
+    with FakeItaServer(rows=3) as server:
+        with apiv1.ApiContext(server.config) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                columnar_menu = apiv1.ColumnarMenu.from_stream(api_request.indexer, api_response)
+
+            with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                menu = apiv1.Menu(api_request.indexer, api_response.json_object)
+
+    assert [row.id for row in columnar_menu] == ['1', '2', '3']
+    assert body_parameters(columnar_menu) == body_parameters(menu)
@@ -0,0 +1,87 @@
+import gzip
+import io
+import zlib
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import LAST_UPDATE_COLUMN_NAMES, FakeItaServer
+
+
+MENU_ID = '2100000303'
+PAYLOAD = ('{"status": "SUCCEED", "resultdata": "' + 'ホスト' * 5000 + '"}').encode()
+
+
+def read_in_chunks(reader: apiv1.DecompressingReader, amt: int) -> bytes:
+    return b''.join(iter(lambda: reader.read(amt), b''))
+
+
+def test_decompressing_reader_supports_gzip_and_deflate():
+    raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    compressed = {
+        'gzip': gzip.compress(PAYLOAD),
+        'deflate': zlib.compress(PAYLOAD),
+        # zlib ヘッダのない deflate
+        'raw': raw_deflate.compress(PAYLOAD) + raw_deflate.flush()
+    }
+
+    for name, body in compressed.items():
+        encoding = 'gzip' if name == 'gzip' else 'deflate'
+        for chunk_size in (1, 16, 64 * 1024):
+            reader = apiv1.DecompressingReader(io.BytesIO(body), encoding, chunk_size=chunk_size)
+            assert read_in_chunks(reader, 7) == PAYLOAD
+
+        assert apiv1.decompress_body(body, encoding) == PAYLOAD
+
+
+class OneByteReader:
+    # ソケットのように、要求より短いデータしか返さない
+    def __init__(self, data: bytes) -> None:
+        self.fp = io.BytesIO(data)
+
+
+    def read(self, amt: int) -> bytes:
+        return self.fp.read(1)
+
+
+def test_zlib_header_is_detected_from_one_byte_reads():
+    reader = apiv1.DecompressingReader(OneByteReader(zlib.compress(PAYLOAD)), 'deflate')
+
+    assert reader.read() == PAYLOAD
+
+
+def test_decompress_body_without_encoding():
+    assert apiv1.decompress_body(PAYLOAD, None) == PAYLOAD
+
+    with pytest.raises(ValueError):
+        apiv1.DecompressingReader(io.BytesIO(PAYLOAD), 'br')
+
+
+def test_compress_body_is_deterministic():
+    compressed = apiv1.compress_body(PAYLOAD)
+
+    assert compressed == apiv1.compress_body(PAYLOAD)
+    assert gzip.decompress(compressed) == PAYLOAD
+
+
+def test_compressed_and_plain_responses_are_equal():
+    json_objects = []
+
+    for compress in (True, False):
+        with FakeItaServer(rows=50, compress=compress) as server:
+            with apiv1.ApiContext(server.config) as api_context:
+                api_request = api_context.create_api_request(MENU_ID)
+                with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                    assert api_response.content_encoding == ('gzip' if compress else None)
+                    json_objects.append(api_response.json_object)
+
+    # 最終更新日時はサーバの起動ごとに異なるため比較しない
+    bodies = []
+    for json_object in json_objects:
+        body = json_object['resultdata']['CONTENTS']['BODY']
+        positions = [position for position, column_name in enumerate(body[0]) if column_name not in LAST_UPDATE_COLUMN_NAMES]
+        bodies.append([[row[position] for position in positions] for row in body])
+
+    assert bodies[0] == bodies[1]
+    assert len(bodies[0]) == 51
@@ -0,0 +1,163 @@
+import asyncio
+import http.client
+import io
+import json
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from exastro_ita_api_v1.api_connection import BufferedResponse
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def run_request(limiter: apiv1.AimdLimiter, clock: FakeClock, latency: float, *, failed: bool = False, key=None) -> None:
+    # 前回減らした時刻より後に開始したリクエストとして扱う
+    clock.now += 0.001
+    started_at = limiter.acquire(0)
+    clock.now += latency
+    limiter.release(started_at, failed=failed, key=key)
+
+
+def test_limit_increases_only_when_saturated():
+    clock = FakeClock()
+    limiter = apiv1.AimdLimiter('read', initial_limit=2, max_limit=4, clock=clock)
+
+    # 上限まで使っていない間は増やさない
+    for _ in range(10):
+        run_request(limiter, clock, 0.1)
+    assert limiter.limit == 2
+
+    # 上限まで使っている状態で limit 件の応答があれば 1 増える
+    for _ in range(20):
+        started = [limiter.acquire(0) for _ in range(limiter.limit)]
+        clock.now += 0.1
+        for started_at in started:
+            limiter.release(started_at)
+    assert limiter.limit == 4
+
+
+def test_limit_decreases_on_errors_and_latency():
+    clock = FakeClock()
+    limiter = apiv1.AimdLimiter('read', initial_limit=16, min_limit=2, max_limit=16, latency_tolerance=2.0, clock=clock)
+
+    run_request(limiter, clock, 0.1, key='FILTER')
+    run_request(limiter, clock, 0.1, failed=True, key='FILTER')
+    assert limiter.limit == 8
+
+    run_request(limiter, clock, 0.5, key='FILTER')
+    assert limiter.limit == 4
+
+    # 応答時間はキーごとに比較する
+    run_request(limiter, clock, 5.0, key='EDIT')
+    assert limiter.limit == 4
+
+    for _ in range(5):
+        run_request(limiter, clock, 0.1, failed=True, key='FILTER')
+    assert limiter.limit == 2
+
+
+def test_one_overload_decreases_once():
+    clock = FakeClock()
+    limiter = apiv1.AimdLimiter('read', initial_limit=8, max_limit=8, clock=clock)
+
+    # 同時に送信したリクエストがまとめて失敗しても、減らすのは1回のみ
+    started = [limiter.acquire(0) for _ in range(8)]
+    clock.now += 0.1
+    for started_at in started:
+        limiter.release(started_at, failed=True)
+
+    assert limiter.limit == 4
+
+
+def test_acquire_times_out():
+    limiter = apiv1.AimdLimiter('write', initial_limit=1, max_limit=1)
+    limiter.acquire()
+
+    with pytest.raises(apiv1.ConcurrencyLimitExceeded):
+        limiter.acquire(0.01)
+
+    assert limiter.queue_depth == 0
+
+
+class EventRecorder(apiv1.EventHook):
+    def __init__(self) -> None:
+        super().__init__()
+        self.events: list[tuple[str, int, str]] = []
+
+
+    def on_concurrency_change(self, name, limit, in_flight, queue_depth, reason) -> None:
+        self.events.append((name, limit, reason))
+
+
+class StubTransport:
+    def __init__(self, status: int = 200) -> None:
+        self.status = status
+
+
+    def urlopen(self, method, url, body=None, headers=None, *, timings=None) -> BufferedResponse:
+        body = json.dumps({'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'BODY': []}}}).encode()
+        return BufferedResponse(self.status, 'Service Unavailable', http.client.parse_headers(io.BytesIO(b'\r\n')), body)
+
+
+    def close(self) -> None:
+        pass
+
+
+def test_injected_controller_notifies_event_hook():
+    event_recorder = EventRecorder()
+    concurrency_controller = apiv1.ConcurrencyController(max_read_concurrency=8)
+
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+    with apiv1.ApiContext(config, event_hook=event_recorder, transport=StubTransport(503), concurrency_controller=concurrency_controller) as api_context:
+        with api_context.create_api_request('2100000303').send_post(apiv1.XCommand.FILTER, {}, cache=False):
+            pass
+
+    assert event_recorder.events == [('read', 2, 'error')]
+
+
+class StubAsyncConnectionPool:
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.peak = 0
+
+
+    async def urlopen(self, method, url, body=None, headers=None, *, timings=None) -> BufferedResponse:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+
+        return StubTransport().urlopen(method, url, body, headers)
+
+
+    async def close(self) -> None:
+        pass
+
+
+def test_async_requests_share_the_limit():
+    async_connection_pool = StubAsyncConnectionPool()
+    concurrency_controller = apiv1.ConcurrencyController(max_read_concurrency=3)
+
+    async def main():
+        config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+        async with apiv1.AsyncApiContext(config, async_connection_pool=async_connection_pool, concurrency_controller=concurrency_controller) as api_context:
+            api_request = api_context.create_api_request('2100000303')
+            return await asyncio.gather(*[api_request.send_post(apiv1.XCommand.FILTER, {'n': n}, cache=False) for n in range(20)])
+
+    api_responses = asyncio.run(main())
+
+    assert all(api_response.succeeded for api_response in api_responses)
+    assert async_connection_pool.peak <= 3
+    assert concurrency_controller.read_limiter.in_flight == 0
+    assert concurrency_controller.read_limiter.queue_depth == 0
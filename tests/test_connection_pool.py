@@ -0,0 +1,124 @@
+import asyncio
+import http.client
+import http.server
+import threading
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+
+class DroppingRequestHandler(http.server.BaseHTTPRequestHandler):
+    # 同じ接続の2つ目のリクエストを1度だけ、読み終えた後に応答せず切断する
+    protocol_version = 'HTTP/1.1'
+    server: 'DroppingServer'
+
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+    def setup(self) -> None:
+        super().setup()
+        self.request_count = 0
+
+
+    def do_GET(self) -> None:
+        self.__handle()
+
+
+    def do_POST(self) -> None:
+        self.__handle()
+
+
+    def __handle(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', '0')))
+        self.request_count += 1
+
+        with self.server.lock:
+            self.server.received.append((self.command, self.headers.get('X-Command')))
+            drop = self.request_count > 1 and not self.server.dropped
+            if drop:
+                self.server.dropped = True
+
+        if drop:
+            self.close_connection = True
+            return
+
+        body = b'{"status": "SUCCEED"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class DroppingServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), DroppingRequestHandler)
+        self.lock = threading.Lock()
+        self.received: list[tuple[str, str | None]] = []
+        self.dropped = False
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/default/menu/07_rest_api_ver1.php?no=2100000303'
+
+
+def send_twice(server: DroppingServer, xcommand: str) -> None:
+    connection_pool = apiv1.ConnectionPool(proxies={})
+    try:
+        for _ in range(2):
+            with connection_pool.urlopen('POST', server.url, b'{}', {'X-Command': xcommand}) as response:
+                response.read()
+    finally:
+        connection_pool.close()
+
+
+async def send_twice_async(server: DroppingServer, xcommand: str) -> None:
+    async_connection_pool = apiv1.AsyncConnectionPool(proxies={})
+    try:
+        for _ in range(2):
+            await async_connection_pool.urlopen('POST', server.url, b'{}', {'X-Command': xcommand})
+    finally:
+        await async_connection_pool.close()
+
+
+def test_idempotent_request_is_resent_after_disconnect():
+    for send in (send_twice, lambda server, xcommand: asyncio.run(send_twice_async(server, xcommand))):
+        with DroppingServer() as server:
+            send(server, apiv1.XCommand.FILTER)
+
+        assert server.received == [('POST', apiv1.XCommand.FILTER)] * 3
+
+
+def test_edit_is_not_resent_after_disconnect():
+    for send in (send_twice, lambda server, xcommand: asyncio.run(send_twice_async(server, xcommand))):
+        with DroppingServer() as server:
+            # ITA が処理済みの可能性があるため、送信し終えた EDIT はやり直さない
+            with pytest.raises((ConnectionError, http.client.BadStatusLine, asyncio.IncompleteReadError)):
+                send(server, apiv1.XCommand.EDIT)
+
+        assert server.received == [('POST', apiv1.XCommand.EDIT)] * 2
+
+
+def test_is_idempotent_request():
+    assert apiv1.is_idempotent_request('GET', None)
+    assert apiv1.is_idempotent_request('POST', {'x-command': apiv1.XCommand.FILTER_DATAONLY})
+    assert not apiv1.is_idempotent_request('POST', {'X-Command': apiv1.XCommand.EXECUTE})
+    assert not apiv1.is_idempotent_request('POST', {'Content-Type': 'application/x-www-form-urlencoded'})
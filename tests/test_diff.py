@@ -0,0 +1,97 @@
+import exastro_ita_api_v1 as apiv1
+
+
+COLUMN_NAMES = ['実行処理種別', '廃止', 'ID', 'ホスト名', '備考', '最終更新日時', '更新用の最終更新日時', '最終更新者']
+
+
+def create_menu(rows: list[dict]) -> apiv1.Menu:
+    indexer = apiv1.Indexer('2100000303', COLUMN_NAMES)
+    menu = apiv1.Menu(indexer)
+    for values in rows:
+        menu.add_row(menu.create_row({indexer[column_name]: value for column_name, value in values.items()}))
+
+    return menu
+
+
+def create_current_row(id: str, hostname: str, note: str = '', discarded: bool = False) -> dict:
+    return {
+        '廃止': '1' if discarded else '0',
+        'ID': id,
+        'ホスト名': hostname,
+        '備考': note,
+        '更新用の最終更新日時': f'T{id}'
+    }
+
+
+def test_update_by_natural_key():
+    current = create_menu([create_current_row('1', 'host-a', 'old'), create_current_row('2', 'host-b', 'same')])
+    desired = create_menu([{'ホスト名': 'host-a', '備考': 'new'}, {'ホスト名': 'host-b', '備考': 'same'}])
+
+    menu_diff = apiv1.diff_menus(desired, current, key_column_names=['ホスト名'])
+
+    assert [row.id for row in menu_diff.updated] == ['1']
+    updated = menu_diff.updated[0]
+    assert updated.body['実行処理種別'] == apiv1.実行処理種別.更新
+    assert updated.body['備考'] == 'new'
+    assert updated.body['更新用の最終更新日時'] == 'T1'
+    assert not menu_diff.registered and not menu_diff.discarded and not menu_diff.revived
+
+
+def test_register_unmatched_row():
+    current = create_menu([create_current_row('1', 'host-a')])
+    desired = create_menu([{'ホスト名': 'host-a'}, {'ホスト名': 'host-c', '備考': 'added'}])
+
+    menu_diff = apiv1.diff_menus(desired, current, key_column_names=['ホスト名'])
+
+    assert len(menu_diff.registered) == 1
+    assert menu_diff.registered[0].body['実行処理種別'] == apiv1.実行処理種別.登録
+    assert menu_diff.registered[0].body['ホスト名'] == 'host-c'
+
+
+def test_discard_missing_row():
+    current = create_menu([create_current_row('1', 'host-a'), create_current_row('2', 'host-b'), create_current_row('3', 'host-c', discarded=True)])
+    desired = create_menu([{'ホスト名': 'host-a'}])
+
+    # 既定では desired にない行を廃止しない
+    menu_diff = apiv1.diff_menus(desired, current, key_column_names=['ホスト名'])
+    assert menu_diff.is_empty
+
+    menu_diff = apiv1.diff_menus(desired, current, key_column_names=['ホスト名'], discard_missing=True)
+    assert [row.id for row in menu_diff.discarded] == ['2']
+    assert menu_diff.discarded[0].body['実行処理種別'] == apiv1.実行処理種別.廃止
+
+
+def test_revive_discarded_row():
+    current = create_menu([create_current_row('1', 'host-a', 'old', discarded=True), create_current_row('2', 'host-b', discarded=True)])
+    desired = create_menu([{'ホスト名': 'host-a', '備考': 'new'}, {'ホスト名': 'host-b'}])
+
+    menu_diff = apiv1.diff_menus(desired, current, key_column_names=['ホスト名'])
+
+    assert sorted(row.id for row in menu_diff.revived) == ['1', '2']
+    assert all(row.body['実行処理種別'] == apiv1.実行処理種別.復活 for row in menu_diff.revived)
+    assert [row.body['備考'] for row in menu_diff.deferred] == ['new']
+    assert not menu_diff.updated
+
+
+def test_prefer_active_row_for_duplicate_key():
+    # 廃止された行と同じキーの行が再登録されている場合は、廃止されていない行と比較する
+    for rows in [
+        [create_current_row('1', 'host-a', discarded=True), create_current_row('5', 'host-a', 'x')],
+        [create_current_row('5', 'host-a', 'x'), create_current_row('1', 'host-a', discarded=True)]
+    ]:
+        current = create_menu(rows)
+        desired = create_menu([{'ホスト名': 'host-a', '備考': 'x'}])
+
+        menu_diff = apiv1.diff_menus(desired, current, key_column_names=['ホスト名'])
+
+        assert menu_diff.is_empty
+        assert not menu_diff.deferred
+
+
+def test_match_by_id():
+    current = create_menu([create_current_row('1', 'host-a', 'old')])
+    desired = create_menu([{'ID': '1', 'ホスト名': 'host-renamed', '備考': 'old'}])
+
+    menu_diff = apiv1.diff_menus(desired, current, key_column_names=['ホスト名'])
+
+    assert [row.body['ホスト名'] for row in menu_diff.updated] == ['host-renamed']
@@ -0,0 +1,132 @@
+import http.client
+import io
+import json
+import threading
+import time
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from exastro_ita_api_v1.api_connection import BufferedResponse
+
+from .fake_ita_server import FakeItaServer, FakeMenu
+
+
+MENU_ID = '2100000303'
+CONFIG = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+
+
+class BlockingTransport:
+    # release されるまで応答を返さず、同時に処理中のリクエスト数の最大値を記録する
+    def __init__(self, *, blocking: bool = False) -> None:
+        self.released = threading.Event()
+        if not blocking:
+            self.released.set()
+        self.started = threading.Semaphore(0)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.count = 0
+
+
+    def urlopen(self, method, url, body=None, headers=None, *, timings=None) -> BufferedResponse:
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            self.count += 1
+        self.started.release()
+
+        try:
+            self.released.wait()
+            time.sleep(0.01)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        body = json.dumps({'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'RECORD_LENGTH': 0, 'BODY': []}}}).encode()
+        return BufferedResponse(200, 'OK', http.client.parse_headers(io.BytesIO(b'\r\n')), body)
+
+
+    def close(self) -> None:
+        pass
+
+
+def test_results_against_fake_server():
+    menus = {menu_id: FakeMenu(menu_id, rows=rows) for menu_id, rows in ((MENU_ID, 2), ('2100000304', 3))}
+
+    with FakeItaServer(menus) as server:
+        with apiv1.ApiContext(server.config) as api_context:
+            with api_context.create_executor(max_workers=4) as executor:
+                results = executor.run([
+                    (MENU_ID, apiv1.XCommand.FILTER, {}),
+                    apiv1.ApiJob('2100000304', handler=lambda api_response: api_response.json_object['resultdata']['CONTENTS']['RECORD_LENGTH']),
+                    apiv1.ApiJob('9999999999', key='missing')
+                ])
+
+    assert [result.index for result in results] == [0, 1, 2]
+    assert results[0].status == 200
+    assert results[0].value['resultdata']['CONTENTS']['RECORD_LENGTH'] == 2
+    assert results[1].result() == 3
+    assert not results[2].succeeded
+    assert isinstance(results[2].exception, apiv1.ApiException)
+
+    with pytest.raises(apiv1.ApiJobError) as exc_info:
+        apiv1.raise_for_failures(results)
+    assert list(exc_info.value.exceptions.keys()) == ['missing']
+
+
+def test_handler_failure_is_captured():
+    def handler(api_response):
+        raise ValueError('unexpected body')
+
+    with apiv1.ApiContext(CONFIG, transport=BlockingTransport()) as api_context:
+        with api_context.create_executor(max_workers=2) as executor:
+            results = executor.run([apiv1.ApiJob(MENU_ID, handler=handler), (MENU_ID, apiv1.XCommand.FILTER, {})])
+
+    assert isinstance(results[0].exception, ValueError)
+    assert results[1].succeeded
+
+    with pytest.raises(ValueError):
+        results[0].result()
+
+
+def test_max_per_host_limits_concurrency():
+    transport = BlockingTransport()
+
+    with apiv1.ApiContext(CONFIG, transport=transport) as api_context:
+        with api_context.create_executor(max_workers=8, max_per_host=2) as executor:
+            results = executor.run([(MENU_ID, apiv1.XCommand.FILTER, {'n': n}) for n in range(10)])
+
+    assert all(result.succeeded for result in results)
+    assert transport.peak == 2
+
+
+def test_cancel_skips_pending_jobs():
+    transport = BlockingTransport(blocking=True)
+
+    with apiv1.ApiContext(CONFIG, transport=transport) as api_context:
+        executor = api_context.create_executor(max_workers=1)
+        futures = [executor.submit((MENU_ID, apiv1.XCommand.FILTER, {'n': n}), n) for n in range(5)]
+
+        # 実行中のジョブは完了させ、未着手のジョブのみ取り消す
+        transport.started.acquire()
+        executor.cancel()
+        transport.released.set()
+        executor.shutdown()
+
+    results = [future.result() if not future.cancelled() else None for future in futures]
+    assert results[0].succeeded
+    assert all(result is None or result.cancelled for result in results[1:])
+    assert transport.count == 1
+
+
+def test_execute_jobs_cancels_pending_jobs_when_iteration_stops():
+    transport = BlockingTransport()
+
+    with apiv1.ApiContext(CONFIG, transport=transport) as api_context:
+        for result in api_context.execute_jobs([(MENU_ID, apiv1.XCommand.FILTER, {'n': n}) for n in range(50)], max_workers=1):
+            assert result.succeeded
+            break
+
+    assert transport.count < 50
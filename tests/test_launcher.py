@@ -0,0 +1,96 @@
+import http.client
+import io
+import json
+import threading
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from exastro_ita_api_v1.api_connection import BufferedResponse
+
+
+STATUS_COLUMN_NAMES = ['実行処理種別', '廃止', 'SymphonyインスタンスID', 'ステータス']
+
+
+class StubTransport:
+    # EXECUTE ごとに ID を払い出し、状態の確認は failures 回だけ failure_status で失敗させる
+    def __init__(self, *, failures: int = 0, failure_status: int = 503) -> None:
+        self.failures = failures
+        self.failure_status = failure_status
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+
+    def urlopen(self, method, url, body=None, headers=None, *, timings=None) -> BufferedResponse:
+        xcommand = headers.get('X-Command')
+        params = json.loads(body) if body else {}
+        status = 200
+
+        with self.lock:
+            if xcommand == apiv1.XCommand.INFO:
+                json_object = {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'INFO': STATUS_COLUMN_NAMES}}}
+            elif xcommand == apiv1.XCommand.EXECUTE:
+                json_object = {'status': 'SUCCEED', 'resultdata': {'SYMPHONY_INSTANCE_ID': str(self.next_id)}}
+                self.next_id += 1
+            elif self.failures > 0:
+                self.failures -= 1
+                status = self.failure_status
+                json_object = {'status': 'ERROR', 'resultdata': {}}
+            else:
+                ids = params[apiv1.CommonIndex.ID]['LIST']
+                json_object = {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'BODY': [['', '', id, '正常終了'] for id in ids]}}}
+
+        return BufferedResponse(status, 'OK', http.client.parse_headers(io.BytesIO(b'\r\n')), json.dumps(json_object).encode())
+
+
+    def close(self) -> None:
+        pass
+
+
+def test_poll_errors_do_not_stop_monitoring():
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+    with apiv1.ApiContext(config, transport=StubTransport(failures=2)) as api_context:
+        launcher = apiv1.ExecutionLauncher(api_context, interval=0.0, sleep=lambda seconds: None)
+        executions = [(apiv1.MenuId.Symphony.Symphony作業実行, {'OPERATION_ID': str(number)}) for number in range(3)]
+
+        completed = list(launcher.run(executions, timeout=5.0))
+
+    assert [execution.status for execution in completed] == ['正常終了'] * 3
+    assert all(execution.succeeded for execution in completed)
+    assert launcher.poll_error_count == 2
+    assert isinstance(launcher.last_poll_error, apiv1.ApiException)
+    assert launcher.poll_count == 1
+
+
+def test_persistent_poll_errors_are_raised():
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+    with apiv1.ApiContext(config, transport=StubTransport(failures=100)) as api_context:
+        launcher = apiv1.ExecutionLauncher(api_context, interval=0.0, max_consecutive_poll_errors=3, sleep=lambda seconds: None)
+
+        # timeout を指定しなくても、連続して失敗した時点で打ち切る
+        with pytest.raises(apiv1.ApiException) as exception_info:
+            list(launcher.run([(apiv1.MenuId.Symphony.Symphony作業実行, {'OPERATION_ID': '1'})]))
+
+    assert exception_info.value is launcher.last_poll_error
+    assert launcher.poll_error_count == 3
+    assert launcher.poll_count == 0
+
+
+def test_non_transient_poll_errors_are_raised():
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+
+    # 認証エラーは再試行しても解決しないため、すぐに送出する
+    with apiv1.ApiContext(config, transport=StubTransport(failures=1, failure_status=401)) as api_context:
+        launcher = apiv1.ExecutionLauncher(api_context, interval=0.0, sleep=lambda seconds: None)
+        with pytest.raises(apiv1.ApiException):
+            list(launcher.run([(apiv1.MenuId.Symphony.Symphony作業実行, {'OPERATION_ID': '1'})]))
+    assert launcher.poll_error_count == 0
+
+    # 存在しないステータス列を指定した場合も同様
+    with apiv1.ApiContext(config, transport=StubTransport()) as api_context:
+        launcher = apiv1.ExecutionLauncher(api_context, interval=0.0, sleep=lambda seconds: None)
+        target = launcher.get_target(apiv1.MenuId.Symphony.Symphony作業実行)
+        wrong_target = apiv1.ExecutionTarget(target.execute_menu_id, target.status_menu_id, target.id_key, status_column='存在しない列')
+        with pytest.raises(KeyError):
+            list(launcher.run([(wrong_target, {'OPERATION_ID': '1'})]))
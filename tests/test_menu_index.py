@@ -0,0 +1,76 @@
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+
+COLUMN_NAMES = ['実行処理種別', '廃止', 'ID', 'ホスト名', '備考', '最終更新日時', '更新用の最終更新日時', '最終更新者']
+
+
+def create_menu(count: int) -> apiv1.Menu:
+    indexer = apiv1.Indexer('2100000303', COLUMN_NAMES)
+    menu = apiv1.Menu(indexer)
+    for number in range(1, count + 1):
+        menu.add_row(menu.create_row({indexer['ID']: str(number), indexer['ホスト名']: f'host-{number % 3}', indexer['備考']: f'note-{number % 2}'}))
+
+    return menu
+
+
+def ids(rows) -> list[str]:
+    return sorted(row.id for row in rows)
+
+
+def test_find_by_with_and_without_index():
+    menu = create_menu(6)
+    scanned = ids(menu.find_by(ホスト名='host-1', 備考='note-1'))
+
+    menu.create_index('備考', 'ホスト名')
+
+    # 指定順によらず同じ索引を使い、走査した場合と同じ結果になる
+    assert ids(menu.find_by(ホスト名='host-1', 備考='note-1')) == scanned == ['1']
+    assert ids(menu.find_by({'備考': 'note-0'}, ホスト名='host-1')) == ['4']
+    assert menu.find_by(ホスト名='host-9', 備考='note-1') == []
+    assert menu.find_one_by(ホスト名='host-9', 備考='note-1') is None
+
+
+def test_index_follows_add_and_merge():
+    menu = create_menu(3)
+    menu.create_index('ホスト名')
+    indexer = menu.indexer
+
+    menu.add_row(menu.create_row({indexer['ID']: '10', indexer['ホスト名']: 'host-1'}))
+    assert ids(menu.find_by(ホスト名='host-1')) == ['1', '10']
+
+    menu.merge_row(menu.create_row({indexer['ID']: '1', indexer['ホスト名']: 'host-2'}))
+    assert ids(menu.find_by(ホスト名='host-1')) == ['10']
+    assert ids(menu.find_by(ホスト名='host-2')) == ['1', '2']
+
+
+def test_reindex_after_direct_update():
+    menu = create_menu(3)
+    menu.create_index('ホスト名')
+
+    # Row を直接書き換えた場合、作り直すまで索引は古いまま
+    menu.find_one_by(ID='1').body['ホスト名'] = 'host-renamed'
+    assert ids(menu.find_by(ホスト名='host-1')) == ['1']
+    assert menu.find_by(ホスト名='host-renamed') == []
+
+    menu.reindex()
+    assert menu.find_by(ホスト名='host-1') == []
+    assert ids(menu.find_by(ホスト名='host-renamed')) == ['1']
+
+    # 索引を削除すると走査に戻る
+    menu.find_one_by(ID='2').body['ホスト名'] = 'host-renamed'
+    menu.drop_index('ホスト名')
+    assert ids(menu.find_by(ホスト名='host-renamed')) == ['1', '2']
+
+
+def test_where_and_invalid_index():
+    menu = create_menu(4)
+
+    assert ids(menu.where(lambda row: row.body['備考'] == 'note-0')) == ['2', '4']
+
+    with pytest.raises(apiv1.ApiException):
+        menu.create_index()
+
+    with pytest.raises(KeyError):
+        menu.create_index('存在しない項目')
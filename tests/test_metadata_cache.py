@@ -0,0 +1,38 @@
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+def test_fingerprint_is_required(tmp_path):
+    with pytest.raises(ValueError):
+        apiv1.MetadataCache(tmp_path, fingerprint='')
+
+    with pytest.raises(apiv1.ApiException):
+        apiv1.ApiContext({'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password', 'EXASTRO_METADATA_CACHE_DIR': str(tmp_path)})
+
+
+def test_entries_are_separated_by_fingerprint_and_username(tmp_path):
+    metadata_cache = apiv1.MetadataCache(tmp_path, fingerprint='1.10.0')
+    metadata_cache.put('ita', '8080', MENU_ID, apiv1.XCommand.LIST_OPTIONS, {'3': {'1': 'a'}}, username='administrator')
+
+    assert metadata_cache.get('ita', '8080', MENU_ID, apiv1.XCommand.LIST_OPTIONS, username='administrator') == {'3': {'1': 'a'}}
+    assert metadata_cache.get('ita', '8080', MENU_ID, apiv1.XCommand.LIST_OPTIONS, username='operator') is None
+    assert apiv1.MetadataCache(tmp_path, fingerprint='1.10.1').get('ita', '8080', MENU_ID, apiv1.XCommand.LIST_OPTIONS, username='administrator') is None
+
+    metadata_cache.invalidate('ita', '8080', MENU_ID)
+    assert metadata_cache.get('ita', '8080', MENU_ID, apiv1.XCommand.LIST_OPTIONS, username='administrator') is None
+
+
+def test_context_uses_cached_column_names(tmp_path):
+    with FakeItaServer(rows=1) as server:
+        config = server.config | {'EXASTRO_METADATA_CACHE_DIR': str(tmp_path), 'EXASTRO_ITA_VERSION': '1.10.0'}
+        with apiv1.ApiContext(config) as api_context:
+            column_names = list(api_context.create_api_request(MENU_ID).indexer)
+
+        cached = apiv1.MetadataCache(tmp_path, fingerprint='1.10.0').get(server.config['EXASTRO_HOST'], server.config['EXASTRO_PORT'], MENU_ID, apiv1.XCommand.INFO, username='administrator')
+        assert cached == column_names
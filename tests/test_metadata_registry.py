@@ -0,0 +1,143 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+class RequestCounter(apiv1.EventHook):
+    # 送信された X-Command の回数を数える
+    def __init__(self) -> None:
+        self.counts: dict[str | None, int] = {}
+        self.lock = threading.Lock()
+
+
+    def on_request(self, api_request, http_method, xcommand, headers, params, wait_func, wait_func_args) -> None:
+        with self.lock:
+            self.counts[xcommand] = self.counts.get(xcommand, 0) + 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    metadata_registry = apiv1.MetadataRegistry(max_size=2)
+    metadata_registry.put('a', 1)
+    metadata_registry.put('b', 2)
+
+    # 参照した a は最近使ったものとして残り、b が追い出される
+    assert metadata_registry.get('a') == 1
+    metadata_registry.put('c', 3)
+
+    assert len(metadata_registry) == 2
+    assert metadata_registry.get('b') is None
+    assert metadata_registry.get_or_load('c', lambda: 30) == 3
+    assert (metadata_registry.hits, metadata_registry.misses, metadata_registry.evictions) == (2, 1, 1)
+
+    metadata_registry.reset_statistics()
+    assert (metadata_registry.hits, metadata_registry.misses, metadata_registry.evictions) == (0, 0, 0)
+
+
+def test_invalidate_by_predicate():
+    metadata_registry = apiv1.MetadataRegistry()
+    metadata_registry.put((MENU_ID, apiv1.XCommand.INFO), 'info')
+    metadata_registry.put(('2100000304', apiv1.XCommand.INFO), 'other')
+
+    metadata_registry.invalidate(lambda key: key[0] == MENU_ID)
+
+    assert metadata_registry.get((MENU_ID, apiv1.XCommand.INFO)) is None
+    assert metadata_registry.get(('2100000304', apiv1.XCommand.INFO)) == 'other'
+
+
+def test_metadata_is_shared_across_requests():
+    request_counter = RequestCounter()
+
+    with FakeItaServer(rows=1) as server:
+        with apiv1.ApiContext(server.config | {'EXASTRO_METADATA_REGISTRY_SIZE': '8'}, event_hook=request_counter) as api_context:
+            assert api_context.metadata_registry.max_size == 8
+
+            api_requests = [api_context.create_api_request(MENU_ID) for _ in range(3)]
+            indexers = [api_request.indexer for api_request in api_requests]
+            options_tables = [api_request.options_table for api_request in api_requests]
+
+            assert all(indexer is indexers[0] for indexer in indexers)
+            assert all(options_table is options_tables[0] for options_table in options_tables)
+            assert request_counter.counts == {apiv1.XCommand.INFO: 1, apiv1.XCommand.LIST_OPTIONS: 1}
+
+            # 破棄すると、次に作った ApiRequest が読み込み直す
+            api_context.invalidate_metadata(MENU_ID)
+            assert api_context.create_api_request(MENU_ID).indexer is not indexers[0]
+            assert request_counter.counts[apiv1.XCommand.INFO] == 2
+
+
+def test_concurrent_loads_send_one_request():
+    request_counter = RequestCounter()
+
+    with FakeItaServer(rows=1, latency=0.05) as server:
+        with apiv1.ApiContext(server.config, event_hook=request_counter) as api_context:
+            shared_request = api_context.create_api_request(MENU_ID)
+            # 1つの ApiRequest を共有するスレッドと、それぞれ ApiRequest を作るスレッドを混在させる
+            api_requests = [shared_request if number % 2 else api_context.create_api_request(MENU_ID) for number in range(32)]
+            barrier = threading.Barrier(len(api_requests))
+
+            def load(api_request):
+                barrier.wait()
+                return api_request.indexer, api_request.options_table
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(api_requests)) as executor:
+                loaded = list(executor.map(load, api_requests))
+
+    assert request_counter.counts == {apiv1.XCommand.INFO: 1, apiv1.XCommand.LIST_OPTIONS: 1}
+    assert all(indexer is loaded[0][0] and options_table is loaded[0][1] for indexer, options_table in loaded)
+
+
+def test_waiters_receive_the_loader_exception():
+    metadata_registry = apiv1.MetadataRegistry()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def failing_loader():
+        calls.append('failing')
+        started.set()
+        release.wait()
+        raise ConnectionError('INFO failed')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(metadata_registry.get_or_load, 'key', failing_loader)
+        started.wait()
+        waiters = [executor.submit(metadata_registry.get_or_load, 'key', lambda: calls.append('waiter')) for _ in range(3)]
+        time.sleep(0.05)
+        release.set()
+
+        for future in [first] + waiters:
+            with pytest.raises(ConnectionError):
+                future.result()
+
+    # 失敗した結果は登録せず、次の呼び出しで読み込み直す
+    assert calls == ['failing']
+    assert metadata_registry.get_or_load('key', lambda: 'loaded') == 'loaded'
+
+
+def test_value_loaded_across_invalidate_is_not_cached():
+    metadata_registry = apiv1.MetadataRegistry()
+
+    def loader():
+        metadata_registry.invalidate()
+        return 'stale'
+
+    assert metadata_registry.get_or_load('key', loader) == 'stale'
+    assert metadata_registry.get('key') is None
+
+
+def test_reentrant_load_does_not_deadlock():
+    metadata_registry = apiv1.MetadataRegistry()
+
+    def loader():
+        return metadata_registry.get_or_load('key', lambda: 'inner') + '-outer'
+
+    assert metadata_registry.get_or_load('key', loader) == 'inner-outer'
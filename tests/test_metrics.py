@@ -0,0 +1,94 @@
+import gzip
+import http.client
+import io
+import json
+
+import exastro_ita_api_v1 as apiv1
+
+from exastro_ita_api_v1.api_connection import BufferedResponse
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+class GzipTransport:
+    # Content-Length のない gzip 圧縮の応答を返す
+    def __init__(self, json_object: dict) -> None:
+        self.body = gzip.compress(json.dumps(json_object).encode())
+
+
+    def urlopen(self, method, url, body=None, headers=None, *, timings=None) -> BufferedResponse:
+        return BufferedResponse(200, 'OK', http.client.parse_headers(io.BytesIO(b'Content-Encoding: gzip\r\n\r\n')), self.body)
+
+
+    def close(self) -> None:
+        pass
+
+
+def test_histogram_quantiles():
+    histogram = apiv1.Histogram((0.1, 0.2, 0.5))
+    for value in (0.05, 0.15, 0.15, 0.3, 0.7):
+        histogram.observe(value)
+
+    assert histogram.count == 5
+    assert histogram.max == 0.7
+    assert histogram.cumulative_counts() == [1, 3, 4, 5]
+    assert 0.1 <= histogram.quantile(0.5) <= 0.2
+    assert histogram.quantile(1.0) == 0.7
+
+
+def test_response_bytes_are_counted_as_received():
+    # INFO にも同じ応答を返すため、列名も含めておく
+    json_object = {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'INFO': [f'column-{index}' for index in range(100)], 'BODY': [['x'] * 100] * 100}}}
+    transport = GzipTransport(json_object)
+    metrics_hook = apiv1.MetricsHook()
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+
+    with apiv1.ApiContext(config, event_hook=metrics_hook, transport=transport) as api_context:
+        api_request = api_context.create_api_request(MENU_ID)
+        with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+            # 読む前は Content-Length がないため分からず、まだ記録もされない
+            assert api_response.response_size is None
+            assert (MENU_ID, apiv1.XCommand.FILTER) not in metrics_hook.metrics
+
+            assert api_response.json_object == json_object
+            assert api_response.response_size == len(transport.body)
+
+        # ストリーミングで読んだ場合も受信したバイト数を記録する
+        with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+            assert sum(1 for _ in api_response.iter_rows()) == 99
+
+    metrics = metrics_hook.metrics[(MENU_ID, apiv1.XCommand.FILTER)]
+    assert metrics.statuses == {'200': 2}
+    assert metrics.response_bytes == 2 * len(transport.body)
+    assert metrics.latency.count == 2
+
+
+def test_metrics_against_fake_server():
+    metrics_hook = apiv1.MetricsHook()
+
+    with FakeItaServer(rows=5) as server:
+        with apiv1.ApiContext(server.config, event_hook=metrics_hook) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                api_response.json_object
+                timings = api_response.timings
+
+            with api_request.send_post(apiv1.XCommand.EDIT, {'0': {api_request.indexer['実行処理種別']: apiv1.実行処理種別.登録, api_request.indexer['ホスト名']: 'host-new'}}):
+                pass
+
+    filter_metrics = metrics_hook.metrics[(MENU_ID, apiv1.XCommand.FILTER)]
+    assert filter_metrics.latency.sum >= timings.total > 0
+    assert filter_metrics.request_bytes > 0
+
+    # EDIT 後の待ち合わせ時間は EDIT に記録する
+    edit_metrics = metrics_hook.metrics[(MENU_ID, apiv1.XCommand.EDIT)]
+    assert edit_metrics.statuses == {'200': 1}
+    assert edit_metrics.wait_duration.count == 1
+
+    prometheus = metrics_hook.to_prometheus()
+    assert f'exastro_ita_requests_total{{menu_id="{MENU_ID}",xcommand="EDIT",status="200"}} 1' in prometheus
+    assert 'exastro_ita_request_duration_seconds_bucket' in prometheus
+    assert json.loads(metrics_hook.to_json())[MENU_ID]['EDIT']['count'] == 1
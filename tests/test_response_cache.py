@@ -0,0 +1,115 @@
+import concurrent.futures
+import http.client
+import io
+import threading
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def create_entry(response_cache: apiv1.ResponseCache, body: bytes = b'{}', status: int = 200) -> apiv1.CachedResponse:
+    return response_cache.create_entry(status, 'OK', http.client.parse_headers(io.BytesIO(b'\r\n')), body)
+
+
+def test_entries_expire_and_are_invalidated_per_menu():
+    clock = FakeClock()
+    response_cache = apiv1.ResponseCache(ttl=5.0, clock=clock)
+    key_a = response_cache.make_key('menu-a', apiv1.XCommand.FILTER, {'3': {'NORMAL': 'x'}, '1': {'NORMAL': '0'}})
+    key_b = response_cache.make_key('menu-b', apiv1.XCommand.FILTER, {})
+
+    # 条件の順序が違っても同じキーになる
+    assert key_a == response_cache.make_key('menu-a', apiv1.XCommand.FILTER, {'1': {'NORMAL': '0'}, '3': {'NORMAL': 'x'}})
+
+    response_cache.put(key_a, create_entry(response_cache))
+    response_cache.put(key_b, create_entry(response_cache))
+    assert response_cache.get(key_a) is not None
+
+    response_cache.invalidate('menu-a')
+    assert response_cache.get(key_a) is None
+    assert response_cache.get(key_b) is not None
+
+    clock.now += 6.0
+    assert response_cache.get(key_b) is None
+
+
+def test_put_is_skipped_when_invalidated_while_loading():
+    response_cache = apiv1.ResponseCache()
+    key = response_cache.make_key(MENU_ID, apiv1.XCommand.FILTER, {})
+
+    generation = response_cache.generation(key)
+    response_cache.invalidate(MENU_ID)
+    response_cache.put(key, create_entry(response_cache), generation=generation)
+
+    assert response_cache.get(key) is None
+
+
+def test_concurrent_loads_are_coalesced():
+    response_cache = apiv1.ResponseCache()
+    key = response_cache.make_key(MENU_ID, apiv1.XCommand.FILTER, {})
+    started = threading.Event()
+    release = threading.Event()
+    load_count = 0
+
+    def loader() -> apiv1.CachedResponse:
+        nonlocal load_count
+        load_count += 1
+        started.set()
+        release.wait(5)
+        return create_entry(response_cache, b'{"n": 1}')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(response_cache.get_or_load, key, loader)
+        started.wait(5)
+        others = [executor.submit(response_cache.get_or_load, key, loader) for _ in range(3)]
+        while response_cache.coalesced < 3:
+            threading.Event().wait(0.01)
+        release.set()
+
+        bodies = [future.result().to_response().read() for future in [first] + others]
+
+    assert bodies == [b'{"n": 1}'] * 4
+    assert load_count == 1
+    assert response_cache.misses == 1
+    assert response_cache.coalesced == 3
+
+
+def test_edit_invalidates_cached_filter():
+    with FakeItaServer(rows=2) as server:
+        config = server.config | {'EXASTRO_RESPONSE_CACHE_TTL': '60'}
+        with apiv1.ApiContext(config, default_wait_func=lambda api_response: None) as api_context:
+            response_cache = api_context.response_cache
+            api_request = api_context.create_api_request(MENU_ID)
+
+            def count_rows() -> int:
+                with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                    return len(api_response.json_object['resultdata']['CONTENTS']['BODY']) - 1
+
+            assert count_rows() == 2
+            assert count_rows() == 2
+            assert response_cache.hits == 1
+
+            # 他のメニューの更新ではキャッシュを破棄しない
+            other_request = api_context.create_api_request('2100000304')
+            with other_request.send_post(apiv1.XCommand.EDIT, {}):
+                pass
+            assert count_rows() == 2
+            assert response_cache.hits == 2
+
+            with api_request.send_post(apiv1.XCommand.EDIT, {'0': {api_request.indexer['実行処理種別']: apiv1.実行処理種別.登録, api_request.indexer['ホスト名']: 'host-new'}}):
+                pass
+
+            assert count_rows() == 3
+            assert response_cache.hits == 2
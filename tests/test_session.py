@@ -0,0 +1,106 @@
+import concurrent.futures
+import stat
+import threading
+import urllib.parse
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import AUTH_PATH, FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+class CountingTransport:
+    # ログインの送信回数を数える
+    def __init__(self) -> None:
+        self.connection_pool = apiv1.ConnectionPool(proxies={})
+        self.login_count = 0
+        self.lock = threading.Lock()
+
+
+    def urlopen(self, method, url, body=None, headers=None, *, timings=None):
+        if urllib.parse.urlsplit(url).path == AUTH_PATH and body and b'username=' in body:
+            with self.lock:
+                self.login_count += 1
+
+        return self.connection_pool.urlopen(method, url, body, headers, timings=timings)
+
+
+    def close(self) -> None:
+        self.connection_pool.close()
+
+
+def test_login_on_401_and_share_session_across_menus():
+    with FakeItaServer(rows=1) as server:
+        transport = CountingTransport()
+        with apiv1.ApiContext(server.config, transport=transport) as api_context:
+            _, web_response = api_context.create_web_request(MENU_ID)
+            assert int(web_response.code) == 200
+            assert transport.login_count == 1
+
+            _, web_response = api_context.create_web_request('2100000304')
+            assert int(web_response.code) == 200
+            assert transport.login_count == 1
+
+
+def test_relogin_after_session_is_cleared():
+    with FakeItaServer(rows=1) as server:
+        transport = CountingTransport()
+        with apiv1.ApiContext(server.config, transport=transport) as api_context:
+            web_request, _ = api_context.create_web_request(MENU_ID)
+            web_request.session.clear()
+
+            assert int(web_request.send_get().code) == 200
+            assert transport.login_count == 2
+
+
+def test_concurrent_401_logs_in_once():
+    with FakeItaServer(rows=1, latency=0.05) as server:
+        transport = CountingTransport()
+        with apiv1.ApiContext(server.config, transport=transport) as api_context:
+            session = api_context.web_session_pool.get()
+            web_requests = [apiv1.WebRequest(api_context, MENU_ID, session=session) for _ in range(4)]
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                codes = list(executor.map(lambda web_request: int(web_request.send_get().code), web_requests))
+
+    assert codes == [200] * 4
+    assert transport.login_count == 1
+
+
+def test_web_request_is_shared_across_threads():
+    with FakeItaServer(rows=1, latency=0.01) as server:
+        transport = CountingTransport()
+        with apiv1.ApiContext(server.config, transport=transport) as api_context:
+            web_request, _ = api_context.create_web_request(MENU_ID)
+            login_count = transport.login_count
+
+            # 1つの WebRequest の Cookie と Referer を複数のスレッドから同時に使う
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                codes = list(executor.map(lambda _: int(web_request.send_get().code), range(32)))
+
+    assert codes == [200] * 32
+    assert transport.login_count == login_count
+    assert [cookie.name for cookie in web_request.cookie_jar] == ['fake_ita_session']
+
+
+def test_cookies_are_persisted(tmp_path):
+    with FakeItaServer(rows=1) as server:
+        config = server.config | {'EXASTRO_WEB_SESSION_DIR': str(tmp_path)}
+
+        transport = CountingTransport()
+        with apiv1.ApiContext(config, transport=transport) as api_context:
+            api_context.create_web_request(MENU_ID)
+        assert transport.login_count == 1
+
+        session_files = list(tmp_path.iterdir())
+        assert len(session_files) == 1
+        assert stat.S_IMODE(session_files[0].stat().st_mode) == 0o600
+
+        # 別のコンテキストでも保存した Cookie を使い、ログインし直さない
+        transport = CountingTransport()
+        with apiv1.ApiContext(config, transport=transport) as api_context:
+            _, web_response = api_context.create_web_request(MENU_ID)
+        assert int(web_response.code) == 200
+        assert transport.login_count == 0
@@ -0,0 +1,133 @@
+import base64
+import io
+import json
+
+import exastro_ita_api_v1 as apiv1
+
+
+COLUMN_NAMES = ['実行処理種別', '廃止', 'ID', 'ホスト名', 'ファイル']
+
+
+def create_stream(contents: dict) -> io.BytesIO:
+    return io.BytesIO(json.dumps({'status': 'SUCCEED', 'resultdata': {'CONTENTS': contents}}, ensure_ascii=False).encode())
+
+
+def create_contents(*, upload_file_first: bool) -> dict:
+    body = [COLUMN_NAMES, ['', '', '1', 'host-1', 'a.txt'], ['', '', '2', 'host-2', '']]
+    upload_file = [[None] * 5, [None, None, None, None, 'YQ=='], [None] * 5]
+    return {'UPLOAD_FILE': upload_file, 'BODY': body} if upload_file_first else {'BODY': body, 'UPLOAD_FILE': upload_file}
+
+
+def test_iter_rows_yields_one_complete_row_per_record():
+    indexer = apiv1.Indexer('2100000303', COLUMN_NAMES)
+
+    for upload_file_first in (True, False):
+        rows = list(apiv1.iter_rows(indexer, create_stream(create_contents(upload_file_first=upload_file_first)), chunk_size=7, files=True))
+
+        assert [row.id for row in rows] == ['1', '2']
+        assert rows[0].body['ホスト名'] == 'host-1'
+        assert rows[0].file.values == {indexer['ファイル']: 'YQ=='}
+        assert rows[1].file.values == {}
+
+
+def test_iter_rows_without_files():
+    indexer = apiv1.Indexer('2100000303', COLUMN_NAMES)
+
+    rows = apiv1.iter_rows(indexer, create_stream(create_contents(upload_file_first=False)))
+
+    # 既定では BODY の行は UPLOAD_FILE を待たずに返される
+    row = next(rows)
+    assert row.id == '1' and row.file.values == {}
+    assert [row.id for row in rows] == ['2']
+
+
+class CountingReader:
+    def __init__(self, data: bytes) -> None:
+        self.fp = io.BytesIO(data)
+        self.size = 0
+
+
+    def read(self, amt: int) -> bytes:
+        chunk = self.fp.read(amt)
+        self.size += len(chunk)
+        return chunk
+
+
+def test_iter_rows_reads_little_before_the_first_row():
+    indexer = apiv1.Indexer('2100000303', COLUMN_NAMES)
+    body = [COLUMN_NAMES] + [['', '', str(id), f'host-{id}', ''] for id in range(1, 10001)]
+    reader = CountingReader(json.dumps({'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'BODY': body, 'UPLOAD_FILE': [[None] * 5] * len(body)}}}).encode())
+
+    # 既定では UPLOAD_FILE を待たないため、最初の行は最初のチャンクから返される
+    rows = apiv1.iter_rows(indexer, reader, chunk_size=4096)
+    assert next(rows).id == '1'
+    assert reader.size == 4096
+
+
+def test_iter_rows_without_upload_file_section():
+    indexer = apiv1.Indexer('2100000303', COLUMN_NAMES)
+
+    rows = list(apiv1.iter_rows(indexer, create_stream({'BODY': create_contents(upload_file_first=False)['BODY']})))
+
+    assert [row.id for row in rows] == ['1', '2']
+
+
+def test_json_stream_reader_across_chunk_boundaries():
+    document = {'a': [1, 23456, -7.5e3, True, None], 'b': 'ホスト\\/😀あ', 'c': {'d': []}}
+    data = json.dumps(document, ensure_ascii=False).encode()
+
+    for chunk_size in (1, 2, 3, 7, 64):
+        reader = apiv1.JsonStreamReader(io.BytesIO(data), chunk_size=chunk_size)
+        assert reader.read_value() == document
+
+        # 数値が途中で途切れても、続きを読み足してから返す
+        reader = apiv1.JsonStreamReader(io.BytesIO(b'{"n": 1234567890}'), chunk_size=chunk_size)
+        assert reader.seek(['n'])
+        assert reader.read_value() == 1234567890
+
+
+def test_json_stream_reader_iter_string():
+    text = 'line1\nline2 "quoted" \\ é 😀'
+    data = json.dumps({'file': text}).encode()
+
+    for chunk_size in (1, 5, 64):
+        reader = apiv1.JsonStreamReader(io.BytesIO(data), chunk_size=chunk_size)
+        assert reader.seek(['file'])
+        assert ''.join(reader.iter_string()) == text
+
+
+def test_iter_contents_skips_other_keys():
+    data = json.dumps({
+        'status': 'SUCCEED',
+        'resultdata': {
+            'LIST': {'NORMAL': {'error': {'ct': 0}}},
+            'CONTENTS': {'RECORD_LENGTH': 1, 'BODY': {'0': ['a'], '1': ['b']}, 'UPLOAD_FILE': [[None], [None]]}
+        }
+    }).encode()
+
+    assert list(apiv1.iter_contents(io.BytesIO(data), chunk_size=4)) == [
+        ('BODY', '0', ['a']),
+        ('BODY', '1', ['b']),
+        ('UPLOAD_FILE', '0', [None]),
+        ('UPLOAD_FILE', '1', [None])
+    ]
+    assert list(apiv1.iter_contents(io.BytesIO(b'[]'))) == []
+
+
+def test_iter_base64_decoded():
+    payload = bytes(range(256)) * 3
+    encoded = base64.b64encode(payload).decode()
+    chunks = [encoded[begin:begin + 7] for begin in range(0, len(encoded), 7)]
+
+    assert b''.join(apiv1.iter_base64_decoded(chunks)) == payload
+
+
+def test_iter_string_combines_surrogate_pairs_across_chunks():
+    # PHP の json_encode と同じく、BMP 外の文字をサロゲートペアでエスケープする
+    data = json.dumps({'file': 'a😀b'}, ensure_ascii=True).encode()
+    assert b'\\ud83d\\ude00' in data
+
+    for chunk_size in range(1, len(data) + 1):
+        reader = apiv1.JsonStreamReader(io.BytesIO(data), chunk_size=chunk_size)
+        assert reader.seek(['file'])
+        assert ''.join(reader.iter_string()) == 'a😀b'
@@ -0,0 +1,95 @@
+import datetime
+import http.client
+import io
+import json
+
+import pytest
+
+import exastro_ita_api_v1 as apiv1
+
+from exastro_ita_api_v1.api_connection import BufferedResponse
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+TIMESTAMP_FORMAT = '%Y/%m/%d %H:%M:%S.%f'
+COLUMN_NAMES = ['実行処理種別', '廃止', 'ID', 'ホスト名', '備考', '最終更新日時', '更新用の最終更新日時', '最終更新者']
+
+
+def test_sync_fetches_changes_since_high_water_mark():
+    with FakeItaServer(rows=3) as server:
+        fake_menu = server.menus[MENU_ID]
+        with apiv1.ApiContext(server.config | {'EXASTRO_RESPONSE_CACHE_TTL': '60'}, default_wait_func=lambda api_response: None) as api_context:
+            synchronizer = apiv1.MenuSynchronizer(api_context.create_api_request(MENU_ID))
+
+            assert len(synchronizer.sync()) == 3
+            high_water_mark = synchronizer.high_water_mark
+
+            # 最終更新日時が前回の取得より前の行が、後から反映された場合
+            delayed_row = fake_menu.register({fake_menu.position('ホスト名'): 'host-delayed'})
+            timestamp_position = int(fake_menu.position('最終更新日時'))
+            delayed_row[timestamp_position] = (datetime.datetime.strptime(high_water_mark, TIMESTAMP_FORMAT) - datetime.timedelta(seconds=1)).strftime(TIMESTAMP_FORMAT)
+
+            changed_ids = {row.id for row in synchronizer.sync()}
+            assert delayed_row[2] in changed_ids
+
+            fake_menu.rows['1'][int(fake_menu.position('備考'))] = 'updated'
+            fake_menu.rows['1'][timestamp_position] = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+
+            changed_ids = {row.id for row in synchronizer.sync()}
+            assert '1' in changed_ids
+
+    assert len(synchronizer.menu.rows) == 4
+    assert synchronizer.menu.find_one_by(ID='1').body['備考'] == 'updated'
+    assert synchronizer.high_water_mark == fake_menu.rows['1'][timestamp_position]
+
+
+def test_sync_without_overlap_misses_delayed_rows():
+    with FakeItaServer(rows=1) as server:
+        fake_menu = server.menus[MENU_ID]
+        with apiv1.ApiContext(server.config) as api_context:
+            synchronizer = apiv1.MenuSynchronizer(api_context.create_api_request(MENU_ID), overlap_seconds=0.0)
+            synchronizer.sync()
+
+            delayed_row = fake_menu.register({fake_menu.position('ホスト名'): 'host-delayed'})
+            delayed_row[int(fake_menu.position('最終更新日時'))] = '2000/01/01 00:00:00.000000'
+
+            assert delayed_row[2] not in {row.id for row in synchronizer.sync()}
+
+
+class FailingTransport:
+    # INFO には列名を返し、FILTER には指定した応答を返す
+    def __init__(self, status: int, json_object: dict) -> None:
+        self.status = status
+        self.json_object = json_object
+
+
+    def urlopen(self, method, url, body=None, headers=None, *, timings=None) -> BufferedResponse:
+        if headers.get('X-Command') == apiv1.XCommand.INFO:
+            status, json_object = 200, {'status': 'SUCCEED', 'resultdata': {'CONTENTS': {'INFO': COLUMN_NAMES}}}
+        else:
+            status, json_object = self.status, self.json_object
+
+        return BufferedResponse(status, 'OK', http.client.parse_headers(io.BytesIO(b'\r\n')), json.dumps(json_object).encode())
+
+
+    def close(self) -> None:
+        pass
+
+
+def test_sync_raises_on_failed_filter():
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password'}
+
+    # 失敗時も本文の形が正常時と同じ場合、変更なしと区別できない
+    resultdata = {'CONTENTS': {'RECORD_LENGTH': 0, 'BODY': [COLUMN_NAMES], 'UPLOAD_FILE': []}}
+    for status, json_object in [(500, {'status': 'SUCCEED', 'resultdata': resultdata}), (200, {'status': 'FAILED', 'resultdata': resultdata})]:
+        with apiv1.ApiContext(config, transport=FailingTransport(status, json_object)) as api_context:
+            synchronizer = apiv1.MenuSynchronizer(api_context.create_api_request(MENU_ID), high_water_mark='2024/01/01 00:00:00.000000')
+
+            with pytest.raises(apiv1.ApiException):
+                synchronizer.sync()
+
+        # 失敗した場合は取得済みの位置を進めない
+        assert synchronizer.high_water_mark == '2024/01/01 00:00:00.000000'
+        assert not synchronizer.menu.rows
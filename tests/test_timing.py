@@ -0,0 +1,64 @@
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+class TimingRecorder(apiv1.EventHook):
+    def __init__(self) -> None:
+        self.responses: list[tuple[str, set[str]]] = []
+        self.completions: list[tuple[str, set[str]]] = []
+
+
+    def on_response(self, api_request, api_response) -> None:
+        # 再利用した接続では connect は計測されない
+        self.responses.append((api_response.xcommand, set(api_response.timings.to_dict().keys()) - {'connect'}))
+
+
+    def on_response_complete(self, api_request, api_response, timings) -> None:
+        assert timings is api_response.timings
+        self.completions.append((api_response.xcommand, set(timings.to_dict().keys()) - {'connect'}))
+
+
+def test_completion_hook_sees_all_phases():
+    timing_recorder = TimingRecorder()
+
+    with FakeItaServer(rows=3) as server:
+        with apiv1.ApiContext(server.config, event_hook=timing_recorder) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            api_request.indexer
+            timing_recorder.responses.clear()
+            timing_recorder.completions.clear()
+
+            with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                # ヘッダを受信した時点では本文はまだ読まれていない
+                assert timing_recorder.responses == [(apiv1.XCommand.FILTER, {'encode', 'send', 'wait'})]
+                assert timing_recorder.completions == []
+
+                api_response.json_object
+                assert timing_recorder.completions == [(apiv1.XCommand.FILTER, {'encode', 'send', 'wait', 'transfer', 'decode'})]
+
+            # 閉じても2度は呼ばれない
+            assert len(timing_recorder.completions) == 1
+
+            # ストリーミングで読んだ場合は閉じた時点で呼ばれ、build に受信とデコードも含まれる
+            with api_request.send_post(apiv1.XCommand.FILTER, {}) as api_response:
+                menu = apiv1.Menu.from_stream(api_request.indexer, api_response)
+                assert len(timing_recorder.completions) == 1
+
+    assert len(menu.rows) == 3
+    assert timing_recorder.completions[1] == (apiv1.XCommand.FILTER, {'encode', 'send', 'wait', 'build'})
+
+
+def test_completion_hook_for_failed_request():
+    timing_recorder = TimingRecorder()
+    config = {'EXASTRO_USERNAME': 'administrator', 'EXASTRO_PASSWORD': 'password', 'EXASTRO_HOST': '127.0.0.1', 'EXASTRO_PORT': '1'}
+
+    with apiv1.ApiContext(config, event_hook=timing_recorder, connection_pool=apiv1.ConnectionPool(proxies={})) as api_context:
+        # 本文のない失敗は on_response の直後に完了とする
+        api_response = api_context.create_api_request(MENU_ID).send_post(apiv1.XCommand.FILTER, {})
+
+    assert api_response.exception is not None
+    assert [xcommand for xcommand, _ in timing_recorder.completions] == [apiv1.XCommand.FILTER]
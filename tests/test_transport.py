@@ -0,0 +1,113 @@
+import base64
+import json
+
+import exastro_ita_api_v1 as apiv1
+
+from .fake_ita_server import SESSION_COOKIE, FakeItaServer
+
+
+MENU_ID = '2100000303'
+
+
+def test_iter_api_records_decodes_compressed_edit(tmp_path):
+    path = tmp_path / 'records.bin'
+
+    with FakeItaServer(rows=1) as server:
+        config = server.config | {'EXASTRO_RECORD_PATH': str(path), 'EXASTRO_REQUEST_COMPRESSION_THRESHOLD': '1'}
+        with apiv1.ApiContext(config, default_wait_func=lambda api_response: None) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            parameters = {'0': {api_request.indexer['実行処理種別']: apiv1.実行処理種別.登録, api_request.indexer['ホスト名']: 'host-new'}}
+            with api_request.send_post(apiv1.XCommand.EDIT, parameters) as api_response:
+                assert api_response.succeeded
+
+    records = [record for record in apiv1.read_records(path) if record.xcommand == apiv1.XCommand.EDIT]
+    assert records[0].get_request_header('content-encoding') == 'gzip'
+
+    jobs = list(apiv1.iter_api_records(records))
+    assert [(job.menu_id, job.xcommand, job.params) for job in jobs] == [(MENU_ID, apiv1.XCommand.EDIT, parameters)]
+
+
+def test_replay_returns_recorded_responses(tmp_path):
+    path = tmp_path / 'records.bin'
+
+    def send_requests(config: dict) -> list:
+        with apiv1.ApiContext(config, default_wait_func=lambda api_response: None) as api_context:
+            api_request = api_context.create_api_request(MENU_ID)
+            json_objects = []
+            for xcommand, parameters in [(apiv1.XCommand.FILTER, {}), (apiv1.XCommand.EDIT, {'0': {api_request.indexer['実行処理種別']: apiv1.実行処理種別.登録, api_request.indexer['ホスト名']: 'host-new'}})]:
+                with api_request.send_post(xcommand, parameters) as api_response:
+                    json_objects.append(api_response.json_object)
+
+            return json_objects
+
+    with FakeItaServer(rows=2) as server:
+        config = server.config
+        recorded = send_requests(config | {'EXASTRO_RECORD_PATH': str(path)})
+
+    # サーバを停止した後でも、記録した応答がそのまま返る
+    replayed = send_requests(config | {'EXASTRO_REPLAY_PATH': str(path)})
+    assert replayed == recorded
+
+    with apiv1.ApiContext(config | {'EXASTRO_REPLAY_PATH': str(path)}) as api_context:
+        with api_context.create_api_request(MENU_ID).send_post(apiv1.XCommand.FILTER, {'1': {'NORMAL': '0'}}) as api_response:
+            assert isinstance(api_response.exception, ConnectionError)
+
+
+def test_replay_pace_uses_recorded_duration(tmp_path):
+    path = tmp_path / 'records.bin'
+
+    with FakeItaServer(rows=1) as server:
+        with apiv1.ApiContext(server.config | {'EXASTRO_RECORD_PATH': str(path)}) as api_context:
+            with api_context.create_api_request(MENU_ID).send_post(apiv1.XCommand.FILTER, {}):
+                pass
+
+    records = list(apiv1.read_records(path))
+    sleeps = []
+    transport = apiv1.ReplayTransport(records, pace=0.5, sleep=sleeps.append)
+    response = transport.urlopen(records[0].method, records[0].url, records[0].request_body, {})
+
+    assert response.read() == records[0].response_body
+    assert sleeps == [records[0].duration * 0.5]
+    assert transport.replay_count == 1
+
+
+def test_recording_does_not_store_credentials(tmp_path):
+    path = tmp_path / 'records.bin'
+
+    with FakeItaServer(rows=1, password='s3cret-Passw0rd') as server:
+        config = server.config | {'EXASTRO_RECORD_PATH': str(path)}
+        with apiv1.ApiContext(config) as api_context:
+            with api_context.create_api_request(MENU_ID).send_post(apiv1.XCommand.FILTER, {}):
+                pass
+            _, web_response = api_context.create_web_request(MENU_ID)
+            assert int(web_response.code) == 200
+
+    password = config['EXASTRO_PASSWORD']
+    secrets = [
+        password,
+        base64.b64encode((config['EXASTRO_USERNAME'] + ':' + password).encode()).decode(),
+        SESSION_COOKIE.split('=', 1)[1]
+    ]
+
+    records = list(apiv1.read_records(path))
+    assert any(record.get_request_header('Authorization') == apiv1.REDACTED_VALUE for record in records)
+    assert any(b'username=%2A%2A%2A' in record.request_body for record in records)
+
+    for record in records:
+        text = json.dumps(record.metadata, ensure_ascii=False) + record.request_body.decode('latin-1')
+        assert not any(secret in text for secret in secrets)
+
+
+def test_replay_matches_redacted_login(tmp_path):
+    path = tmp_path / 'records.bin'
+
+    with FakeItaServer(rows=1) as server:
+        config = server.config
+        with apiv1.ApiContext(config | {'EXASTRO_RECORD_PATH': str(path)}) as api_context:
+            _, web_response = api_context.create_web_request(MENU_ID)
+            recorded = web_response.body
+
+    # ログインフォームを伏せて記録しても、再生時に照合できる
+    with apiv1.ApiContext(config | {'EXASTRO_REPLAY_PATH': str(path)}) as api_context:
+        _, web_response = api_context.create_web_request(MENU_ID)
+        assert web_response.body == recorded